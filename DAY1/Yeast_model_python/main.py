@@ -1,5 +1,6 @@
 from parameters import Parameters
 from model import initial_values, kinetics
+from sensitivity import sensitivities
 from scipy.integrate import solve_ivp
 import matplotlib.pyplot as plt
 import numpy as np
@@ -34,59 +35,27 @@ def plot(sol, par):
 
 
 def localSensitivityAnalysis():
-
-    DISTURBANCE = 1.1
+    '''Forward sensitivities dy/dp of all states to all parameters, in one solve
+    (see sensitivity.py). The three glucose uptake parameters are plotted.'''
     tol = 1e-10
     method = 'LSODA'
 
     par = Parameters()
     init = initial_values()
-    tspan=(0,50)
     time = np.arange(0,50,0.1)
-    sol = solve_ivp(kinetics, t_span=tspan, y0=init, args=(par,), t_eval=time, method=method,  atol=tol, rtol=tol)
-    par.numaxG_orig = 3.9872         # max consumption rate of glucose (1.0005)  h^-1       [1]
-    par.KSPG_orig   = 0.14637        # affinity constant glucose to ethanol      g/L        [1]
-    par.KiPG_orig   = 4752.8         # inhibition constant glucose to ethanol    g/L        [1]
-
-    # PAR 1
-    par.numaxG = par.numaxG_orig*DISTURBANCE
-    par.KSPG = par.KSPG_orig 
-    par.KiPG = par.KiPG_orig 
-    sol1 = solve_ivp(kinetics, t_span=tspan, y0=init, args=(par,), t_eval=time, method=method,atol=tol, rtol=tol)
-    dy1dp = (sol1.y-sol.y)/(par.numaxG-par.numaxG_orig) 
-    
-
-    # PAR 1
-    par.numaxG = par.numaxG_orig 
-    par.KSPG = par.KSPG_orig * DISTURBANCE
-    par.KiPG = par.KiPG_orig 
-    sol2 = solve_ivp(kinetics, t_span=tspan, y0=init, args=(par,), t_eval=time,  method=method,atol=tol, rtol=tol)
-    dy2dp = (sol2.y-sol.y)/(par.KSPG-par.KSPG_orig) 
-
-
-    # PAR 1
-    par.numaxG = par.numaxG_orig
-    par.KSPG = par.KSPG_orig 
-    par.KiPG = par.KiPG_orig * DISTURBANCE
-    sol3 = solve_ivp(kinetics, t_span=tspan, y0=init, args=(par,), t_eval=time,  method=method,atol=tol, rtol=tol)
-    dy3dp = (sol3.y-sol.y)/(par.KiPG-par.KiPG_orig) 
-
-
+    sol, dydp, names = sensitivities(par, init, time, method=method, rtol=tol, atol=tol)
 
+    plotted = ['numaxG', 'KSPG', 'KiPG']
     fig, axs = plt.subplots(nrows=3, ncols=8, sharex=True, squeeze=True, constrained_layout=True)
-    i = 0
-    for n in par.var_names:
-        axs[0,i].plot(sol1.t, dy1dp[i,:])
+    for row, name in enumerate(plotted):
+        k = names.index(name)
+        for i in range(8):
+            axs[row,i].plot(sol.t, dydp[i,k,:])
+        axs[row,0].set_ylabel(name)
+    for i, n in enumerate(par.var_names):
         axs[0,i].set_title(n)
-        i+=1
-    for i in range(8):
-        axs[1,i].plot(sol1.t, dy2dp[i,:])
-    for i in range(8):
-        axs[2,i].plot(sol1.t, dy3dp[i,:])
-    axs[0,0].set_ylabel('numaxG')
-    axs[1,0].set_ylabel('KSPG')
-    axs[2,0].set_ylabel('KiPG')
     plt.show()
+    return sol, dydp, names
 
 
 def main():
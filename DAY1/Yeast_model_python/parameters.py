@@ -1,129 +1,20 @@
 # [1] Krishnan et al, 1999
 # [2] Hanly et al, 2004
 # [3] Mauricio-Iglesias et al, 
-
-class Parameters():
-    '''Define all Parameters to be used in the model in a class'''
+try:
+    import yeast_fermentation
+except ModuleNotFoundError:                                         # Not installed: use the package of this repository
+    import os, sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+import yeast_fermentation
+
+
+class Parameters(yeast_fermentation.Parameters):
+    '''Define all Parameters to be used in the model in a class. The values
+    are the 'DAY1' set of yeast_fermentation/parameters.py, where every
+    parameter is listed with its unit and reference.'''
     def __init__(self):
-        ## 1. GLUCOSE UPTAKE RATE.
-        # numaxG = 2.6808  ;       # max consumption rate of glucose (1.0005)         h^-1       [1]
-        self.numaxG = 3.9872          # max consumption rate of glucose (1.0005)  h^-1       [1]
-        self.KSPG   = 0.14637         # affinity constant glucose to ethanol      g/L        [1]
-        self.KiPG   = 4752.8          # inhibition constant glucose to ethanol    g/L        [1]
-        # p(1:3) = [numaxG, KSPG, KiPG];
-
-        ## 2. XYLOSE UPTAKE RATE.
-        #numaxX = 4.4851;         # max consumption rate of xylose            h^-1       [1]
-        self.numaxX = 7.0531          # max consumption rate of xylose            h^-1       [1]
-        self.KSPX   = 0.58763         # affinity constant xylose to ethanol       g/L        [1]
-        self.KiPX   = 21.608          # inhibition constant xylose to ethanol     g/L        [1]
-        # p(4:6) = [numaxX, KSPX, KiPX];
-
-        ## 3. FURFURAL UPTAKE RATE.
-        self.numaxFur = 0.14309       # max uptake rate of furfural               h^-1       [2]
-        self.KSFur    = 0.05          # affinity constant furfural                g/L        [2]
-        #p(7:8) = [numaxFur, KSFur];
-
-        ## 4. FURFURAL CONVERSION INTO FURFURYL ALCOHOL.
-        self.Y_FA_Fur = 1.02          # yield coefficient FA/Fur                  gFA/gFur   [2]
-        #p(9) = Y_FA_Fur;
-        
-        ## 5. FURFURYL ALCOHOL INHIBITS GLUCOSE UPTAKE RATE.
-        self.KiFAg = 5                # inhibition constant of FA on Glu uptake   g/L        [2]3
-        #p(10) = KiFAg;
-
-        ## 6. FURFURYL ALCOHOL INHIBITS XYLOSE UPTAKE RATE.
-        self.KiFAx = 6                # inhibition constant of FA on Xyl uptake   g/L        [2]
-        #p(11) = KiFAx;
-
-        ## 7. FURFURAL INHIBITS GLUCOSE UPTAKE RATE.
-        self.KiFurg = 0.4529          # inhibition constant of Fur on Glu uptake  g/L        [2]
-        #p(12) = KiFurg;
-
-        ## 8. FURFURAL INHIBITS XYLOSE UPTAKE RATE.
-        self.KiFurx = 0.35            # inhibition constant of Fur on Xyl uptake  g/L        [2]
-        #p(13) = KiFurx;
-
-        ## 9. FURFURAL INHIBITS HMF UPTAKE RATE.
-        self.KiFurHMF = 0.25          # inhibition constant of Fur on HMF         g/L        [2]
-        #p(14) = KiFurHMF;
-
-        ## 10. HMF INHIBITS GLUCOSE UPTAKE RATE.
-        self.KiHMFg = 2               # inhibition constant of HMF on Glu         g/L        [2]
-        #p(15) = KiHMFg;
-
-        ## 11. HMF INHIBITS XYLOSE UPTAKE RATE.
-        self.KiHMFx = 10              # inhibition constant of HMF on Xyl         g/L        [2]
-        #p(16) = KiHMFx;
-
-        ## 12. HMF UPTAKE RATE. 
-        self.numaxHMF = 0.3154        # max uptake rate of HMF                    h^-1       [2]
-        self.KSHMF = 0.5              # affinity constant HMF                     g/L        [2]
-        #p(17:18) = [numaxHMF, KSHMF];
-
-        ## 13. pH INFLUENCES THE PAIR HAc/Ac.
-        self.pH = 5.5                 # pH is controlled
-        self.pKa = 4.75               # pKa of acetic acid.
-
-        ## 14. HAc UPTAKE RATE.
-        self.numaxHAc = 0.0443*0.001     # max uptake rate of HAc                    h^-1       [2]
-        self.KSHAc = 2.5                 # affinity constant HAc                     g/L        [2]
-        #p(19:20) = [numaxHAc, KSHAc];
-
-        ## 15. HMF CONVERSION INTO HAc
-        self.Y_HAc_HMF = 0.534        # yield coefficient HAc/HMF                 gHAc/gHMF  [2], [3]
-        #p(21) = Y_HAc_HMF;
-
-        ## 16. HAc INHIBITS GLUCOSE UPTAKE RATE.
-        # KiHAcg = 5.1827;         # inhibition constant of HAc on Glu         g/L        [2]
-        self.KiHAcg = 1.9558          # inhibition constant of HAc on Glu         g/L        [2]
-        # p(22) = KiHAcg;
-
-        ## 17. HAc INHIBITS XYLOSE UPTAKE RATE.
-        # KiHAcx = 0.73;           # inhibition constant of HAc on Xyl         g/L        [2]
-        self.KiHAcx = 0.9604          # inhibition constant of HAc on Xyl         g/L        [2]
-        # p(23) = KiHAcx;
-
-        ## 18. PRODUCTION OF ETHANOL FORM GLUCOSE AND XYLOSE.
-        # YPSg = 0.42;             # yield ethanol-glucose                     gEtOH/gGlu [1]
-        self.YPSg = 0.4108            # yield ethanol-glucose                     gEtOH/gGlu [1]
-
-        self.YPSx = 0.24              # yield ethanol-xylose                      gEtOH/gGlu [1]
-        # p(24:25) = [YPSg, YPSx];
-
-        ## 19. ETHANOL INHIBITS THE UPTAKE OF GLUCOSE AND XYLOSE.
-        self.PMPg = 32.04             # inhibition constant for glucose           g/L        [1]
-        self.gammaG = 1.42            # exponent factor inhibition glucose        g/L        [1]
-        self.PMPx = 23.442            # inhibition constant for xylose            g/L        [1]
-        # PMPx = 20.9778;          # inhibition constant for xylose            g/L        [1]
-        self.gammaX = 1.5533          # exponent factor inhibition xylose         g/L        [1]
-        # gammaX = 1.7376;         # exponent factor inhibition xylose         g/L        [1]
-        # p(26:29) = [PMPg, gammaG, PMPx, gammaX];
-
-        ## 20. CELL GROWTH.
-        self.mGlu = 2.69E-5           # maintenance constant from glucose         g/L        [1]
-        self.mXyl = 1.86E-5           # maintenance constant from xylose          g/L        [1]
-        self.YXSg = 0.115            # yield X-Glu                               gX/gGlu    [1]
-        self.YXSx = 0.162             # yield X-Xyl                               gX/gXyl    [1]
-        self.mumaxG = 0.3308          # max growth of X from Glu                  h-1        [1]
-        self.mumaxX = 1.0008          # max frowth of X from Xyl                  h-1        [1]
-        # KSPGgr = 0.565;         # affinity constant glucose to growth       g/L        [1]
-        # KiPGgr = 283.7;         # inhibition constant glucose to growth     g/L        [1]
-        # KSPXgr = 3.4;           # affinity constant xylose to growth        g/L        [1]
-        # KiPXgr = 18.1;          # inhibition constant xylose to growth      g/L        [1]
-        # PMXg   = 95.4 ;         # max EtOH concentration for growth glucose g/L        [1]
-        # PMXx   = 59.04;         # max EtOH concentration for growth xylose  g/L        [1]
-        # p(30:35) = [mGlu, mXyl,YXSg, YXSx, mumaxG, mumaxX];
-
-        ## 21. CATABOLITE REPRESSION.
-        self.KiGlu = 5                # inhibition constant of Glu to Xyl         g/L        Unknown
-        # p(36) = KiGlu;
-
-        ## 22. ACETIC ACID IS USED FOR MAINTENANCE.
-        self.mHAc = 0                 # maintenance constant from HAc              g/L        Unknown
-        self.YXSHAc = 0               # yield acetate biomass                      g/L        Unknown 
-        # p(38:39) = [mHAc, YXSHAc];
-
+        super().__init__('DAY1')
 
         ## COLLECT PARAMETER NAMES
         self.par_names = {'numaxG', 'KSPG', 'KiPG', 'numaxX', 'KSPX', 'KiPX', 'numaxFur', 'KSFur', 'Y_FA_Fur', 'KiFAg', 'KiFAx', 'KiFurg',
@@ -135,4 +26,3 @@ class Parameters():
 
 if __name__=='__main__':
     par = Parameters()
-    print(par.mHAc)
\ No newline at end of file
@@ -0,0 +1,78 @@
+import numpy as np
+from scipy.integrate import solve_ivp
+from model import kinetics, kinetics_jac, kinetics_dfdp, parameter_fields
+
+
+## FORWARD SENSITIVITY ANALYSIS.
+# The sensitivities S = dy/dp of the states y to the parameters p obey
+#     dS/dt = J(t,y) S + df/dp(t,y),      S(0) = 0
+# with J = df/dy (kinetics_jac) and df/dp (kinetics_dfdp). They are
+# integrated together with the model in one solve, so the full sensitivity
+# matrix has no finite-difference truncation error and costs one solve
+# instead of one solve per parameter.
+
+def sensitivity_rhs(t, z, par, names):
+    '''Right-hand side of the model (8 states) augmented with the sensitivities (8 x len(names))'''
+    nx, npar = 8, len(names)
+    x = z[:nx]
+    S = z[nx:].reshape(nx, npar)
+    dSdt = kinetics_jac(t, x, par) @ S + kinetics_dfdp(t, x, par, names)
+    return np.concatenate((kinetics(t, x, par), dSdt.ravel()))
+
+def sensitivity_jac(t, z, par, names):
+    '''Jacobian of sensitivity_rhs, neglecting the dependence of J on y in the
+    sensitivity rows (block diagonal); good enough for the Newton iterations'''
+    J = kinetics_jac(t, z[:8], par)
+    Jz = np.zeros((len(z), len(z)))
+    Jz[:8, :8] = J
+    npar = len(names)
+    # S is stored row-major (state, parameter): d(JS)/dS couples S[k,p] to S[i,p]
+    Jz[8:, 8:] = np.kron(J, np.eye(npar))
+    return Jz
+
+def sensitivities(par, init, t_eval, names=None, method='LSODA', rtol=1e-8, atol=1e-8):
+    '''Solve the model and its forward sensitivities on t_eval.
+
+    Returns (sol, dydp, names): the solution of the augmented system (states
+    in sol.y[:8]), dydp of shape (8, len(names), len(t_eval)) and the parameter
+    names, by default all numeric fields of par.'''
+    if names is None:
+        names = parameter_fields(par)
+    names = list(names)
+    z0 = np.concatenate((np.asarray(init, dtype=float), np.zeros(8 * len(names))))
+    tspan = (t_eval[0], t_eval[-1])
+    sol = solve_ivp(sensitivity_rhs, t_span=tspan, y0=z0, args=(par, names), t_eval=t_eval,
+                    method=method, jac=sensitivity_jac, rtol=rtol, atol=atol)
+    dydp = sol.y[8:].reshape(8, len(names), -1)
+    return sol, dydp, names
+
+def relative_sensitivities(par, y, dydp, names):
+    '''Scaled sensitivities p/y dy/dp (same shape as dydp), zero where y is zero'''
+    p = np.array([getattr(par, name) for name in names], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel = dydp * p[None, :, None] / y[:, None, :]
+    return np.nan_to_num(rel, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+if __name__=='__main__':
+    from parameters import Parameters
+    from model import initial_values
+    par = Parameters()
+    init = initial_values()
+    time = np.arange(0, 50, 0.1)
+    sol, dydp, names = sensitivities(par, init, time)
+    print(f'{len(names)} parameters, {sol.nfev} function evaluations')
+
+    # Check against central finite differences for a few parameters
+    for name in ['numaxG', 'KSPG', 'KiPG', 'YPSg', 'gammaX']:
+        k = names.index(name)
+        p0 = getattr(par, name)
+        h = 1e-4 * abs(p0)
+        ys = []
+        for p in [p0 + h, p0 - h]:
+            setattr(par, name, p)
+            ys.append(solve_ivp(kinetics, t_span=(0, time[-1]), y0=init, args=(par,), t_eval=time,
+                                method='LSODA', jac=kinetics_jac, rtol=1e-11, atol=1e-11).y)
+        setattr(par, name, p0)
+        fd = (ys[0] - ys[1]) / (2*h)
+        print(f'{name:8s} max |dy/dp - FD| = {np.max(np.abs(dydp[:, k, :] - fd)):.2e}  (max |dy/dp| = {np.max(np.abs(fd)):.2e})')
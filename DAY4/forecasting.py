@@ -0,0 +1,115 @@
+import warnings
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+
+
+## ROLLING (WALK-FORWARD) ARIMA FORECASTING.
+# The walk-forward validation of data_smoothng.ipynb refits an ARIMA model
+# on the whole history for every test point. Here the model is fitted once;
+# each new observation is then added with results.extend(), which runs the
+# Kalman filter over the new observation only, with the fitted parameters
+# kept fixed. The model is refitted (warm-started from the current
+# parameters) every refit_every observations, or when the drift check
+# fires: the mean squared standardized one-step forecast error over the last
+# drift_window observations exceeds drift_threshold (it is 1 for a model
+# that still describes the data).
+
+class RollingARIMA():
+    '''ARIMA forecaster updated by state-space filtering instead of refitting'''
+    def __init__(self, order=(15,1,0), seasonal_order=(0,1,0,12), refit_every=None,
+                 drift_window=12, drift_threshold=4.0, method='statespace'):
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.refit_every = refit_every
+        self.drift_window = drift_window
+        self.drift_threshold = drift_threshold
+        self.method = method
+        self.history = []
+        self.results = None
+        self.refits = 0
+        self.since_refit = 0
+        self.z2 = []                        # Squared standardized forecast errors since the last refit
+
+    def fit(self, history):
+        '''(Re)fit on history, warm-started from the current parameters'''
+        self.history = list(history)
+        start_params = None if self.results is None else self.results.params
+        model = ARIMA(np.asarray(self.history), order=self.order, seasonal_order=self.seasonal_order)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.results = model.fit(method=self.method, start_params=start_params)
+        self.refits += 1
+        self.since_refit = 0
+        self.z2 = []
+        return self
+
+    def forecast(self):
+        '''One step ahead forecast and its variance'''
+        f = self.results.get_forecast(1)
+        return float(np.asarray(f.predicted_mean)[0]), float(np.asarray(f.var_pred_mean)[0])
+
+    def drift(self):
+        '''True when the recent forecast errors are too large for the fitted model'''
+        if len(self.z2) < self.drift_window:
+            return False
+        return np.mean(self.z2[-self.drift_window:]) > self.drift_threshold
+
+    def update(self, obs, yhat=None, var=None):
+        '''Add one observation; refit if scheduled or if drift is detected'''
+        if yhat is None:
+            yhat, var = self.forecast()
+        self.z2.append((obs - yhat)**2 / var if var > 0 else 0.0)
+        self.history.append(obs)
+        self.since_refit += 1
+        if (self.refit_every and self.since_refit >= self.refit_every) or self.drift():
+            self.fit(self.history)
+        else:
+            self.results = self.results.extend(np.array([obs]))
+        return self
+
+
+def walk_forward(series, order=(15,1,0), seasonal_order=(0,1,0,12), train_fraction=0.66, **kwargs):
+    '''Walk-forward validation as in data_smoothng.ipynb, with a RollingARIMA.
+    Returns (test, predictions, rmse, forecaster).'''
+    X = np.asarray(series, dtype=np.float64)
+    size = int(len(X) * train_fraction)
+    train, test = X[0:size], X[size:len(X)]
+    forecaster = RollingARIMA(order, seasonal_order, **kwargs).fit(train)
+    predictions = []
+    for obs in test:
+        yhat, var = forecaster.forecast()
+        predictions.append(yhat)
+        forecaster.update(obs, yhat, var)
+    predictions = np.array(predictions)
+    rmse = np.sqrt(np.mean((test - predictions)**2))            # Same as sqrt(mean_squared_error(test, predictions))
+    return test, predictions, rmse, forecaster
+
+
+def walk_forward_refit(series, order=(15,1,0), seasonal_order=(0,1,0,12), train_fraction=0.66):
+    '''Reference walk-forward validation of the notebook: one full fit per test point'''
+    X = np.asarray(series, dtype=np.float64)
+    size = int(len(X) * train_fraction)
+    train, test = X[0:size], X[size:len(X)]
+    history = [x for x in train]
+    predictions = list()
+    for t in range(len(test)):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model_fit = ARIMA(history, order=order, seasonal_order=seasonal_order).fit(method='statespace')
+        predictions.append(model_fit.forecast()[0])
+        history.append(test[t])
+    rmse = np.sqrt(np.mean((test - np.array(predictions))**2))
+    return test, np.array(predictions), rmse
+
+
+if __name__=='__main__':
+    import os
+    from time import perf_counter
+    data = np.loadtxt(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.csv'))
+    tic = perf_counter()
+    test, predictions, rmse, forecaster = walk_forward(data)
+    t_roll = perf_counter() - tic
+    print(f'Rolling: Test RMSE: {rmse:.3f}  ({t_roll:.1f} s, {forecaster.refits} fit(s))')
+    tic = perf_counter()
+    _, _, rmse_ref = walk_forward_refit(data)
+    print(f'Refit:   Test RMSE: {rmse_ref:.3f}  ({perf_counter()-tic:.1f} s, {len(test)} fits)')
@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import itertools
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.stattools import kpss
+from statsmodels.tsa.seasonal import STL
+
+
+## PARALLEL ARIMA ORDER SELECTION.
+# Every candidate (p,d,q)(P,D,Q,s) of a grid is fitted in a process pool, in
+# two stages (successive halving):
+#   1. a partial fit with a few optimizer iterations for every candidate,
+#   2. a full fit only for the candidates whose partial-fit information
+#      criterion is within margin of the best one (at most keep of them).
+# Fits are cached by order and data hash (parameters and information
+# criteria as JSON), so repeated searches, and later stages, reuse them.
+# A fitted model is rebuilt from the cached parameters with model.filter(),
+# which costs one Kalman filter pass instead of an optimization.
+# Information criteria of fits with different differencing orders are
+# likelihoods of different series and cannot be compared: as in auto_arima,
+# the differencing (d, D) is fixed first by tests (seasonal strength for D,
+# KPSS for d) and only the candidates with that differencing are ranked.
+
+def data_hash(data):
+    '''SHA-256 of the series values'''
+    return hashlib.sha256(np.ascontiguousarray(data, dtype=np.float64).tobytes()).hexdigest()
+
+def grid(p=range(0, 6), d=range(0, 2), q=range(0, 4), P=(0,), D=(0,), Q=(0,), s=0):
+    '''All candidate (order, seasonal_order) pairs of the ranges'''
+    seasonal = [(P_, D_, Q_, s if (P_, D_, Q_) != (0, 0, 0) else 0) for P_, D_, Q_ in itertools.product(P, D, Q)]
+    return [((p_, d_, q_), so) for p_, d_, q_ in itertools.product(p, d, q) for so in seasonal]
+
+def nsdiffs(data, s, threshold=0.64):
+    '''Seasonal differencing order D (0 or 1): 1 if the STL seasonal strength exceeds threshold'''
+    data = np.asarray(data, dtype=np.float64)
+    if s < 2 or len(data) < 2*s:
+        return 0
+    res = STL(data, period=s).fit()
+    strength = max(0.0, 1 - np.var(res.resid)/np.var(res.seasonal + res.resid))
+    return int(strength > threshold)
+
+def ndiffs(data, alpha=0.05, max_d=2):
+    '''Differencing order d: difference until the KPSS test no longer rejects level stationarity'''
+    x = np.asarray(data, dtype=np.float64)
+    d = 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')                             # p-values outside the KPSS table
+        while d < max_d and kpss(x, regression='c', nlags='auto')[1] < alpha:
+            x = np.diff(x)
+            d += 1
+    return d
+
+def differencing(data, s=0):
+    '''(d, D) of data for seasonal period s: D first, then d of the seasonally differenced series'''
+    data = np.asarray(data, dtype=np.float64)
+    D = nsdiffs(data, s) if s else 0
+    return ndiffs(data[s:] - data[:-s] if D else data), D
+
+
+class FitCache():
+    '''Fitted ARIMA parameters and information criteria keyed by order and data hash'''
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get('ARIMA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'yeast_fermentation', 'arima'))
+        self.path = path
+        self.memory = {}
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(digest, order, seasonal_order, maxiter):
+        return hashlib.sha256(repr((digest, tuple(order), tuple(seasonal_order), maxiter)).encode()).hexdigest()
+
+    def get(self, key):
+        if key not in self.memory:
+            try:
+                with open(os.path.join(self.path, key + '.json')) as f:
+                    self.memory[key] = json.load(f)
+            except (FileNotFoundError, ValueError):
+                return None
+        return self.memory[key]
+
+    def put(self, key, fit):
+        self.memory[key] = fit
+        tmp = os.path.join(self.path, f'{key}.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(fit, f)
+        os.replace(tmp, os.path.join(self.path, key + '.json'))
+
+
+def fit_order(data, order, seasonal_order=(0,0,0,0), maxiter=50):
+    '''Fit one candidate; returns a dict with aic, bic, params and converged,
+    or infinite aic and bic and the error of a candidate that can not be fitted'''
+    try:
+        model = ARIMA(np.asarray(data, dtype=np.float64), order=order, seasonal_order=seasonal_order)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            res = model.fit(method='statespace', method_kwargs={'maxiter': maxiter})
+        converged = bool(res.mle_retvals.get('converged', True)) if res.mle_retvals else True
+        return {'order': list(order), 'seasonal_order': list(seasonal_order), 'aic': float(res.aic),
+                'bic': float(res.bic), 'params': [float(v) for v in res.params], 'converged': converged,
+                'maxiter': maxiter}
+    except Exception as err:                                        # Any failure only rules out this candidate
+        return {'order': list(order), 'seasonal_order': list(seasonal_order), 'aic': np.inf, 'bic': np.inf,
+                'params': [], 'converged': False, 'maxiter': maxiter, 'error': f'{type(err).__name__}: {err}'}
+
+def _fit_task(args):
+    return fit_order(*args)
+
+def _fit_all(data, digest, candidates, maxiter, cache, pool):
+    '''Fit candidates that are not cached yet (in pool), return all fits'''
+    keys = [FitCache.key(digest, o, so, maxiter) for o, so in candidates]
+    fits = [cache.get(k) for k in keys]
+    todo = [i for i, f in enumerate(fits) if f is None]
+    tasks = [(data, candidates[i][0], candidates[i][1], maxiter) for i in todo]
+    results = pool.map(_fit_task, tasks) if pool is not None else map(_fit_task, tasks)
+    for i, fit in zip(todo, results):
+        cache.put(keys[i], fit)
+        fits[i] = fit
+    return fits
+
+
+def search(data, candidates=None, criterion='aic', partial_iter=5, full_iter=50, margin=10.0, keep=8,
+           workers=None, cache=None, d=None, D=None):
+    '''Select an ARIMA order for data among candidates (default grid()).
+    Only the candidates with the differencing orders d and D are ranked;
+    by default these are chosen by differencing() for the largest seasonal
+    period of the candidates. Returns the full fits sorted by criterion;
+    each is a dict with order, seasonal_order, aic, bic, params and converged.'''
+    data = np.asarray(data, dtype=np.float64)
+    candidates = grid() if candidates is None else [(tuple(o), tuple(so)) for o, so in candidates]
+    if d is None or D is None:
+        tested = differencing(data, max(so[3] for _, so in candidates))
+        d = tested[0] if d is None else d
+        D = tested[1] if D is None else D
+    candidates = [(o, so) for o, so in candidates if o[1] == d and so[1] == D]
+    if not candidates:
+        raise ValueError(f'no candidate with the differencing orders d={d}, D={D}')
+    cache = FitCache() if cache is None else cache
+    digest = data_hash(data)
+    pool = ProcessPoolExecutor(workers) if workers != 1 else None
+    try:
+        # Stage 1: partial fits of every candidate
+        partial = _fit_all(data, digest, candidates, partial_iter, cache, pool)
+        score = np.array([f[criterion] for f in partial])
+        best = np.min(score)
+        ranked = np.argsort(score)
+        survivors = [candidates[i] for i in ranked[:keep] if score[i] <= best + margin]
+        # Stage 2: full fits of the promising candidates
+        full = _fit_all(data, digest, survivors, full_iter, cache, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return sorted(full, key=lambda f: f[criterion])
+
+def rebuild(data, fit):
+    '''statsmodels results of a cached fit, without optimization'''
+    model = ARIMA(np.asarray(data, dtype=np.float64), order=tuple(fit['order']), seasonal_order=tuple(fit['seasonal_order']))
+    return model.filter(np.array(fit['params']))
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    data = np.loadtxt(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.csv'))
+    candidates = grid() + grid(p=(4, 5, 15), d=(0, 1), q=(0, 3), P=(0,), D=(1,), Q=(0, 2), s=12)
+    print('differencing (d, D):', differencing(data, 12))
+    for label in ['search', 'repeat (cached)']:
+        tic = perf_counter()
+        fits = search(data, candidates)
+        print(f'{label}: {len(candidates)} candidates in {perf_counter()-tic:.1f} s')
+    for fit in fits[:5]:
+        print(f"{tuple(fit['order'])}x{tuple(fit['seasonal_order'])}  AIC {fit['aic']:8.2f}  BIC {fit['bic']:8.2f}")
+    print(rebuild(data, fits[0]).forecast(3))
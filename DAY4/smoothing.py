@@ -0,0 +1,86 @@
+import numpy as np
+from scipy.signal import lfilter
+
+
+## EXPONENTIAL SMOOTHING.
+# S[0] = X[0]
+# S[n] = alpha * X[n] + (1-alpha) * S[n-1]
+# This is a first order recursive (IIR) filter, b = [alpha], a = [1, alpha-1].
+# scipy.signal.lfilter runs the recursion in compiled code on all columns at
+# once. Starting the filter at the second sample, with the initial condition
+# (1-alpha)*X[0], performs exactly the same floating point operations as the
+# loop in data_smoothng.ipynb, so the results are identical to exp_smooth.
+
+def exp_smooth(X, alpha0):
+    '''EXP_SMOOTH Exponential smoothing (reference loop of data_smoothng.ipynb).
+        Author: Kamil Wojcicki, UTD, January 2012.
+        Reference:
+        [1] Greg Stanley, 2011, "Exponential filtering",
+        url: http://tinyurl.com/exponential-filtering'''
+    alpha = alpha0
+    N, M = X.shape
+    S = np.zeros(shape=(N,M))
+    for m in range(M):
+        S[0, m] = X[0, m]
+        for n in range(1,N):
+            S[n, m] = alpha * X[n, m] + (1-alpha)*S[n-1, m]
+    return S
+
+def exp_smooth_fast(X, alpha):
+    '''Vectorized exp_smooth: X is (N,) or (N, M), smoothed along the samples'''
+    X = np.asarray(X, dtype=np.float64)
+    S = np.empty_like(X)
+    if X.shape[0] == 0:
+        return S
+    S[0] = X[0]
+    zi = np.expand_dims((1-alpha) * X[0], 0)                # Filter state before the second sample
+    S[1:], _ = lfilter([alpha], [1.0, alpha-1], X[1:], axis=0, zi=zi)
+    return S
+
+
+class ExpSmoother():
+    '''Streaming exponential smoother: feed chunks of samples (n,) or (n, M)
+    with update(); the last smoothed value is carried between chunks, so the
+    concatenated output equals exp_smooth of the concatenated input.'''
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.state = None                   # Last smoothed sample, None before the first one
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.shape[0] == 0:
+            return np.empty_like(chunk)
+        if self.state is None:
+            S = exp_smooth_fast(chunk, self.alpha)
+        else:
+            zi = np.expand_dims((1-self.alpha) * self.state, 0)
+            S, _ = lfilter([self.alpha], [1.0, self.alpha-1], chunk, axis=0, zi=zi)
+        self.state = S[-1].copy()
+        return S
+
+    def reset(self):
+        self.state = None
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    ## Case example of data_smoothng.ipynb: 2 noisy sinusoids sampled at 8 kHz
+    rng = np.random.default_rng(2)
+    alpha = 0.1
+    fs = 8E3
+    duration = 10
+    time = np.arange(start=0, stop=duration, step=1/fs)
+    X = np.zeros(shape=(len(time),2))
+    X[:,0] = 0.5*rng.normal(size=len(time)) + np.sin(2*np.pi*50*time+np.pi/9)
+    X[:,1] = 0.5*rng.normal(size=len(time)) + np.sin(2*np.pi*10*time+np.pi/3)
+
+    tic = perf_counter()
+    S_ref = exp_smooth(X, alpha)
+    t_ref = perf_counter() - tic
+    tic = perf_counter()
+    S = exp_smooth_fast(X, alpha)
+    t_fast = perf_counter() - tic
+    smoother = ExpSmoother(alpha)
+    S_stream = np.concatenate([smoother.update(chunk) for chunk in np.array_split(X, 97)])
+    print(f'{len(time)} samples x 2: loop {t_ref*1e3:.0f} ms, lfilter {t_fast*1e3:.2f} ms')
+    print(f'identical to exp_smooth: batch {np.array_equal(S, S_ref)}, streaming {np.array_equal(S_stream, S_ref)}')
@@ -0,0 +1,196 @@
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy.optimize import OptimizeResult
+from warmup import SOURCES
+from yeast_fermentation.jitcache import source_hash
+from model import simulate, feed_values, Feed
+from schedules import simulate_schedule
+from parameters import nominal, as_record, names
+
+
+## CONTENT-ADDRESSED CACHE OF SIMULATION RESULTS.
+# A simulation is identified by a SHA-256 hash of everything that determines
+# its result: the initial state, every Parameters field, the feed vector, the
+# feed profile (the compiled Feed function, or a schedules table), tspan,
+# t_eval, the solver options and the sources of the compiled model
+# (warmup.SOURCES: the kinetics core, reactor.py and the DAY5 modules).
+# Results are kept in an in-memory LRU tier and in a directory of .npz
+# files, evicted least recently used first when the directory grows beyond
+# max_bytes. Failed solves are not stored.
+
+FIELDS = ['t', 'y', 'status', 'message', 'success', 'nfev', 'njev', 'nlu']
+
+_version = None
+
+def _model_version():
+    '''Hash of the model sources, so that editing the kinetics invalidates the cache (computed once per process)'''
+    global _version
+    if _version is None:
+        _version = source_hash(SOURCES)
+    return _version
+
+def _feed_profile(feed):
+    '''Bytes identifying a feed profile: the code of a (compiled) function, or the data of a table'''
+    func = getattr(feed, 'py_func', feed)
+    if callable(func):
+        code = func.__code__
+        return code.co_code + repr(code.co_consts).encode()
+    if isinstance(feed, (tuple, list)):
+        return b''.join(np.ascontiguousarray(a, dtype=np.float64).tobytes() for a in feed)
+    return np.ascontiguousarray(feed, dtype=np.float64).tobytes()
+
+def simulation_key(init, par, Cfeed, tspan, t_eval, method, rtol, atol, feed=Feed):
+    '''Stable hex key of one simulation'''
+    h = hashlib.sha256()
+    def add(label, data):
+        h.update(label.encode())
+        h.update(len(data).to_bytes(8, 'little'))
+        h.update(data)
+    add('model', _model_version().encode())
+    add('init', np.ascontiguousarray(init, dtype=np.float64).tobytes())
+    par = as_record(par)
+    add('par', np.array([par[name] for name in names], dtype=np.float64).tobytes())
+    add('Cfeed', np.ascontiguousarray(Cfeed, dtype=np.float64).tobytes())
+    add('feed', _feed_profile(feed))
+    add('tspan', np.asarray(tspan, dtype=np.float64).tobytes())
+    add('t_eval', b'' if t_eval is None else np.ascontiguousarray(t_eval, dtype=np.float64).tobytes())
+    add('options', repr((str(method), float(rtol), float(atol))).encode())
+    return h.hexdigest()
+
+
+def _copy(res):
+    '''Copy of a stored result, so that callers cannot modify the cached arrays'''
+    return OptimizeResult({name: np.copy(value) if isinstance(value, np.ndarray) else value
+                           for name, value in res.items()})
+
+
+class SimulationCache():
+    '''Two-tier (memory, disk) LRU cache around model.simulate'''
+    def __init__(self, path=None, max_bytes=512*2**20, memory_items=128):
+        if path is None:
+            path = os.environ.get('YEAST_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'yeast_fermentation'))
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key):
+        '''Cached result for key, or None. The result is a copy, the caller may modify it.'''
+        file = self._file(key)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            try:
+                os.utime(file)                              # Keep the file of a memory hit recent for evict()
+            except OSError:
+                pass
+            return _copy(self.memory[key])
+        try:
+            with np.load(file, allow_pickle=False) as data:
+                res = OptimizeResult({name: data[name][()] if data[name].ndim == 0 else data[name] for name in FIELDS})
+            res.message = str(res.message)
+            os.utime(file)                                  # Mark as recently used
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        self._remember(key, res)
+        return _copy(res)
+
+    def put(self, key, res):
+        '''Store a result under key (memory and disk), then evict if needed'''
+        res = OptimizeResult({name: res[name] for name in FIELDS})
+        self._remember(key, res)
+        tmp = self._file(key) + f'.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **{name: np.asarray(res[name]) for name in FIELDS})
+        os.replace(tmp, self._file(key))                    # Atomic for concurrent readers
+        self.evict()
+        return _copy(res)
+
+    def _remember(self, key, res):
+        self.memory[key] = res
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        '''Delete the least recently used files until the store fits in max_bytes'''
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npz'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        '''Empty both tiers'''
+        self.memory.clear()
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npz'):
+                os.remove(entry.path)
+
+    def simulate(self, init, par=None, Cfeed=None, tspan=(0,50), t_eval=None, method='LSODA', rtol=1e-8, atol=1e-8,
+                 schedule=None):
+        '''model.simulate with caching, same arguments, or schedules.simulate_schedule
+        with the feed table schedule. Returns an OptimizeResult with the fields
+        t, y, status, message, success, nfev, njev and nlu; failed solves are
+        returned but not cached.'''
+        if par is None:
+            par = nominal()
+        init = np.asarray(init, dtype=np.float64)
+        if Cfeed is None:
+            Cfeed = feed_values(init)
+        feed = Feed if schedule is None else np.ascontiguousarray(schedule, dtype=np.float64)
+        key = simulation_key(init, par, Cfeed, tspan, t_eval, method, rtol, atol, feed)
+        res = self.get(key)
+        if res is not None:
+            self.hits += 1
+            return res
+        self.misses += 1
+        if schedule is None:
+            sol = simulate(init, par=par, Cfeed=Cfeed, tspan=tspan, t_eval=t_eval, method=method, rtol=rtol, atol=atol)
+        else:
+            sol = simulate_schedule(init, feed, par=par, Cfeed=Cfeed, tspan=tspan, t_eval=t_eval, method=method,
+                                    rtol=rtol, atol=atol)
+        if not sol.success:
+            return OptimizeResult({name: sol[name] for name in FIELDS})
+        return self.put(key, sol)
+
+
+_default = None
+
+def cached_simulate(*args, **kwargs):
+    '''model.simulate through a shared SimulationCache in the default location'''
+    global _default
+    if _default is None:
+        _default = SimulationCache()
+    return _default.simulate(*args, **kwargs)
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    from model import initial_values
+    cache = SimulationCache()
+    init = initial_values()
+    for label in ['first run', 'repeat (memory)']:
+        tic = perf_counter()
+        sol = cache.simulate(init)
+        print(f'{label:18s} {1e3*(perf_counter()-tic):8.2f} ms')
+    cache.memory.clear()
+    tic = perf_counter()
+    sol = cache.simulate(init)
+    print(f'{"repeat (disk)":18s} {1e3*(perf_counter()-tic):8.2f} ms   hits={cache.hits} misses={cache.misses}')
@@ -0,0 +1,164 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.optimize import OptimizeResult
+from model import simulate, feed_values
+from parameters import dtype, nominal
+from instrument import STATS
+from warmup import warmup
+
+
+## SAMPLERS.
+# A sampler takes a numpy Generator and returns (init, overrides): the 9
+# initial values and a dict of Parameters fields to change for this run.
+# Samplers are called inside the worker processes, so they must be defined at
+# module level (or in the notebook when the pool forks). Each run gets its own
+# Generator, so no global seed or shared parameter object is modified.
+
+def random_feedstock(rng):
+    '''Random feedstock of ML.ipynb: normal glucose and xylose (25% std), fixed inhibitor to glucose ratio'''
+    # Name     Value     Index     Units
+    Glu0_mu  =  39.7        # 1       g/L
+    Glu0 = rng.normal(loc=Glu0_mu, scale=Glu0_mu*0.25)
+    Xyl0_mu  =  23.5        # 2       g/L
+    Xyl0 = rng.normal(loc=Xyl0_mu, scale=Xyl0_mu*0.25)
+    ## fixed inhibitor to glucose ratio
+    Fur0  =  0.56   *(Glu0/Glu0_mu)        # 3       g/L
+    FA0   =  0      *(Glu0/Glu0_mu)        # 4       g/L
+    HMF0  =  0.2    *(Glu0/Glu0_mu)        # 5       g/L
+    HAc0  =  3.05   *(Glu0/Glu0_mu)        # 6       g/L
+    EtOH0 =  0.62        # 7       g/L
+    X0    =  1.75        # 8       g/L
+    V0    = 0.7          # 9       L
+    return [Glu0, Xyl0, Fur0, FA0, HMF0, HAc0, EtOH0, X0, V0], {}
+
+def variable_feedstock(rng):
+    '''Uniform feedstock ranges of BDG.ipynb'''
+    Glu0 = rng.uniform(35, 40)          # g/L
+    Xyl0 = rng.uniform(18, 28)          # g/L
+    Fur0 = rng.uniform(0.6, 2)          # g/L
+    FA0 = 0.0                           # g/L
+    HMF0 = rng.uniform(0.5, 2)          # g/L
+    HAc0 = rng.uniform(2, 3)            # g/L
+    EtOH0 = rng.uniform(0.2, 0.9)       # g/L
+    X0 = 5                              # g/L
+    V0 = 0.7                            # L
+    return [Glu0, Xyl0, Fur0, FA0, HMF0, HAc0, EtOH0, X0, V0], {}
+
+def variable_growth(rng):
+    '''Feedstock of variable_feedstock and 2-5% variation of the growth parameters (BDG.ipynb)'''
+    init, _ = variable_feedstock(rng)
+    par = nominal()
+    overrides = {}
+    for name in ['numaxG', 'numaxX', 'YPSg', 'YPSx', 'YXSg', 'YXSx']:
+        overrides[name] = par[name] * (1 + rng.uniform(0.02, 0.05))
+    return init, overrides
+
+
+## SIMULATION OF ONE CHUNK OF RUNS.
+def _warmup():
+    '''Compile (or load from the cache) the model once per worker process, before the first run'''
+    warmup('model')
+
+def _run_chunk(sampler, seeds, t_eval, tspan, method, rtol, atol, instrument=False):
+    '''Sample and simulate the runs of one chunk, returns stacked arrays'''
+    n, nt = len(seeds), len(t_eval)
+    inits = np.zeros((n, 9))
+    P = np.zeros(n, dtype=dtype)
+    Y = np.full((n, 9, nt), np.nan)
+    status = np.zeros(n, dtype=np.int64)
+    stats = np.zeros(n, dtype=STATS)                        # nfev, njev, nlu; all fields with instrument
+    for k, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        init, overrides = sampler(rng)
+        P[k] = nominal()
+        for name, value in overrides.items():
+            P[k][name] = value
+        inits[k] = init
+        sol = simulate(init, par=P[k], Cfeed=feed_values(inits[k]), tspan=tspan, t_eval=t_eval,
+                       method=method, rtol=rtol, atol=atol, instrument=instrument)
+        status[k] = sol.status
+        stats['nfev'][k], stats['njev'][k], stats['nlu'][k] = sol.nfev, sol.njev, sol.nlu
+        if instrument:
+            stats[k] = sol.stats.record()
+        Y[k, :, :sol.y.shape[1]] = sol.y
+    return inits, P, Y, status, stats
+
+
+## CAMPAIGN RUNNER.
+def run_seeds(seed, start, stop):
+    '''Integer seeds (int64 >= 0) of the runs start..stop of a campaign, derived
+    from the children SeedSequence(seed).spawn()[start:stop]'''
+    return np.array([np.random.SeedSequence(seed, spawn_key=(i,)).generate_state(1, np.uint64)[0] >> np.uint64(1)
+                     for i in range(start, stop)], dtype=np.int64)
+
+def run_campaign(sampler, n_runs, seed=0, workers=None, t_eval=None, tspan=(0,50),
+                 method='LSODA', rtol=1e-8, atol=1e-8, chunksize=None, mp_context=None, store=None,
+                 instrument=False):
+    '''Run n_runs simulations with initial values and parameters drawn by sampler.
+
+    Run i draws from its own stream np.random.default_rng(run_seeds(seed, 0, n_runs)[i]),
+    so results only depend on seed, never on the number of workers, and the
+    run seed kept in a store reproduces the run on its own. Runs are
+    distributed over a process pool in chunks; workers=1 runs in this process.
+    The pool forks by default (samplers may then be defined in a notebook);
+    once the process has run numba parallel code (TBB threading layer), a
+    fork can hang it at exit, so pass mp_context=get_context('spawn') then.
+
+    Returns an OptimizeResult with t (nt,), y (n_runs, 9, nt), init (n_runs, 9),
+    par (structured parameter array, see parameters.dtype), status (n_runs,)
+    and nfev/njev/nlu. With instrument, stats holds the solver counters and
+    timings of every run (instrument.STATS, see instrument.summary). If
+    store is a directory, chunks are written to a store.TrajectoryStore
+    there as they finish, and the store is returned instead, so the
+    trajectories never have to fit in memory.'''
+    if t_eval is None:
+        t_eval = np.linspace(tspan[0], tspan[1], 101)
+    t_eval = np.asarray(t_eval, dtype=np.float64)
+    seeds = run_seeds(seed, 0, n_runs)
+    args = (t_eval, tspan, method, rtol, atol, instrument)
+    workers = workers or os.cpu_count()
+    if chunksize is None:
+        # A few chunks per worker balances the load without much overhead
+        chunksize = max(1, n_runs // (4 * workers))
+    starts = range(0, n_runs, chunksize)
+    if store is not None:
+        from store import TrajectoryStore
+        store = TrajectoryStore.create(store, t_eval, n_runs)
+    parts = {}
+
+    def collect(start, part):
+        if store is None:
+            parts[start] = part
+            return
+        inits, P, Y, status, stats = part
+        index = slice(start, start + len(status))
+        store.write(index, Y.transpose(1, 0, 2), init=inits, par=P, seed=seeds[index], status=status,
+                    nfev=stats['nfev'], njev=stats['njev'], nlu=stats['nlu'])
+        store.flush()
+
+    if workers == 1:
+        for start in starts:
+            collect(start, _run_chunk(sampler, seeds[start:start+chunksize], *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_warmup) as pool:
+            futures = {pool.submit(_run_chunk, sampler, seeds[start:start+chunksize], *args): start
+                       for start in starts}
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+
+    if store is not None:
+        return store
+    inits, P, Y, status, stats = (np.concatenate(a) for a in zip(*[parts[k] for k in sorted(parts)]))
+    res = OptimizeResult(t=t_eval, y=Y, init=inits, par=P, status=status,
+                         nfev=stats['nfev'], njev=stats['njev'], nlu=stats['nlu'])
+    if instrument:
+        res.stats = stats
+    return res
+
+if __name__=='__main__':
+    from time import perf_counter
+    for workers in [1, None]:
+        tic = perf_counter()
+        res = run_campaign(random_feedstock, 100, seed=42, workers=workers)
+        print(f'workers={workers}: {perf_counter()-tic:.2f} s, furfural < 0.0005 in {np.sum(res.y[:,2,-1] < 0.0005)} runs')
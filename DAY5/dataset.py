@@ -0,0 +1,172 @@
+import os
+import json
+from functools import partial
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.optimize import OptimizeResult
+from model import feed_values
+from campaign import _run_chunk, _warmup, run_seeds, random_feedstock
+from store import STATES
+
+
+## FEATURES.
+# A feature maps a chunk of runs to one column: f(t, Y, init, P) -> (n,),
+# with Y (n, 9, nt) the trajectories, init (n, 9) the initial values and P
+# the structured parameter array. The builders below return picklable
+# functions (partials of module-level functions), so that the features can
+# be computed in the worker processes, next to the simulations.
+
+def _state(name):
+    return STATES.index(name) if isinstance(name, str) else name
+
+def _initial(k, t, Y, init, P):
+    return init[:, k]
+
+def _parameter(name, t, Y, init, P):
+    return P[name]
+
+def _final(k, t, Y, init, P):
+    return Y[:, k, -1]
+
+def _below(k, level, t, Y, init, P):
+    return Y[:, k, -1] < level
+
+def _maximum(k, t, Y, init, P):
+    return np.max(Y[:, k], axis=1)
+
+def _yield(k, t, Y, init, P):
+    V0, V = init[:, 8], Y[:, 8, -1]
+    Cfeed = feed_values(init.T).T                                   # Feed composition of every run
+    sugars_in = (init[:, 0] + init[:, 1]) * V0 + (Cfeed[:, 0] + Cfeed[:, 1]) * (V - V0)
+    sugars_left = (Y[:, 0, -1] + Y[:, 1, -1]) * V
+    fed = Cfeed[:, k] * (V - V0)
+    return (Y[:, k, -1] * V - init[:, k] * V0 - fed) / (sugars_in - sugars_left)
+
+def initial(state):
+    '''Initial value of a state (input column)'''
+    return partial(_initial, _state(state))
+
+def parameter(name):
+    '''Parameters field of the run (input column)'''
+    return partial(_parameter, name)
+
+def final(state):
+    '''Concentration at t_end, e.g. the ethanol titre final('Ethanol')'''
+    return partial(_final, _state(state))
+
+def below(state, level):
+    '''True when the state is below level at t_end (ML.ipynb: below('Furfural', 0.0005))'''
+    return partial(_below, _state(state), level)
+
+def maximum(state):
+    '''Maximum of a state over the run'''
+    return partial(_maximum, _state(state))
+
+def product_yield(state='Ethanol'):
+    '''Mass of product formed per mass of glucose and xylose consumed (fed included)'''
+    return partial(_yield, _state(state))
+
+FEATURES = {'Glucose0': initial('Glucose'),
+            'Xylose0': initial('Xylose'),
+            'furfural_depleted': below('Furfural', 0.0005)}
+
+
+## CHUNKED PIPELINE.
+# The dataset is a directory of fixed-size chunks, chunk_00000.npz, ...,
+# one column per feature plus run and status, and meta.json with the
+# configuration. A chunk file is written atomically when its runs are done,
+# so an existing chunk is complete, and a restarted generate() only runs
+# the missing ones. Run i uses the random stream of campaign.run_seeds (the
+# same as campaign.run_campaign), whatever the chunking or the workers.
+
+def _chunk_file(path, c):
+    return os.path.join(path, f'chunk_{c:05d}.npz')
+
+def _make_chunk(path, c, start, stop, sampler, features, seed, t_eval, tspan, method, rtol, atol):
+    '''Sample, simulate and extract the features of runs start..stop, write chunk c'''
+    inits, P, Y, status, _ = _run_chunk(sampler, run_seeds(seed, start, stop), t_eval, tspan, method, rtol, atol)
+    columns = {'run': np.arange(start, stop), 'status': status}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name, feature in features.items():
+            columns[name] = np.asarray(feature(t_eval, Y, inits, P))
+    tmp = _chunk_file(path, c) + f'.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(tmp, _chunk_file(path, c))
+    return c
+
+def generate(path, sampler=random_feedstock, n_rows=1000, features=FEATURES, chunk_size=1000, seed=0,
+             workers=None, t_eval=None, tspan=(0,50), method='LSODA', rtol=1e-8, atol=1e-8, mp_context=None):
+    '''Generate (or resume) a dataset of n_rows runs of sampler in path.
+    features is a dict {column name: feature function}. Returns an
+    OptimizeResult with path, n_chunks, done (chunks written now) and
+    skipped (chunks already complete).'''
+    if t_eval is None:
+        t_eval = np.linspace(tspan[0], tspan[1], 101)
+    t_eval = np.asarray(t_eval, dtype=np.float64)
+    meta = {'sampler': getattr(sampler, '__name__', repr(sampler)), 'n_rows': n_rows, 'chunk_size': chunk_size,
+            'seed': seed, 'features': list(features), 'tspan': list(map(float, tspan)),
+            't_eval': [float(t_eval[0]), float(t_eval[-1]), len(t_eval)], 'method': method, 'rtol': rtol, 'atol': atol}
+    os.makedirs(path, exist_ok=True)
+    meta_file = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_file):
+        with open(meta_file) as f:
+            old = json.load(f)
+        if old != meta:
+            raise ValueError(f'{path} holds a dataset with another configuration: {old}')
+    else:
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f, indent=1)
+
+    n_chunks = -(-n_rows // chunk_size)
+    todo = [c for c in range(n_chunks) if not os.path.exists(_chunk_file(path, c))]
+    args = (sampler, features, seed, t_eval, tspan, method, rtol, atol)
+    bounds = {c: (c * chunk_size, min(n_rows, (c + 1) * chunk_size)) for c in todo}
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(todo) <= 1:
+        for c in todo:
+            _make_chunk(path, c, *bounds[c], *args)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_warmup) as pool:
+            futures = [pool.submit(_make_chunk, path, c, *bounds[c], *args) for c in todo]
+            for future in as_completed(futures):
+                future.result()
+    return OptimizeResult(path=path, n_chunks=n_chunks, done=len(todo), skipped=n_chunks - len(todo))
+
+
+def load(path, columns=None, as_frame=True):
+    '''Read the complete chunks of a dataset: a pandas DataFrame (or a dict of arrays)'''
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    n_chunks = -(-meta['n_rows'] // meta['chunk_size'])
+    parts = []
+    for c in range(n_chunks):
+        try:
+            with np.load(_chunk_file(path, c)) as data:
+                parts.append({name: data[name] for name in (columns or data.files)})
+        except FileNotFoundError:
+            continue
+    names = columns or (list(parts[0]) if parts else ['run', 'status'] + meta['features'])
+    table = {name: np.concatenate([p[name] for p in parts]) if parts else np.empty(0) for name in names}
+    if not as_frame:
+        return table
+    import pandas as pd
+    return pd.DataFrame(table)
+
+
+if __name__=='__main__':
+    import tempfile
+    import shutil
+    from time import perf_counter
+    path = os.path.join(tempfile.gettempdir(), 'random_feedstock_dataset')
+    shutil.rmtree(path, ignore_errors=True)
+    features = dict(FEATURES, ethanol_titre=final('Ethanol'), ethanol_yield=product_yield('Ethanol'))
+    tic = perf_counter()
+    res = generate(path, random_feedstock, 400, features, chunk_size=100, seed=42, workers=1)
+    print(f'{res.done} chunks written in {perf_counter()-tic:.1f} s')
+    os.remove(_chunk_file(path, 2))                                 # An interrupted run: one chunk missing
+    tic = perf_counter()
+    res = generate(path, random_feedstock, 400, features, chunk_size=100, seed=42, workers=1)
+    print(f'resume: {res.done} written, {res.skipped} skipped in {perf_counter()-tic:.1f} s')
+    data = load(path)
+    print(data.describe().loc[['mean', 'min', 'max']].T)
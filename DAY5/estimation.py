@@ -0,0 +1,169 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import least_squares, OptimizeResult
+from scipy.stats import qmc, t as student_t
+from model import feed_values
+from parameters import parameter_table
+from integrator import solve_ensemble
+
+
+## KINETIC PARAMETER ESTIMATION.
+# Weighted least squares fit of selected Parameters fields to measured
+# fermentation time series. An experiment is a dict with
+#     'init'  : the 9 initial values
+#     't'     : measurement times (nt,)
+#     'y'     : measured states (9, nt), np.nan where a state is not measured
+#     'sigma' : measurement standard deviation, scalar, (9,) or (9, nt)
+#     'Cfeed' : feed composition (optional, default feed_values(init))
+# The residuals of all experiments, and their Jacobian, come from a single
+# call of the lockstep ensemble integrator: every experiment is simulated at
+# the current parameters and at one forward perturbation per free parameter
+# (batched finite differences). Free parameters are scaled by their nominal
+# value so the optimizer works on numbers of order one. Several starts run
+# in parallel worker processes, and confidence intervals come from the
+# Fisher information J^T J at the best fit.
+
+
+def _grid(experiments):
+    '''Common time grid (union of all measurement times) and the indices of each experiment on it'''
+    grid = np.unique(np.concatenate([[0.0]] + [np.asarray(e['t'], dtype=float) for e in experiments]))
+    return grid, [np.searchsorted(grid, e['t']) for e in experiments]
+
+def _weights(experiments):
+    '''Measurement mask and 1/sigma for every experiment'''
+    masks, w = [], []
+    for e in experiments:
+        y = np.asarray(e['y'], dtype=float)
+        masks.append(~np.isnan(y))
+        sigma = np.asarray(e.get('sigma', 1.0), dtype=float)
+        if sigma.ndim == 1:
+            sigma = sigma[:, None]                                      # One value per state
+        w.append(np.broadcast_to(1 / sigma, y.shape))
+    return masks, w
+
+def _simulate(experiments, names, thetas, base, grid, rtol, atol):
+    '''Simulate every experiment for every parameter vector in thetas (m x p).
+    Returns the states on the grid, (m, n_exp, 9, nt), and the solver status.'''
+    m, n_exp = thetas.shape[0], len(experiments)
+    P = parameter_table(m * n_exp, base)
+    for k, name in enumerate(names):
+        P[name] = np.repeat(thetas[:, k], n_exp)
+    X0 = np.tile(np.array([e['init'] for e in experiments], dtype=float), (m, 1))
+    Cfeed = np.tile(np.array([e.get('Cfeed', feed_values(np.asarray(e['init'], dtype=float)))
+                              for e in experiments], dtype=float), (m, 1))
+    res = solve_ensemble(X0, P, Cfeed, grid, rtol=rtol, atol=atol)
+    return res.y.reshape(m, n_exp, 9, -1), res.status.reshape(m, n_exp)
+
+def _residuals(Y, experiments, index, masks, w):
+    '''Weighted residual vector of one simulated set of experiments Y (n_exp, 9, nt)'''
+    r = []
+    for e, Ye, idx, mask, we in zip(experiments, Y, index, masks, w):
+        r.append(((Ye[:, idx] - np.nan_to_num(e['y'])) * we)[mask])
+    return np.concatenate(r)
+
+
+def _fit_one(z0, experiments, names, nominal, lb, ub, base, rel_step, rtol, atol, max_nfev):
+    '''One local least squares fit from the scaled start z0'''
+    grid, index = _grid(experiments)
+    masks, w = _weights(experiments)
+    cache = {}
+
+    def evaluate(z):
+        key = z.tobytes()
+        if key not in cache:
+            cache.clear()
+            # Forward steps, taken backwards at an upper bound
+            h = rel_step * np.maximum(np.abs(z), 1.0)
+            h = np.where(z + h > ub, -h, h)
+            Z = np.repeat(z[None], len(z) + 1, axis=0)
+            Z[1:] += np.diag(h)
+            Y, status = _simulate(experiments, names, Z * nominal, base, grid, rtol, atol)
+            r = [_residuals(Y[i], experiments, index, masks, w) for i in range(len(Z))]
+            failed = np.any(status != 0, axis=1)
+            if failed[0]:
+                # Penalize a failed simulation with a finite residual and a zero
+                # Jacobian: the step to z is rejected, or the start stops there
+                cache[key] = (np.full_like(r[0], 1e6), np.zeros((len(r[0]), len(z))))
+                return cache[key]
+            J = np.column_stack([np.zeros_like(r[0]) if failed[j+1] else (r[j+1] - r[0]) / h[j]
+                                 for j in range(len(z))])                # No slope from a failed perturbation
+            cache[key] = (r[0], J)
+        return cache[key]
+
+    sol = least_squares(lambda z: evaluate(z)[0], z0, jac=lambda z: evaluate(z)[1],
+                        bounds=(lb, ub), method='trf', max_nfev=max_nfev)
+    return sol.x, sol.cost, sol.fun, sol.jac, sol.nfev, sol.status
+
+
+def fit(experiments, bounds, base=None, n_starts=4, workers=None, seed=0,
+        rel_step=1e-3, rtol=1e-7, atol=1e-9, max_nfev=50, alpha=0.05):
+    '''Fit the Parameters fields in bounds ({name: (lo, hi)}) to experiments.
+
+    base is an optional dict of fixed parameter values (default nominal).
+    The first start is the nominal value, the other n_starts-1 are a Latin
+    hypercube in the bounds; starts run in a process pool of workers
+    processes (workers=1 runs them in this process).
+    Returns an OptimizeResult with names, x, stderr, ci (p x 2, 1-alpha
+    confidence intervals), cov, cost, fun (weighted residuals) and the
+    costs of all starts.'''
+    names = list(bounds)
+    par = parameter_table(1, base)[0]
+    nominal = np.array([par[name] for name in names])
+    lb = np.array([bounds[name][0] for name in names]) / nominal
+    ub = np.array([bounds[name][1] for name in names]) / nominal
+
+    starts = [np.clip(np.ones(len(names)), lb, ub)]
+    if n_starts > 1:
+        u = qmc.LatinHypercube(d=len(names), seed=seed).random(n_starts - 1)
+        starts += list(lb + u * (ub - lb))
+    args = (experiments, names, nominal, lb, ub, base, rel_step, rtol, atol, max_nfev)
+    if workers == 1:
+        results = [_fit_one(z0, *args) for z0 in starts]
+    else:
+        with ProcessPoolExecutor(min(workers or os.cpu_count(), len(starts))) as pool:
+            results = list(pool.map(_fit_one, starts, *[[a]*len(starts) for a in args]))
+
+    best = min(results, key=lambda r: r[1])
+    z, cost, r, J = best[:4]
+    # Fisher information of the scaled parameters, with the residual variance
+    # estimated from the fit (close to 1 when sigma is right).
+    n, p = len(r), len(z)
+    s2 = 2 * cost / max(n - p, 1)
+    cov = np.linalg.pinv(J.T @ J) * s2 * np.outer(nominal, nominal)
+    stderr = np.sqrt(np.diag(cov))
+    x = z * nominal
+    q = student_t.ppf(1 - alpha/2, max(n - p, 1))
+    return OptimizeResult(names=names, x=x, stderr=stderr, ci=np.column_stack((x - q*stderr, x + q*stderr)),
+                          cov=cov, cost=cost, fun=r, nfev=best[4], status=best[5],
+                          start_costs=np.array([res[1] for res in results]))
+
+
+def synthetic_experiments(n, truth=None, t=np.linspace(2, 50, 13), noise=0.02, seed=0):
+    '''n fed-batches with random feedstock, simulated with the parameter values
+    truth (dict) and relative Gaussian noise on the 8 concentrations'''
+    from campaign import random_feedstock
+    rng = np.random.default_rng(seed)
+    inits = np.array([random_feedstock(rng)[0] for _ in range(n)])
+    experiments = [{'init': init, 't': t, 'y': None} for init in inits]
+    grid, index = _grid(experiments)
+    Y, _ = _simulate(experiments, [], np.zeros((1, 0)), truth, grid, 1e-9, 1e-11)
+    for e, Ye, idx in zip(experiments, Y[0], index):
+        y = Ye[:, idx].copy()
+        y[:8] *= 1 + noise * rng.standard_normal(y[:8].shape)
+        y[8] = np.nan                                                   # Volume is not measured
+        e['y'] = y
+        e['sigma'] = noise * np.maximum(np.abs(Ye[:, idx]), 0.05)
+    return experiments
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    truth = {'numaxG': 1.9, 'KSPG': 0.8, 'numaxX': 1.4, 'YPSg': 0.44, 'YXSg': 0.11}
+    experiments = synthetic_experiments(20, truth)
+    bounds = {name: (0.5*value, 2*value) for name, value in truth.items()}
+    tic = perf_counter()
+    res = fit(experiments, bounds, n_starts=2, workers=1)
+    print(f'fit in {perf_counter()-tic:.1f} s, cost {res.cost:.2f}, {len(res.fun)} residuals')
+    for name, x, ci in zip(res.names, res.x, res.ci):
+        print(f'{name:8s} {x:8.4f}  [{ci[0]:8.4f}, {ci[1]:8.4f}]   true {truth[name]}')
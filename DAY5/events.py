@@ -0,0 +1,186 @@
+import numpy as np
+from numba import njit
+from scipy.integrate import solve_ivp
+from scipy.optimize import OptimizeResult
+from model import stoichiometry, balances, rate_jacobian, balances_jac, feed_values
+
+
+## EVENT-AWARE FED-BATCH.
+# The feed of DAY3 (Feed(t, V)) switches on at t=2 and off when V>=2. Inside
+# the right hand side these switches are discontinuities that the adaptive
+# solver can only cross by rejecting steps. Here they are declared instead,
+# and the integration is split into smooth segments:
+#   - time events, feed_start and feed_stop: segment boundaries,
+#   - state events, located by root finding (solve_ivp events):
+#       'volume'     V reaches V_max: the feed stops, the run continues,
+#       'depletion'  glucose + xylose falls to S_min: the run stops,
+#       'ethanol'    ethanol reaches EtOH_target: the run stops.
+# On each segment the feed is F = F0 + dF*(t - feed_start) or 0, and the
+# solver is restarted from the state at the switch.
+
+@njit(cache=True)
+def fedbatch_switched(t, x, par, Cfeed, st, F0, dF, t_on):
+    '''fedbatch_jit with the feed F0 + dF*(t - t_on), args=(par, Cfeed, st, F0, dF, t_on)'''
+    dxdt = np.empty(9, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    balances(x, par, Cfeed, st, F0 + dF*(t - t_on), rates, dxdt)
+    return dxdt
+
+@njit(cache=True)
+def fedbatch_switched_jac(t, x, par, Cfeed, st, F0, dF, t_on):
+    '''Analytic Jacobian of fedbatch_switched'''
+    drdx = np.empty((5, 8), dtype=np.float64)
+    J = np.empty((9, 9), dtype=np.float64)
+    rate_jacobian(x, par, drdx)
+    balances_jac(x, Cfeed, st, F0 + dF*(t - t_on), drdx, J)
+    return J
+
+
+def _event(name, index, level, direction):
+    '''Terminal solve_ivp event for x[index] crossing level (index -1: glucose + xylose)'''
+    def event(t, x, *args):
+        return (x[0] + x[1] if index < 0 else x[index]) - level
+    event.__name__ = name
+    event.terminal = True
+    event.direction = direction
+    return event
+
+def _event_arrays(t_events, y_events):
+    '''t_events and y_events fields of the result: arrays (n,) and (n, 9) per event name'''
+    return {'t_events': {k: np.array(v, dtype=np.float64) for k, v in t_events.items()},
+            'y_events': {k: np.array(v, dtype=np.float64).reshape(-1, 9) for k, v in y_events.items()}}
+
+def simulate_events(init, par=None, Cfeed=None, tspan=(0,50), t_eval=None, F0=0.1, dF=0.005,
+                    feed_start=2.0, feed_stop=np.inf, V_max=2.0, S_min=None, EtOH_target=None,
+                    method='LSODA', rtol=1e-8, atol=1e-8, instrument=False):
+    '''Fed-batch with declared feed switches and stop conditions. The
+    defaults reproduce the DAY3 Feed(t, V). S_min and EtOH_target (None:
+    not used) end the run when reached.
+    Returns an OptimizeResult like solve_ivp (t, y, status, message, nfev,
+    njev, nlu) with t_events and y_events as dicts by event name
+    ('feed_start', 'feed_stop', 'volume', 'depletion', 'ethanol'), the
+    reason the run ended (stop: None, 'depletion' or 'ethanol') and the
+    number of integrated segments. With instrument, stats is the
+    instrument.SolverStats of all segments, with the events in order.'''
+    from parameters import nominal, as_record
+    par = nominal() if par is None else as_record(par)              # Records: cached compiled code
+    x = np.asarray(init, dtype=np.float64).copy()
+    Cfeed = feed_values(x) if Cfeed is None else np.asarray(Cfeed, dtype=np.float64)
+    st = stoichiometry(par)
+    options = {} if method in ('RK45', 'RK23', 'DOP853') else {'jac': fedbatch_switched_jac}
+    solve, stats = solve_ivp, None
+    if instrument:
+        from instrument import SolverStats, solve_ivp_stats as solve
+        stats = options['stats'] = SolverStats()                  # Shared by the segments
+    t0, t1 = float(tspan[0]), float(tspan[1])
+    t_eval = None if t_eval is None else np.asarray(t_eval, dtype=np.float64)
+
+    names = ['feed_start', 'feed_stop', 'volume', 'depletion', 'ethanol']
+    t_events = {name: [] for name in names}
+    y_events = {name: [] for name in names}
+    ts, ys = [np.array([t0])], [x[:, None].copy()]
+    nfev = njev = nlu = segments = 0
+    stop = None
+    full = x[8] >= V_max                                            # The volume never decreases
+    t = t0
+    while t < t1 and stop is None:
+        if S_min is not None and x[0] + x[1] <= S_min:
+            stop = 'depletion'
+        elif EtOH_target is not None and x[6] >= EtOH_target:
+            stop = 'ethanol'
+        if stop is not None:
+            t_events[stop].append(t); y_events[stop].append(x.copy())
+            if stats is not None:
+                stats.events.append(stop)
+            break
+        feeding = feed_start <= t < feed_stop and not full
+        t_next = min([b for b in (feed_start, feed_stop) if b > t] + [t1])
+        events, labels = [], []
+        if feeding:
+            events.append(_event('volume', 8, V_max, 1)); labels.append('volume')
+        if S_min is not None:
+            events.append(_event('depletion', -1, S_min, -1)); labels.append('depletion')
+        if EtOH_target is not None:
+            events.append(_event('ethanol', 6, EtOH_target, 1)); labels.append('ethanol')
+        args = (par, Cfeed, st, F0 if feeding else 0.0, dF if feeding else 0.0, feed_start)
+        sol = solve(fedbatch_switched, (t, t_next), x, method=method, args=args,
+                    events=events or None, rtol=rtol, atol=atol, dense_output=t_eval is not None, **options)
+        segments += 1
+        nfev += sol.nfev; njev += sol.njev; nlu += sol.nlu
+        if sol.status == -1:
+            return OptimizeResult(t=np.concatenate(ts), y=np.hstack(ys), status=-1, message=sol.message,
+                                  success=False, nfev=nfev, njev=njev, nlu=nlu, stop=None, segments=segments,
+                                  stats=stats, **_event_arrays(t_events, y_events))
+        t_end = sol.t[-1]
+        if t_eval is None:
+            ts.append(sol.t[1:]); ys.append(sol.y[:, 1:])
+        else:
+            sel = t_eval[(t_eval > t) & (t_eval <= t_end)]
+            ts.append(sel); ys.append(sol.sol(sel))
+        x = sol.y[:, -1].copy()
+        if sol.status == 1:                                         # A state event ended the segment
+            k = next(k for k, te in enumerate(sol.t_events) if len(te))
+            x = sol.y_events[k][-1].copy()
+            t_events[labels[k]].append(t_end); y_events[labels[k]].append(x.copy())
+            if labels[k] == 'volume':
+                full = True
+            else:
+                stop = labels[k]
+        elif t_end in (feed_start, feed_stop) and t_end < t1:
+            name = 'feed_start' if t_end == feed_start else 'feed_stop'
+            t_events[name].append(t_end); y_events[name].append(x.copy())
+            if stats is not None:
+                stats.events.append(name)
+        t = t_end
+
+    t_out, y_out = np.concatenate(ts), np.hstack(ys)
+    if t_eval is not None:
+        keep = np.isin(t_out[:1], t_eval)                           # t0 is reported only if requested
+        t_out, y_out = np.concatenate([t_out[:1][keep], t_out[1:]]), np.hstack([y_out[:, :1][:, keep], y_out[:, 1:]])
+    message = 'The solver successfully reached the end of the integration interval.' if stop is None \
+        else f'A stop condition was reached ({stop}).'
+    return OptimizeResult(t=t_out, y=y_out, status=0 if stop is None else 1, message=message, success=True,
+                          nfev=nfev, njev=njev, nlu=nlu, segments=segments, stop=stop, stats=stats,
+                          **_event_arrays(t_events, y_events))
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    from model import initial_values, fedbatch_jac
+    from parameters import nominal
+
+    @njit
+    def feed_day3(t, V):
+        if t<2 or V>=2:
+            return 0.0
+        return 0.1+0.005*(t-2)
+
+    @njit
+    def fedbatch_day3(t, x, par, Cfeed, st):
+        dxdt = np.empty(9, dtype=np.float64)
+        rates = np.empty(5, dtype=np.float64)
+        balances(x, par, Cfeed, st, feed_day3(t, x[8]), rates, dxdt)
+        return dxdt
+
+    par = nominal()
+    init = initial_values()
+    Cfeed = feed_values(init)
+    st = stoichiometry(par)
+    t_eval = np.linspace(0, 50, 501)
+    simulate_events(init, par, t_eval=t_eval)                      # compile
+    fedbatch_day3(0.0, init, par, Cfeed, st)
+    truth = simulate_events(init, par, t_eval=t_eval, rtol=1e-12, atol=1e-12)
+    for rtol in [1e-6, 1e-8]:
+        tic = perf_counter()
+        ref = solve_ivp(fedbatch_day3, (0, 50), init, method='LSODA', args=(par, Cfeed, st),
+                        t_eval=t_eval, rtol=rtol, atol=rtol)
+        t_ref = perf_counter() - tic
+        tic = perf_counter()
+        sol = simulate_events(init, par, t_eval=t_eval, rtol=rtol, atol=rtol)
+        t_ev = perf_counter() - tic
+        print(f'rtol {rtol:.0e}: Feed(t, V) in the RHS {ref.nfev:5d} RHS calls, {1e3*t_ref:6.1f} ms, '
+              f'max error {np.max(np.abs(ref.y - truth.y)):.1e} | events {sol.nfev:5d} RHS calls, '
+              f'{1e3*t_ev:6.1f} ms, max error {np.max(np.abs(sol.y - truth.y)):.1e}')
+    print(f"volume limit reached at t = {truth.t_events['volume'][0]:.3f}")
+    sol = simulate_events(init, par, S_min=0.5, EtOH_target=None)
+    print(f"{sol.message} t = {sol.t[-1]:.2f}, {sol.segments} segments")
@@ -0,0 +1,219 @@
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import qmc
+from model import initial_values, feed_values
+from parameters import nominal, parameter_table, names as parameter_names
+from integrator import solve_ensemble
+
+
+## GLOBAL SENSITIVITY ANALYSIS.
+# Variance based (Sobol) indices with the Saltelli design, and Morris
+# elementary effects, of scalar summaries of the fed-batch over parameter
+# ranges. Designs are evaluated batch by batch with the lockstep ensemble
+# integrator, optionally spread over a process pool. The indices are
+# accumulated from running sums, so they are available after every batch and
+# a study can stop as soon as they have converged.
+#   [1] A. Saltelli et al., "Variance based sensitivity analysis of model
+#       output. Design and estimator for the total sensitivity index",
+#       Comput. Phys. Commun. 181 (2010) 259-270.
+#   [2] F. Campolongo, J. Cariboni, A. Saltelli, "An effective screening design
+#       for sensitivity analysis of large models", Environ. Model. Softw. 22
+#       (2007) 1509-1518.
+
+OUTPUTS = ['final ethanol', 'residual furfural', 'biomass yield']
+
+
+def bdg_ranges():
+    '''Ranges explored in BDG.ipynb: +2% to +5% on the growth and yield parameters'''
+    par = nominal()
+    return {name: (par[name]*1.02, par[name]*1.05)
+            for name in ['numaxG', 'numaxX', 'YPSg', 'YPSx', 'YXSg', 'YXSx']}
+
+def kinetic_ranges(rel=0.05):
+    '''+-rel around the nominal value of every kinetic constant used by the model'''
+    par = nominal()
+    unused = ['pH', 'pKa', 'mGlu', 'mXyl', 'mumaxG', 'mumaxX', 'mHAc', 'YXSHAc']
+    used = [name for name in parameter_names if name not in unused]
+    return {name: (par[name]*(1-rel), par[name]*(1+rel)) for name in used}
+
+
+## SIMULATION BACKEND.
+def summaries(y, init, Cfeed):
+    '''Scalar outputs (N x 3) from final states y (N x 9): final ethanol,
+    residual furfural and biomass yield on consumed sugar (gX/gS)'''
+    V0, V = init[:, 8], y[:, 8]
+    sugar_in = V0*(init[:, 0] + init[:, 1]) + (V - V0)*(Cfeed[:, 0] + Cfeed[:, 1])
+    sugar_left = V*(y[:, 0] + y[:, 1])
+    biomass = V*y[:, 7] - V0*init[:, 7]
+    return np.column_stack((y[:, 6], y[:, 2], biomass / (sugar_in - sugar_left)))
+
+def _evaluate_block(names, values, tspan, rtol, atol):
+    '''Simulate one block of parameter sets (n x len(names)), returns summaries (n x 3)'''
+    n = values.shape[0]
+    P = parameter_table(n, {name: values[:, k] for k, name in enumerate(names)})
+    init = np.tile(initial_values(), (n, 1))
+    Cfeed = np.tile(feed_values(initial_values()), (n, 1))
+    res = solve_ensemble(init, P, Cfeed, np.array(tspan, dtype=np.float64), rtol=rtol, atol=atol)
+    out = summaries(res.y[:, :, -1], init, Cfeed)
+    out[res.status != 0] = np.nan
+    return out
+
+def evaluate(names, values, tspan=(0,50), rtol=1e-6, atol=1e-8, pool=None, block=256):
+    '''Simulate parameter sets (n x len(names)) in blocks, in pool if given'''
+    blocks = [values[i:i+block] for i in range(0, len(values), block)]
+    args = (tspan, rtol, atol)
+    if pool is None:
+        parts = [_evaluate_block(names, b, *args) for b in blocks]
+    else:
+        parts = list(pool.map(_evaluate_block, [names]*len(blocks), blocks, *[[a]*len(blocks) for a in args]))
+    return np.concatenate(parts)
+
+def _scale(u, ranges):
+    '''Map unit hypercube samples onto the parameter ranges'''
+    lo = np.array([r[0] for r in ranges.values()])
+    hi = np.array([r[1] for r in ranges.values()])
+    return lo + u * (hi - lo)
+
+
+## SOBOL INDICES (SALTELLI DESIGN).
+class SobolAccumulator():
+    '''Running sums of the Saltelli estimators for k parameters and m outputs'''
+    def __init__(self, k, m):
+        self.n = 0
+        self.offset = None
+        self.sum_f = np.zeros(m)
+        self.sum_f2 = np.zeros(m)
+        self.sum_first = np.zeros((k, m))
+        self.sum_total = np.zeros((k, m))
+
+    def update(self, fA, fB, fAB):
+        '''Add a batch: fA, fB (n x m) and fAB (k x n x m)'''
+        # The estimators do not depend on a constant shift of f, but their
+        # variance does: center on the mean of the first batch.
+        if self.offset is None:
+            self.offset = 0.5 * (fA.mean(axis=0) + fB.mean(axis=0))
+        fA, fB, fAB = fA - self.offset, fB - self.offset, fAB - self.offset
+        self.n += fA.shape[0]
+        both = np.concatenate((fA, fB))
+        self.sum_f += both.sum(axis=0)
+        self.sum_f2 += (both**2).sum(axis=0)
+        self.sum_first += np.sum(fB * (fAB - fA), axis=1)        # Saltelli 2010, first order
+        self.sum_total += 0.5 * np.sum((fA - fAB)**2, axis=1)    # Jansen, total effect
+
+    def indices(self):
+        '''First order S (k x m) and total ST (k x m) indices'''
+        mean = self.sum_f / (2*self.n)
+        var = self.sum_f2 / (2*self.n) - mean**2
+        return self.sum_first / self.n / var, self.sum_total / self.n / var
+
+def iter_sobol(ranges, batch=64, max_samples=4096, seed=0, workers=1, **kwargs):
+    '''Yield (n, S, ST) after each batch of batch base samples (batch*(k+2) runs)'''
+    names = list(ranges)
+    k = len(names)
+    sampler = qmc.Sobol(d=2*k, scramble=True, seed=seed)
+    acc = SobolAccumulator(k, len(OUTPUTS))
+    pool = ProcessPoolExecutor(workers) if workers != 1 else None
+    try:
+        while acc.n < max_samples:
+            u = sampler.random(batch)
+            A, B = _scale(u[:, :k], ranges), _scale(u[:, k:], ranges)
+            AB = np.repeat(A[None], k, axis=0)
+            for i in range(k):
+                AB[i, :, i] = B[:, i]                              # A with column i from B
+            f = evaluate(names, np.concatenate((A, B, AB.reshape(-1, k))), pool=pool, **kwargs)
+            keep = ~np.isnan(f).any(axis=1)                        # Drop base samples with a failed run
+            keep = keep[:batch] & keep[batch:2*batch] & keep[2*batch:].reshape(k, batch).all(axis=0)
+            fA, fB = f[:batch][keep], f[batch:2*batch][keep]
+            fAB = f[2*batch:].reshape(k, batch, -1)[:, keep]
+            acc.update(fA, fB, fAB)
+            S, ST = acc.indices()
+            yield acc.n, S, ST
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def sobol(ranges, tol=0.01, batch=64, max_samples=4096, seed=0, workers=1, verbose=True, **kwargs):
+    '''Sobol indices, stopped once no index moves by more than tol over a batch.
+    Returns (names, S, ST, n) with S and ST of shape (len(ranges) x 3), see OUTPUTS.'''
+    previous = None
+    for n, S, ST in iter_sobol(ranges, batch, max_samples, seed, workers, **kwargs):
+        change = np.inf if previous is None else np.nanmax(np.abs(np.concatenate((S, ST)) - previous))
+        if verbose:
+            print(f'{n:6d} base samples, max change of the indices {change:.4f}')
+        if change < tol:
+            break
+        previous = np.concatenate((S, ST))
+    return list(ranges), S, ST, n
+
+
+## MORRIS ELEMENTARY EFFECTS.
+def morris_trajectories(r, k, levels=4, seed=0):
+    '''r random one-at-a-time trajectories (r x (k+1) x k) on a levels-grid of the unit cube'''
+    rng = np.random.default_rng(seed)
+    delta = levels / (2*(levels - 1))
+    start_levels = np.arange(levels // 2) / (levels - 1)               # Starting points keep x+delta <= 1
+    traj = np.zeros((r, k+1, k))
+    for t in range(r):
+        x = rng.choice(start_levels, size=k)
+        traj[t, 0] = x
+        for step, i in enumerate(rng.permutation(k)):
+            x = x.copy()
+            x[i] += delta
+            traj[t, step+1] = x
+    # Randomly flip the direction of each factor (x -> 1-x), as in Morris' design
+    flip = rng.random((r, 1, k)) < 0.5
+    return np.where(flip, 1 - traj, traj)
+
+def iter_morris(ranges, r=50, batch=10, levels=4, seed=0, workers=1, **kwargs):
+    '''Yield (trajectories, mu_star, sigma) (k x 3 each) after each batch of
+    trajectories; nan, with a RuntimeWarning, while no trajectory succeeded'''
+    names = list(ranges)
+    k = len(names)
+    traj = morris_trajectories(r, k, levels, seed)
+    n = 0
+    sum_abs = np.zeros((k, len(OUTPUTS)))
+    sum_ee = np.zeros((k, len(OUTPUTS)))
+    sum_ee2 = np.zeros((k, len(OUTPUTS)))
+    pool = ProcessPoolExecutor(workers) if workers != 1 else None
+    try:
+        for b in range(0, r, batch):
+            u = traj[b:b+batch]
+            f = evaluate(names, _scale(u.reshape(-1, k), ranges), pool=pool, **kwargs).reshape(u.shape[0], k+1, -1)
+            du = np.diff(u, axis=1)                                       # One factor changes per step
+            factor = np.argmax(np.abs(du), axis=2)
+            ee = np.diff(f, axis=1) / np.take_along_axis(du, factor[..., None], axis=2)
+            for t in range(u.shape[0]):
+                if np.isnan(ee[t]).any():
+                    continue
+                sum_abs[factor[t]] += np.abs(ee[t])
+                sum_ee[factor[t]] += ee[t]
+                sum_ee2[factor[t]] += ee[t]**2
+                n += 1
+            if n == 0:                                                    # Every trajectory so far failed
+                warnings.warn(f'iter_morris: no successful trajectory in the first {b + u.shape[0]}, '
+                              'mu_star and sigma are nan', RuntimeWarning)
+                yield n, np.full_like(sum_abs, np.nan), np.full_like(sum_abs, np.nan)
+                continue
+            mu_star = sum_abs / n
+            sigma = np.sqrt(np.maximum(0, sum_ee2/n - (sum_ee/n)**2))
+            yield n, mu_star, sigma
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+if __name__=='__main__':
+    ranges = bdg_ranges()
+    names, S, ST, n = sobol(ranges, tol=0.02, batch=32, max_samples=512)
+    print(f'{"":10s}' + ''.join(f'{o:>22s}' for o in OUTPUTS))
+    for i, name in enumerate(names):
+        print(f'{name:10s}' + ''.join(f'   S={S[i,j]:6.3f} ST={ST[i,j]:6.3f}' for j in range(len(OUTPUTS))))
+
+    for n, mu_star, sigma in iter_morris(kinetic_ranges(), r=20, batch=10):
+        pass
+    order = np.argsort(-mu_star[:, 0])
+    names = list(kinetic_ranges())
+    print('Morris screening of final ethanol (mu*, sigma):')
+    for i in order[:8]:
+        print(f'{names[i]:10s} {mu_star[i,0]:10.4f} {sigma[i,0]:10.4f}')
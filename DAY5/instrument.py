@@ -0,0 +1,190 @@
+from time import perf_counter
+import numpy as np
+from scipy.integrate import solve_ivp, RK23, RK45, DOP853, Radau, BDF, LSODA
+from scipy.optimize import OptimizeResult
+
+
+## OPT-IN SOLVER INSTRUMENTATION.
+# solve_ivp_stats is solve_ivp with a SolverStats attached to the solution
+# (sol.stats). The solver class is subclassed so that every step is
+# observed, and the right-hand side, the Jacobian and the LU decompositions
+# are timed:
+#   nfev, njev, nlu        as counted by the solver
+#   naccepted, nrejected   step attempts. Exact for the explicit Runge-Kutta
+#                          methods (each attempt costs n_stages evaluations);
+#                          for LSODA, BDF and Radau the rejections are not
+#                          reported by the solver, and a step shorter than the
+#                          one proposed before it counts as one rejection (a
+#                          lower bound)
+#   hmin, hmax             smallest and largest accepted step (the last step,
+#                          cut at the end of the interval, is left out)
+#   t_rhs, t_jac, t_lu     wall time in the model and in the LU decompositions
+#                          (LU: BDF and Radau; LSODA factors inside ODEPACK)
+#   t_total, t_solver      wall time of the solve, and what is not spent in
+#                          the model (t_total - t_rhs - t_jac)
+#   events                 names of the events that fired, in order
+# The timers cost about a microsecond per call, so that instrumented solves
+# are kept for profiling. Ensembles collect one STATS record per run
+# (campaign.run_campaign(..., instrument=True)); summary() aggregates them.
+
+METHODS = {'RK23': RK23, 'RK45': RK45, 'DOP853': DOP853, 'Radau': Radau, 'BDF': BDF, 'LSODA': LSODA}
+
+STATS = np.dtype([('nfev', np.int64),
+                  ('njev', np.int64),
+                  ('nlu', np.int64),
+                  ('naccepted', np.int64),
+                  ('nrejected', np.int64),
+                  ('hmin', np.float64),
+                  ('hmax', np.float64),
+                  ('t_rhs', np.float64),
+                  ('t_jac', np.float64),
+                  ('t_lu', np.float64),
+                  ('t_solver', np.float64),
+                  ('t_total', np.float64),
+                  ('event', 'U12')])
+
+
+class SolverStats():
+    '''Counters and timings of one solve; stats of consecutive solves add up with +'''
+    def __init__(self):
+        self.nfev = self.njev = self.nlu = 0
+        self.naccepted = self.nrejected = 0
+        self.hmin, self.hmax = np.inf, 0.0
+        self.t_rhs = self.t_jac = self.t_lu = self.t_total = 0.0
+        self.events = []
+
+    @property
+    def t_solver(self):
+        return self.t_total - self.t_rhs - self.t_jac
+
+    def __add__(self, other):
+        out = SolverStats()
+        for name in ['nfev', 'njev', 'nlu', 'naccepted', 'nrejected', 't_rhs', 't_jac', 't_lu', 't_total']:
+            setattr(out, name, getattr(self, name) + getattr(other, name))
+        out.hmin, out.hmax = min(self.hmin, other.hmin), max(self.hmax, other.hmax)
+        out.events = self.events + other.events
+        return out
+
+    def record(self):
+        '''The stats as one STATS record'''
+        rec = np.zeros((), dtype=STATS)
+        for name in STATS.names:
+            if name != 'event':
+                rec[name] = getattr(self, name)
+        rec['event'] = self.events[-1] if self.events else ''
+        return rec
+
+    def __repr__(self):
+        share = self.t_rhs / self.t_total if self.t_total else 0.0
+        return (f'SolverStats(nfev={self.nfev}, njev={self.njev}, nlu={self.nlu}, naccepted={self.naccepted}, '
+                f'nrejected={self.nrejected}, hmin={self.hmin:.3g}, t_total={1e3*self.t_total:.2f} ms, '
+                f'rhs {100*share:.0f}%, events={self.events})')
+
+
+def _timed(func, stats, field):
+    def timed(*args):
+        tic = perf_counter()
+        out = func(*args)
+        setattr(stats, field, getattr(stats, field) + perf_counter() - tic)
+        return out
+    return timed
+
+def instrumented(method):
+    '''Subclass of the solver class of method (name or OdeSolver) that records a SolverStats'''
+    base = METHODS[method] if isinstance(method, str) else method
+
+    class Instrumented(base):
+        def __init__(self, fun, t0, y0, t_bound, stats=None, **options):
+            self.stats = SolverStats() if stats is None else stats
+            if callable(options.get('jac')):
+                options['jac'] = _timed(options['jac'], self.stats, 't_jac')
+            super().__init__(_timed(fun, self.stats, 't_rhs'), t0, y0, t_bound, **options)
+            if hasattr(self, 'lu'):
+                self.lu = _timed(self.lu, self.stats, 't_lu')
+
+        def _proposed(self):
+            if isinstance(self, LSODA):
+                return self._lsoda_solver._integrator.rwork[11]     # HCUR, 0 before the first step
+            return self.h_abs
+
+        def _step_impl(self):
+            t, nfev, h = self.t, self.nfev, self._proposed()
+            success, message = super()._step_impl()
+            if success:
+                st = self.stats
+                st.naccepted += 1
+                step = abs(self.t - t)
+                last = self.t == self.t_bound
+                if not last or st.naccepted == 1:
+                    st.hmin, st.hmax = min(st.hmin, step), max(st.hmax, step)
+                if hasattr(self, 'n_stages'):
+                    st.nrejected += (self.nfev - nfev) // self.n_stages - 1
+                elif not last and 0 < h and step < h * (1 - 1e-10):
+                    st.nrejected += 1
+            return success, message
+
+    Instrumented.__name__ = Instrumented.__qualname__ = f'Instrumented{base.__name__}'
+    return Instrumented
+
+
+def solve_ivp_stats(fun, t_span, y0, method='RK45', events=None, stats=None, **options):
+    '''solve_ivp with the instrumented solver; the solution has a SolverStats in sol.stats'''
+    stats = SolverStats() if stats is None else stats
+    tic = perf_counter()
+    sol = solve_ivp(fun, t_span, y0, method=instrumented(method), events=events, stats=stats, **options)
+    stats.t_total += perf_counter() - tic
+    stats.nfev += sol.nfev
+    stats.njev += sol.njev
+    stats.nlu += sol.nlu
+    if events is not None:
+        events = events if isinstance(events, (list, tuple)) else [events]
+        for event, te in zip(events, sol.t_events):
+            stats.events += [getattr(event, '__name__', 'event')] * len(te)
+    sol.stats = stats
+    return sol
+
+
+## ENSEMBLE AGGREGATION.
+def summary(stats):
+    '''Totals, means and extremes of a STATS array (one record per run), and
+    the (name, count) of the last event of the runs'''
+    stats = np.atleast_1d(stats)
+    fields = ['nfev', 'njev', 'nlu', 'naccepted', 'nrejected', 't_total']
+    t_total = stats['t_total'].sum()
+    events, counts = np.unique(stats['event'][stats['event'] != ''], return_counts=True)
+    return OptimizeResult(n=len(stats),
+                          total={name: stats[name].sum() for name in fields},
+                          mean={name: stats[name].mean() for name in fields},
+                          max={name: stats[name].max() for name in fields},
+                          hmin=stats['hmin'].min(),
+                          rhs_share=(stats['t_rhs'].sum() + stats['t_jac'].sum()) / t_total if t_total else np.nan,
+                          events=list(zip(events.tolist(), counts.tolist())))
+
+def slowest(stats, k=10, key='t_total'):
+    '''Indices of the k runs with the largest key (t_total, nfev, nrejected, ...), slowest first'''
+    return np.argsort(np.atleast_1d(stats)[key])[::-1][:k]
+
+
+if __name__=='__main__':
+    from model import simulate, initial_values
+    from campaign import run_campaign, variable_feedstock
+    from store import STATES
+
+    init = initial_values()
+    for method in ['RK45', 'LSODA', 'BDF', 'Radau']:
+        simulate(init, method=method)                               # Compile
+        sol = simulate(init, method=method, instrument=True)
+        print(f'{method:6s}', sol.stats)
+
+    res = run_campaign(variable_feedstock, 200, seed=3, workers=1, instrument=True)
+    s = summary(res.stats)
+    print(f"{s.n} runs: {s.total['nfev']} RHS calls, {s.total['nrejected']} rejected steps, "
+          f"{s.total['t_total']:.2f} s ({100*s.rhs_share:.0f}% in the model), smallest step {s.hmin:.2e}")
+    for name in ['Furfural', '5-HMF']:
+        k = STATES.index(name)
+        r = np.corrcoef(res.init[:, k], res.stats['nfev'])[0, 1]
+        print(f'correlation of the initial {name} with the RHS calls: {r:+.2f}')
+    print('slowest runs (Furfural, 5-HMF, nfev, nrejected, ms):')
+    for n in slowest(res.stats, 5):
+        print(f"  {res.init[n, 2]:.2f} {res.init[n, 4]:.2f} {res.stats['nfev'][n]:5d} "
+              f"{res.stats['nrejected'][n]:4d} {1e3*res.stats['t_total'][n]:6.1f}")
@@ -1,31 +1,18 @@
 import numpy as np
-from numba import njit, jit, float64
-import numba as nb
-
-
-def initial_values():
-    ## LIST OF INITIAL CONDITIONS.
-    # Name     Value     Index     Units
-    Glu0  =  39.7        # 1       g/L
-    Xyl0  =  23.5        # 2       g/L
-    Fur0  =  0.56        # 3       g/L
-    FA0   =  0.0           # 4       g/L
-    HMF0  =  0.2         # 5       g/L
-    HAc0  =  3.05        # 6       g/L
-    # Ac0   =  0.0001;    # 7       g/L
-    EtOH0 =  0.62        # 7       g/L
-    X0    =  1.75        # 8       g/L
-    V0    = 0.7          # 9       g/L
-    
-    init = [Glu0, Xyl0, Fur0, FA0, HMF0, HAc0, EtOH0, X0, V0]
-    return np.array(init, dtype=np.float64)
-
-def feed_values(ini):
-    feed = ini.copy()
-    feed[7] = 0             # Xf = 0 !  
-    return np.array(feed)
-
-@njit
+from numba import njit, prange
+import warmup                                                       # Clears stale compiled code at import
+from yeast_fermentation import (initial_values, feed_values, reference_rates, stoichiometry, reaction_rates,
+                                balances, rate_jacobian, balances_jac, as_record, nominal)
+
+
+## FED-BATCH MODEL.
+# The kinetics core (stoichiometry, reaction_rates, balances and their
+# Jacobians) lives in the yeast_fermentation package at the root of the
+# repository, shared with DAY1 and DAY3; the model and its phenomena Ph1-Ph22
+# are documented in yeast_fermentation/kinetics.py. The fed-batch of DAY5
+# feeds a constant 0.2 L/h.
+
+@njit(cache=True)
 def Feed(t, V):
     # if t<2 or V>=2:
     #     F = 0
@@ -34,201 +21,183 @@ def Feed(t, V):
     # return F
     return 0.2
 
-# @jit(debug=True)
 def fedbatch(t, x, par, Cfeed):
-    #  The following 8 components are considered in the model: 
-    #  0. Glucose
-    #  1. Xylose
-    #  2. Furfural
-    #  3. Furfuryl alcohol
-    #  4. 5-HMF
-    #  5. HAc
-    #  6. Ethanol
-    #  7. Biomass
-    #  8. Tank volume
-
-    #  According to the kinetic model, the following chemical equations describe
-    #  the system. 
-
-    #  1. Glucose  -----> Ethanol + Biomass
-    #  2. Xylose   -----> Ethanol + Biomass
-    #  3. Furfural -----> Furfuryl alcohol 
-    #  4. HMF      -----> Acetic acid
-    #  5. HAc     <-----> Ac- [optional - not used here]
-    #  6. HAc      -----> Biomass (maintenence) 
-
-
-    ## 1. STOICHIOMETRIC MATRIX. 
-    # The 8 components and 6 reactions are considered in this model. One could
-    # also expand the model with Ac-, but that is not implemented.
-
-    # #                Glu  Xyl  Fur  FA           HMF  HAc           EtOH        X  
-    st = np.array([[-1,   0,   0,   0,           0,   0,            par.YPSg,   par.YXSg],      # Glucose uptake
-                   [ 0,  -1,   0,   0,           0,   0,            par.YPSx,   par.YXSx],      # Xylose uptake
-                   [ 0,   0,  -1,   par.Y_FA_Fur,0,   0,            0,          0       ],      # Furfural uptake
-                   [ 0,   0,   0,   0,          -1,   par.Y_HAc_HMF,0,          0       ],      # HMF uptake
-                   [ 0,   0,   0,   0,           0,  -1,            0,          0       ]], dtype=np.float64)     # HAc uptake
-
-
-
-
-    ## 2. DEFINE INDIVIDUAL KINETICS AND INHIBITION TERMS. 
-    # Ph stands for phenomena, and it includes all the phenomena considered in
-    # the model, including reaction, inhibition and equilibria. Each of the
-    # phenomena is implemented separately below, for clarity
-    # 1. GLUCOSE UPTAKE RATE.
-    # numaxG: max consumption rate of glucose           s^-1       [1]
-    # KSPG:   affinity constant glucose                 g/L        [1]
-    # KiPG:   inhibition constant glucose               g/L        [1]
-    Ph1 = par.numaxG * x[0] * x[7] / (par.KSPG + x[0] + (x[0]**2)/par.KiPG)
-    Ph1 = np.maximum(0,Ph1)
-    # 2. XYLOSE UPTAKE RATE.
-    # numaxX: max consumption rate of xylose            s^-1       [1]
-    # KSPX:   affinity constant xylose                  g/L        [1]
-    # KiPX:   inhibition constant xylose                g/L        [1]
-    Ph2 = par.numaxX * x[1] * x[7] / (par.KSPX + x[1] + (x[1]**2)/par.KiPX)
-    Ph2 = np.maximum(0,Ph2)
-
-    # 3. FURFURAL UPTAKE RATE.
-    # numaxFur: max uptake rate of furfural               s^-1       [2]
-    # KSFur:    affinity constant furfural                g/L        [2]
-    Ph3 = par.numaxFur * x[2] * x[7] / (par.KSFur + x[2])
-    Ph3 = np.maximum(0,Ph3)
-
-    # 4. FURFURAL CONVERSION INTO FURFURYL ALCOHOL.
-    # Y_FA_Fur:  yield coefficient FA/Fur                  gFA/gFur   [2]
-    Ph4 = Ph3 * par.Y_FA_Fur
-    Ph4 = np.maximum(0,Ph4)
-
-    # 5. FURFURYL ALCOHOL INHIBITS GLUCOSE UPTAKE RATE.
-    # KiFAg:    inhibition constant of FA on Glu uptake   g/L        [2]
-    Ph5 = 1 / (1 + x[3]/par.KiFAg)
-    Ph5 = np.maximum(0,Ph5)
-
-    # 6. FURFURYL ALCOHOL INHIBITS XYLOSE UPTAKE RATE.
-    # KiFAx:    inhibition constant of FA on Xyl uptake   g/L        [2]
-    Ph6 = 1 / (1 + x[3]/par.KiFAx)
-    Ph6 = np.maximum(0,Ph6)
-
-    # 7. FURFURAL INHIBITS GLUCOSE UPTAKE RATE.
-    # KiFurg:   inhibition constant of Fur on Glu uptake  g/L        [2]
-    Ph7 = 1 / (1 + x[2]/par.KiFurg)
-    Ph7 = np.maximum(0,Ph7)
-
-    # 8. FURFURAL INHIBITS XYLOSE UPTAKE RATE.
-    # KiFurx:   inhibition constant of Fur on Xyl uptake  g/L        [2]
-    Ph8 = 1 / (1 + x[2]/par.KiFurx)
-    Ph8 = np.maximum(0,Ph8)
-
-    # 9. FURFURAL INHIBITS HMF UPTAKE RATE.
-    # KiFurHMF: inhibition constant of Fur on HMF         g/L        [2]
-    Ph9 = 1 / (1 + x[2]/par.KiFurHMF)
-    Ph9 = np.maximum(0,Ph9)
-
-    # 10. HMF INHIBITS GLUCOSE UPTAKE RATE.
-    # KiHMFg:   inhibition constant of HMF on Glu         g/L        [2]
-    Ph10 = 1 / (1 + x[4]/par.KiHMFg)
-    Ph10 = np.maximum(0,Ph10)
-
-    # 11. HMF INHIBITS XYLOSE UPTAKE RATE.
-    # KiHMFx:   inhibition constant of HMF on Xyl         g/L        [2]
-    Ph11 = 1 / (1 + x[4]/par.KiHMFx)
-    Ph11 = np.maximum(0,Ph11)
-
-    # 12. HMF UPTAKE RATE. 
-    # numaxHMF: max uptake rate of HMF                    s^-1       [2]
-    # KSHMF:    affinity constant HMF                     g/L        [2]
-    Ph12 = par.numaxHMF * x[7] * x[4] / (par.KSHMF + x[4])
-    Ph12 = np.maximum(0,Ph12)
-
-    #  13. pH INFLUENCES THE PAIR HAc/Ac.
-    # pH = 5.5;              % pH is controlled
-    # pKa = 4.75;            % pKa of acetic acid.
-    # Ph13 = x(7,1) / x(6,1) * 1 / (1 + 10^(-pH)/10^(-pKa));
-    # Ph13 = np.maximum(0,Ph13);
-
-
-    # 14. HAc UPTAKE RATE.
-    # numaxHAc: max uptake rate of HAc                    s^-1       [2]
-    # KSHAc:    affinity constant HAc                     g/L        [2]
-    Ph14 = x[7] * x[5] * par.numaxHAc / (par.KSHAc + x[5])
-    Ph14 = np.maximum(0,Ph14)
-
-
-    #15. HMF CONVERSION INTO HAc
-    #Y_HAc_HMF = p(21);     % yield coefficient HAc/HMF                 gHAc/gHMF  [2], [3]
-    #Ph15 = Y_HAc_HMF * Ph12;
-    #Ph15 = np.maximum(0,Ph15);
-
-    # 16. HAc INHIBITS GLUCOSE UPTAKE RATE.
-    # KiHAcg:   inhibition constant of HAc on Glu         g/L        [2]
-    Ph16 = 1 / (1 + x[5]/par.KiHAcg)
-    Ph16 = np.maximum(0,Ph16)
-
-    # 17. HAc INHIBITS XYLOSE UPTAKE RATE.
-    # KiHAcx:   inhibition constant of HAc on Xyl         g/L         [2]
-    Ph17 = 1 / (1 + x[5]/par.KiHAcx)
-    Ph17 = np.maximum(0,Ph17)
-
-    #  18. PRODUCTION OF ETHANOL FORM GLUCOSE AND XYLOSE.
-    # YPSg:     yield ethanol-glucose                     gEtOH/gGlu [1]
-    # YPSx:     yield ethanol-xylose                      gEtOH/gGlu [1]
-    # Ph18a = par.YPSg * Ph1;
-    # Ph18b = par.YPSx * Ph2;
-    # Ph18a = np.maximum(0,Ph18a);
-    # Ph18b = np.maximum(0,Ph18b);
-
-    # 19. ETHANOL INHIBITS THE UPTAKE OF GLUCOSE AND XYLOSE.
-    # PMPg:     inhibition constant for glucose           g/L        [1]
-    # gammaG:   exponent factor inhibition glucose        g/L        [1]
-    # PMPx:     inhibition constant for xylose            g/L        [1]
-    # gammaX:   exponent factor inhibition xylose         g/L        [1]
-    Ph19a = 1-(x[6]/par.PMPg)**par.gammaG
-    Ph19b = 1-(x[6]/par.PMPx)**par.gammaX
-    Ph19a = np.maximum(0,Ph19a)
-    Ph19b = np.maximum(0,Ph19b)
-
-    #  20. CELL GROWTH.
-    # mGlu:     maintenance constant from glucose         g/L        [1]
-    # mXyl:     maintenance constant from xylose          g/L        [1]
-    # YXSg:     yield X-Glu                               gX/gGlu    [1]
-    # YXSx:     yield X-Xyl                               gX/gXyl    [1]
-    # mumaxG:   max growth of X from Glu                  h-1        [1]
-    # mumaxX:   max frowth of X from Xyl                  h-1        [1]
-
-    # Ph20a = np.maximum(0,(Ph1 + mGlu*x(8,1))*YXSg);
-    # Ph20b = np.maximum(0,(Ph1 + mXyl*x(8,1))*YXSx);
-
-    # 21. CATABOLITE REPRESSION.
-    # KiGlu:    inhibition constant of Glu to Xyl         g/L        Unknown
-    Ph21 = 1 / (1 + x[0]/par.KiGlu)
-
-    # 22. ACETATE IS USED FOR MAINTENANCE.
-    # mHAc:     maintenance constant from HAc              g/L        Unknown
-    # YXSHAc:   yield acetate biomass                      g/L        Unknown
-    Ph22 = np.maximum(0,par.mHAc * x[7] * par.YXSHAc)
-
-
-
-    ## 3. REACTION RATES. 
-    # This includes the reaction rates with inhibition terms.
-    rates = np.zeros(5)
-    rates[0]  = Ph1 * Ph5 * Ph7 * Ph10 * Ph16 * Ph19a                            # Glucose uptake rate considering inhibitions.
-    rates[1]  = Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21                     # Xylose uptake rate considering inhibitions.
-    rates[2]  = Ph3                                                              # Furfural uptake rate.
-    rates[3]  = Ph12 *  Ph9                                                      # 5-HMF uptake rate considering inhibitions.
-    rates[4]  = Ph14
-    
-    ## 4. MASS BALANCE FOR THE SYSTEM.
-    # Cfeed = feed_values()
+    '''Fed-batch right-hand side with the signature of ML.ipynb, args=(par,
+    Cfeed); par is a Parameters instance or a record. Runs fedbatch_jit
+    with par as a record.'''
+    par = as_record(par)                                            # Records: cached compiled code
+    return fedbatch_jit(t, np.asarray(x, dtype=np.float64), par, np.asarray(Cfeed, dtype=np.float64),
+                        stoichiometry(par))
+
+def fedbatch_reference(t, x, par, Cfeed):
+    '''fedbatch in plain Python (kinetics.reference_rates), to check and time the compiled code'''
+    rates = reference_rates(x, par)
+    st = stoichiometry(as_record(par))
+    F = Feed(t, x[8])
     dxdt = np.zeros(9, dtype=np.float64)
     r, c = st.shape
     for i in range(c):
-        dxdt[i] = sum([rates[j] * st[j,i] for j in range(r)]) + Feed(t, x[8])*(Cfeed[i]-x[i])/x[8]        # Components mass balance -> FedBatch
-    dxdt[8] =  Feed(t, x[8])                 # Tank volume mass balance
+        dxdt[i] = sum([rates[j] * st[j,i] for j in range(r)]) + F*(Cfeed[i]-x[i])/x[8]    # Components mass balance -> FedBatch
+    dxdt[8] = F                                                     # Tank volume mass balance
     return dxdt
 
 
+## COMPILED FED-BATCH ENGINE.
+# fedbatch_reference above is the readable implementation. The functions
+# below compute exactly the same right-hand side, but compiled with numba on
+# the kinetics core of yeast_fermentation: the stoichiometric matrix is built once per parameter set, the feed
+# is evaluated once per call and the mass balances write into preallocated
+# arrays. Usage with solve_ivp:
+#     st = stoichiometry(par)
+#     sol = solve_ivp(fedbatch_jit, t_span=tspan, y0=init, args=(par,Cfeed,st))
+# The compiled code is cached on disk for parameter records (warmup.py).
+
+@njit(cache=True)
+def fedbatch_inplace(t, x, par, Cfeed, st, rates, dxdt):
+    '''Compiled fedbatch writing into the preallocated arrays rates and dxdt'''
+    balances(x, par, Cfeed, st, Feed(t, x[8]), rates, dxdt)
+
+@njit(cache=True)
+def fedbatch_jit(t, x, par, Cfeed, st):
+    '''Compiled fedbatch, drop-in for solve_ivp with args=(par, Cfeed, st).
+    A new output array is returned on every call because the scipy solvers
+    keep references to previous derivatives.'''
+    dxdt = np.empty(9, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    balances(x, par, Cfeed, st, Feed(t, x[8]), rates, dxdt)
+    return dxdt
+
+
+## ANALYTIC JACOBIAN.
+# Exact partial derivatives of the fed-batch right-hand side, so that the
+# stiff solvers (BDF, Radau, LSODA) do not need finite differences:
+#     sol = solve_ivp(fedbatch_jit, t_span=tspan, y0=init, args=(par,Cfeed,st),
+#                     method='BDF', jac=fedbatch_jac)
+# Phenomena clamped with max(0, .) have zero derivative where the clamp is
+# active. The feed rate is treated as independent of the volume (dF/dV = 0).
+
+@njit(cache=True)
+def fedbatch_jac(t, x, par, Cfeed, st):
+    '''Analytic Jacobian of fedbatch_jit, drop-in for solve_ivp jac= with args=(par, Cfeed, st)'''
+    drdx = np.empty((5, 8), dtype=np.float64)
+    J = np.empty((9, 9), dtype=np.float64)
+    rate_jacobian(x, par, drdx)
+    balances_jac(x, Cfeed, st, Feed(t, x[8]), drdx, J)
+    return J
+
+
+def check_jacobian(x=None, t=0.0, eps=1e-6):
+    '''Compare fedbatch_jac with central finite differences of fedbatch_jit.
+    Returns the largest deviation relative to the largest Jacobian entry. Use
+    states away from the max(0, .) kinks (e.g. not a depleted substrate), where
+    central differences straddle the kink.'''
+    par = nominal()
+    if x is None:
+        x = initial_values()
+    x = np.asarray(x, dtype=np.float64)
+    Cfeed = feed_values(initial_values())
+    st = stoichiometry(par)
+    J = fedbatch_jac(t, x, par, Cfeed, st)
+    J_fd = np.zeros_like(J)
+    for k in range(len(x)):
+        h = eps * max(1.0, abs(x[k]))
+        xp, xm = x.copy(), x.copy()
+        xp[k] += h
+        xm[k] -= h
+        J_fd[:, k] = (fedbatch_jit(t, xp, par, Cfeed, st) - fedbatch_jit(t, xm, par, Cfeed, st)) / (2*h)
+    err = np.max(np.abs(J - J_fd)) / np.max(np.abs(J))
+    print(f'Jacobian vs finite differences: max relative deviation {err:.2e}')
+    return err
+
+
+## ENSEMBLE RIGHT-HAND SIDE.
+# N scenarios evaluated in one call, reusing reaction_rates and balances.
+# X is an (N, 9) state block, P a structured parameter array of length N
+# (see parameters.parameter_table), Cfeed an (N, 9) array of feed
+# compositions and ST = ensemble_stoichiometry(P) the (N, 5, 8) matrices.
+
+@njit(cache=True)
+def ensemble_stoichiometry(P):
+    '''Stoichiometric matrices (N x 5 x 8) of a structured parameter array'''
+    ST = np.empty((P.shape[0], 5, 8), dtype=np.float64)
+    for n in range(P.shape[0]):
+        ST[n] = stoichiometry(P[n])
+    return ST
+
+@njit(parallel=True, cache=True)
+def fedbatch_ensemble_inplace(t, X, P, Cfeed, ST, dXdt):
+    '''fedbatch for all members of X, written into dXdt (N x 9)'''
+    for n in prange(X.shape[0]):
+        rates = np.empty(5, dtype=np.float64)
+        balances(X[n], P[n], Cfeed[n], ST[n], Feed(t, X[n, 8]), rates, dXdt[n])
+
+@njit(cache=True)
+def fedbatch_ensemble(t, X, P, Cfeed, ST):
+    '''fedbatch for all members of X (N x 9), returns dXdt (N x 9)'''
+    dXdt = np.empty_like(X)
+    fedbatch_ensemble_inplace(t, X, P, Cfeed, ST, dXdt)
+    return dXdt
+
+@njit(cache=True)
+def fedbatch_ensemble_flat(t, y, P, Cfeed, ST):
+    '''Ensemble on a flat state vector (member-major, N*9), to integrate all
+    members in a single solve_ivp call with args=(P, Cfeed, ST)'''
+    X = y.reshape((P.shape[0], 9))
+    return fedbatch_ensemble(t, X, P, Cfeed, ST).ravel()
+
+def ensemble_jac_sparsity(N):
+    '''Block-diagonal Jacobian sparsity of fedbatch_ensemble_flat, for the
+    jac_sparsity option of BDF/Radau: members do not interact'''
+    from scipy.sparse import kron, identity
+    return kron(identity(N, format='csr'), np.ones((9, 9)), format='csr')
+
+
+def simulate(init, par=None, Cfeed=None, tspan=(0,50), t_eval=None, method='LSODA', rtol=1e-8, atol=1e-8,
+             instrument=False):
+    '''Solve the fed-batch with the compiled right-hand side and Jacobian.
+    par is a Parameters instance or a record (default: parameters.nominal()), Cfeed
+    defaults to feed_values(init). Returns the solve_ivp solution,
+    with solver counters and timings in sol.stats if instrument (instrument.SolverStats).'''
+    from scipy.integrate import solve_ivp
+    if instrument:
+        from instrument import solve_ivp_stats as solve_ivp
+    par = nominal() if par is None else as_record(par)              # Records: cached compiled code
+    init = np.asarray(init, dtype=np.float64)
+    if Cfeed is None:
+        Cfeed = feed_values(init)
+    Cfeed = np.asarray(Cfeed, dtype=np.float64)
+    st = stoichiometry(par)
+    options = {} if method in ('RK45', 'RK23', 'DOP853') else {'jac': fedbatch_jac}
+    return solve_ivp(fedbatch_jit, t_span=tspan, y0=init, args=(par, Cfeed, st), t_eval=t_eval,
+                     method=method, rtol=rtol, atol=atol, **options)
+
+
+def speedup(n=20000):
+    '''Time fedbatch_reference against fedbatch_jit and return (t_ref, t_jit) in seconds per call'''
+    from time import perf_counter
+    from parameters import Parameters
+    par = Parameters()                                              # The reference needs attribute access
+    rec = as_record(par)
+    init = initial_values()
+    Cfeed = feed_values(init)
+    st = stoichiometry(rec)
+    fedbatch_jit(0.0, init, rec, Cfeed, st)                         # Compile before timing
+    assert np.allclose(fedbatch_reference(0.0, init, par, Cfeed), fedbatch_jit(0.0, init, rec, Cfeed, st))
+
+    n_ref = max(1, n // 20)                                         # The reference is slow, time fewer calls
+    tic = perf_counter()
+    for _ in range(n_ref):
+        fedbatch_reference(0.0, init, par, Cfeed)
+    t_ref = (perf_counter() - tic) / n_ref
+    tic = perf_counter()
+    for _ in range(n):
+        fedbatch_jit(0.0, init, rec, Cfeed, st)
+    t_jit = (perf_counter() - tic) / n
+    print(f'fedbatch_reference {t_ref*1e6:8.2f} us/call')
+    print(f'fedbatch_jit       {t_jit*1e6:8.2f} us/call   (x{t_ref/t_jit:.0f})')
+    return t_ref, t_jit
+
+
 
 def plot(sol, par):
     import matplotlib.pyplot as plt
@@ -269,6 +238,8 @@ if __name__=='__main__':
 
     dxdt = fedbatch(0, init, par, Cfeed)
     print(dxdt)
+    speedup()                                                           # Reference vs compiled right-hand side
+    check_jacobian()                                                    # Analytic vs finite-difference Jacobian
 
 
     tspan=(0,50)                                                        # Time span  of the simulation
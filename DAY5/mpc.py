@@ -0,0 +1,194 @@
+import numpy as np
+from scipy.optimize import minimize, OptimizeResult
+from model import feed_values, initial_values
+from parameters import nominal, as_record
+from integrator import solve_ensemble
+from schedules import stack, constant
+
+
+## MODEL PREDICTIVE CONTROL OF THE FEED (MULTIPLE SHOOTING).
+# The feed rate is piecewise constant over a receding horizon of `horizon`
+# control intervals of length dt. The decision variables are the feed rates
+# u_0..u_(M-1) and the states s_1..s_M at the ends of the intervals
+# (s_0 is the measured state), with the continuity constraints
+#     s_(k+1) = Phi(s_k, u_k)        (integration over one interval)
+# and, at every node, V <= V_max and furfural <= Fur_max. The objective is
+# the ethanol mass at the end of the horizon, with a penalty on feed moves.
+#
+# All M intervals are independent given (s_k, u_k): they are integrated
+# together as one ensemble (integrator.solve_ensemble, parallel over
+# members), together with the forward-difference perturbations of (s_k, u_k)
+# that give the Jacobian blocks dPhi/ds (9x9) and dPhi/du, 11 members per
+# interval. The NLP is solved with SLSQP. Between control intervals the
+# previous solution, shifted by one interval, is the starting point.
+
+SCALE = np.array([40.0, 25.0, 1.0, 1.0, 1.0, 3.0, 20.0, 10.0, 1.0])    # Typical state magnitudes
+
+class FeedMPC():
+    '''Receding-horizon optimization of the fed-batch feed rate. Cfeed is the
+    feed composition of the plant (default: feed_values(initial_values()),
+    the feedstock), fixed for the whole run.'''
+    def __init__(self, par=None, Cfeed=None, dt=1.0, horizon=10, V_max=2.0, Fur_max=0.5, F_max=0.5,
+                 move_weight=1.0, rtol=1e-8, atol=1e-10, fd_step=1e-4, maxiter=100):
+        self.par = nominal() if par is None else par
+        self.Cfeed = feed_values(initial_values()) if Cfeed is None else np.asarray(Cfeed, dtype=np.float64)
+        self.dt = dt
+        self.M = horizon
+        self.V_max = V_max
+        self.Fur_max = Fur_max
+        self.F_max = F_max
+        self.move_weight = move_weight
+        self.rtol = rtol
+        self.atol = atol
+        self.fd_step = fd_step
+        self.maxiter = maxiter
+        self.record = as_record(self.par)
+        self.u_prev = 0.0                   # Last applied feed rate
+        self.w = None                       # Last solution (warm start)
+        self.sims = 0                       # Integrated intervals (including perturbations)
+
+    ## Shooting.
+    def shoot(self, S, U, sensitivities=False):
+        '''Integrate the intervals from states S (M, 9) with feeds U (M,).
+        Returns Phi (M, 9), and with sensitivities dPhi/ds (M, 9, 9) and dPhi/du (M, 9).'''
+        M, nx = S.shape
+        if not sensitivities:
+            X0, F, n_per = S, U, 1
+        else:
+            n_per = nx + 2                                          # Nominal, one per state, feed
+            hs = self.fd_step * np.maximum(np.abs(S), 1e-3 * SCALE)
+            hu = self.fd_step * max(self.F_max, 1e-3)
+            X0 = np.repeat(S, n_per, axis=0).reshape(M, n_per, nx)
+            X0[:, 1:nx+1] += hs[:, :, None] * np.eye(nx)
+            F = np.repeat(U, n_per).reshape(M, n_per)
+            F[:, -1] += hu
+            X0, F = X0.reshape(-1, nx), F.ravel()
+        P = np.full(len(X0), self.record)
+        res = solve_ensemble(X0, P, np.tile(self.Cfeed, (len(X0), 1)), [0.0, self.dt], rtol=self.rtol, atol=self.atol,
+                             schedules=stack([constant(f) for f in F]))
+        self.sims += len(X0)
+        Y = res.y[:, :, -1].reshape(M, n_per, nx)
+        if not sensitivities:
+            return Y[:, 0]
+        Phi = Y[:, 0]
+        dPhi_ds = np.transpose((Y[:, 1:nx+1] - Phi[:, None]) / hs[:, :, None], (0, 2, 1))
+        dPhi_du = (Y[:, -1] - Phi) / hu
+        return Phi, dPhi_ds, dPhi_du
+
+    ## NLP in scaled variables w = [u / F_max, s_1 / SCALE, ..., s_M / SCALE].
+    def _unpack(self, w):
+        return w[:self.M] * self.F_max, w[self.M:].reshape(self.M, 9) * SCALE
+
+    def _linearize(self, w):
+        '''Shooting results at w, computed once per distinct w'''
+        if self._lin is None or not np.array_equal(self._lin[0], w):
+            U, S = self._unpack(w)
+            nodes = np.vstack([self.x0, S[:-1]])
+            self._lin = (w.copy(),) + self.shoot(nodes, U, sensitivities=True)
+        return self._lin[1:]
+
+    def _objective(self, w):
+        U, S = self._unpack(w)
+        du = np.diff(np.r_[self.u_prev, U]) / self.F_max
+        return -S[-1, 6] * S[-1, 8] / SCALE[6] + self.move_weight * np.sum(du**2)
+
+    def _objective_grad(self, w):
+        U, S = self._unpack(w)
+        du = np.diff(np.r_[self.u_prev, U]) / self.F_max
+        g = np.zeros_like(w)
+        gu = 2 * self.move_weight * du
+        g[:self.M] = gu - np.r_[gu[1:], 0.0]
+        g[-9 + 6] = -S[-1, 8]                                       # d(-EtOH*V/SCALE[6]) w.r.t. the scaled states
+        g[-9 + 8] = -S[-1, 6] / SCALE[6] * SCALE[8]
+        return g
+
+    def _defects(self, w):
+        '''Continuity constraints Phi(s_k, u_k) - s_(k+1) = 0, scaled'''
+        U, S = self._unpack(w)
+        Phi, _, _ = self._linearize(w)
+        return ((Phi - S) / SCALE).ravel()
+
+    def _defects_jac(self, w):
+        M = self.M
+        _, dPhi_ds, dPhi_du = self._linearize(w)
+        J = np.zeros((M, 9, len(w)))
+        for k in range(M):
+            J[k, :, k] = dPhi_du[k] / SCALE * self.F_max
+            cols = M + 9*k
+            J[k, :, cols:cols+9] = -np.eye(9)
+            if k > 0:
+                prev = M + 9*(k-1)
+                J[k, :, prev:prev+9] = dPhi_ds[k] * SCALE[None, :] / SCALE[:, None]
+        return J.reshape(9*M, len(w))
+
+    def _path(self, w):
+        '''V_max - V >= 0 and Fur_max - furfural >= 0 at every node'''
+        _, S = self._unpack(w)
+        return np.r_[self.V_max - S[:, 8], self.Fur_max - S[:, 2]]
+
+    def _path_jac(self, w):
+        M = self.M
+        J = np.zeros((2*M, len(w)))
+        for k in range(M):
+            J[k, M + 9*k + 8] = -SCALE[8]
+            J[M + k, M + 9*k + 2] = -SCALE[2]
+        return J
+
+    def _initial_guess(self):
+        '''Previous solution shifted by one interval, or a forward simulation'''
+        if self.w is not None:
+            U, S = self._unpack(self.w)
+            last = self.shoot(S[-1:], U[-1:])
+            return np.r_[np.r_[U[1:], U[-1]] / self.F_max, (np.vstack([S[1:], last]) / SCALE).ravel()]
+        U = np.full(self.M, min(self.u_prev, self.F_max))
+        S = np.empty((self.M, 9))
+        x = self.x0
+        for k in range(self.M):                                     # Sequential: each interval starts from the last
+            x = self.shoot(x[None], U[k:k+1])[0]
+            S[k] = x
+        return np.r_[U / self.F_max, (S / SCALE).ravel()]
+
+    def solve(self, x):
+        '''Optimize the feed over the horizon from the measured state x. Returns
+        an OptimizeResult with u (horizon,) feed rates, s (horizon, 9) predicted
+        states, and the SLSQP status.'''
+        self.x0 = np.asarray(x, dtype=np.float64)
+        self._lin = None
+        w0 = self._initial_guess()
+        n = len(w0)
+        bounds = [(0.0, 1.0)] * self.M + [(0.0, None)] * (n - self.M)
+        constraints = [{'type': 'eq', 'fun': self._defects, 'jac': self._defects_jac},
+                       {'type': 'ineq', 'fun': self._path, 'jac': self._path_jac}]
+        opt = minimize(self._objective, w0, jac=self._objective_grad, method='SLSQP', bounds=bounds,
+                       constraints=constraints, options={'maxiter': self.maxiter, 'ftol': 1e-8})
+        self.w = opt.x
+        U, S = self._unpack(opt.x)
+        return OptimizeResult(u=np.clip(U, 0.0, self.F_max), s=S, success=opt.success, status=opt.status,
+                              message=opt.message, nit=opt.nit, fun=opt.fun)
+
+    def step(self, x):
+        '''Feed rate to apply over the next control interval'''
+        res = self.solve(x)
+        self.u_prev = res.u[0]
+        return res.u[0]
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    from schedules import simulate_schedule
+
+    x = initial_values()
+    Cfeed = feed_values(x)
+    mpc = FeedMPC(Cfeed=Cfeed, horizon=8, dt=1.0)
+    mpc.shoot(x[None], np.zeros(1), sensitivities=True)             # Compile
+    t, times, log = 0.0, [], []
+    for i in range(30):
+        tic = perf_counter()
+        u = mpc.step(x)
+        times.append(perf_counter() - tic)
+        x = simulate_schedule(x, constant(u), Cfeed=Cfeed, tspan=(0, mpc.dt)).y[:, -1]     # Plant
+        t += mpc.dt
+        log.append((t, u, x[8], x[2], x[6] * x[8]))
+        if i % 5 == 4:
+            print(f't={t:4.0f}  F={u:.3f}  V={x[8]:.3f}  Fur={x[2]:.3f}  EtOH mass={x[6]*x[8]:6.2f} g')
+    print(f'MPC solve time: mean {np.mean(times):.2f} s, max {np.max(times):.2f} s (control period 60 s)')
@@ -0,0 +1,197 @@
+import numpy as np
+from numba import njit
+from scipy.optimize import OptimizeResult
+from model import stoichiometry, balances, rate_jacobian, balances_jac, feed_values
+
+
+## TABULATED FEED SCHEDULES.
+# A feed schedule is data, not code: a (K, 6) table with one row per piece,
+#     [t_k, kind, c0, c1, c2, c3]
+# the piece k being used on t_k <= t < t_(k+1) (the last one until the end).
+# With s = t - t_k the feed rate of a piece is
+#     POLY:  c0 + c1*s + c2*s^2 + c3*s^3  (constant, linear and spline pieces)
+#     EXP:   min(c0*exp(c1*s), c2)        (exponential feeding, capped)
+# and F = 0 before the first row; negative rates are clipped to 0. The piece
+# is found by binary search in compiled code, so a new profile needs no
+# recompilation. Tables of different lengths are stacked into an (N, K, 6)
+# array for the ensembles (stack), padded with rows at t = inf.
+
+POLY = 0
+EXP = 1
+
+def _table(times, kinds, coefs):
+    table = np.zeros((len(times), 6))
+    table[:, 0] = times
+    table[:, 1] = kinds
+    table[:, 2:2+np.shape(coefs)[1]] = coefs
+    return table
+
+def constant(F, t_start=0.0):
+    '''Constant feed F from t_start (Feed of DAY5 is constant(0.2))'''
+    return _table([t_start], [POLY], [[F]])
+
+def piecewise_constant(times, rates):
+    '''Feed rates[k] from times[k] to times[k+1]'''
+    return _table(times, np.full(len(times), POLY), np.reshape(rates, (-1, 1)))
+
+def piecewise_linear(times, rates):
+    '''Feed interpolated linearly between (times, rates), rates[-1] after times[-1]'''
+    times, rates = np.asarray(times, dtype=np.float64), np.asarray(rates, dtype=np.float64)
+    slopes = np.append(np.diff(rates) / np.diff(times), 0.0)
+    return _table(times, np.full(len(times), POLY), np.column_stack([rates, slopes]))
+
+def spline(times, rates):
+    '''Cubic spline through (times, rates) (not-a-knot), rates[-1] after times[-1]'''
+    from scipy.interpolate import CubicSpline
+    times, rates = np.asarray(times, dtype=np.float64), np.asarray(rates, dtype=np.float64)
+    c = CubicSpline(times, rates).c[::-1].T                          # (K-1, 4), ascending powers
+    coefs = np.vstack([c, [rates[-1], 0.0, 0.0, 0.0]])
+    return _table(times, np.full(len(times), POLY), coefs)
+
+def exponential(F0, mu, t_start=0.0, t_stop=np.inf, F_max=np.inf):
+    '''Exponential feeding F0*exp(mu*(t - t_start)), capped at F_max, stopped at t_stop'''
+    table = _table([t_start], [EXP], [[F0, mu, F_max]])
+    if np.isfinite(t_stop):
+        table = np.vstack([table, constant(0.0, t_stop)])
+    return table
+
+def concatenate(*tables):
+    '''One schedule made of consecutive schedules (their rows sorted by time)'''
+    table = np.vstack(tables)
+    return table[np.argsort(table[:, 0], kind='stable')]
+
+def stack(tables):
+    '''(N, K, 6) array of N schedules, padded to the longest one'''
+    K = max(len(table) for table in tables)
+    S = np.zeros((len(tables), K, 6))
+    S[:, :, 0] = np.inf
+    for n, table in enumerate(tables):
+        S[n, :len(table)] = table
+    return S
+
+
+@njit(cache=True)
+def piece(table, t):
+    '''Index of the piece used at t (-1 before the first row)'''
+    lo, hi = 0, table.shape[0]
+    while lo < hi:                                                  # Number of rows with t_k <= t
+        mid = (lo + hi) // 2
+        if table[mid, 0] <= t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo - 1
+
+@njit(cache=True)
+def piece_rate(table, k, t):
+    '''Feed rate of piece k of the schedule table at time t'''
+    if k < 0:
+        return 0.0
+    s = t - table[k, 0]
+    c0, c1, c2, c3 = table[k, 2], table[k, 3], table[k, 4], table[k, 5]
+    if table[k, 1] == EXP:
+        F = min(c0 * np.exp(c1 * s), c2)
+    else:
+        F = c0 + s * (c1 + s * (c2 + s * c3))
+    return max(F, 0.0)
+
+@njit(cache=True)
+def feed_rate(table, t):
+    '''Feed rate of the schedule table at time t'''
+    return piece_rate(table, piece(table, t), t)
+
+@njit(cache=True)
+def next_switch(table, t):
+    '''First row time after t (inf if none)'''
+    k = piece(table, t) + 1
+    return table[k, 0] if k < table.shape[0] else np.inf
+
+
+@njit(cache=True)
+def fedbatch_schedule(t, x, par, Cfeed, st, table):
+    '''fedbatch_jit with the feed of a schedule table, args=(par, Cfeed, st, table)'''
+    dxdt = np.empty(9, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    balances(x, par, Cfeed, st, feed_rate(table, t), rates, dxdt)
+    return dxdt
+
+@njit(cache=True)
+def fedbatch_schedule_jac(t, x, par, Cfeed, st, table):
+    '''Analytic Jacobian of fedbatch_schedule'''
+    drdx = np.empty((5, 8), dtype=np.float64)
+    J = np.empty((9, 9), dtype=np.float64)
+    rate_jacobian(x, par, drdx)
+    balances_jac(x, Cfeed, st, feed_rate(table, t), drdx, J)
+    return J
+
+def simulate_schedule(init, table, par=None, Cfeed=None, tspan=(0,50), t_eval=None, method='LSODA', rtol=1e-8, atol=1e-8):
+    '''model.simulate with a feed schedule. The integration is restarted at
+    every row of the table, so the solver never steps over a switch.'''
+    from scipy.integrate import solve_ivp
+    from parameters import nominal, as_record
+    par = nominal() if par is None else as_record(par)              # Records: cached compiled code
+    x = np.asarray(init, dtype=np.float64)
+    Cfeed = feed_values(x) if Cfeed is None else np.asarray(Cfeed, dtype=np.float64)
+    table = np.ascontiguousarray(table, dtype=np.float64)
+    st = stoichiometry(par)
+    options = {} if method in ('RK45', 'RK23', 'DOP853') else {'jac': fedbatch_schedule_jac}
+    t0, t1 = float(tspan[0]), float(tspan[1])
+    bounds = np.unique(np.r_[t0, table[(table[:, 0] > t0) & (table[:, 0] < t1), 0], t1])
+    t_eval = None if t_eval is None else np.asarray(t_eval, dtype=np.float64)
+    ts, ys = [], []
+    nfev = njev = nlu = 0
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        sel = None if t_eval is None else t_eval[(t_eval >= a) & ((t_eval < b) | (b == t1))]
+        sol = solve_ivp(fedbatch_schedule, (a, b), x, method=method, args=(par, Cfeed, st, table),
+                        rtol=rtol, atol=atol, dense_output=t_eval is not None, **options)
+        nfev += sol.nfev; njev += sol.njev; nlu += sol.nlu
+        if t_eval is None:
+            ts.append(sol.t if not ts else sol.t[1:]); ys.append(sol.y if not ys else sol.y[:, 1:])
+        else:
+            ts.append(sel); ys.append(sol.sol(sel) if len(sel) else np.empty((9, 0)))
+        if sol.status < 0:
+            return OptimizeResult(t=np.concatenate(ts), y=np.hstack(ys), status=sol.status, message=sol.message,
+                                  success=False, nfev=nfev, njev=njev, nlu=nlu)
+        x = sol.y[:, -1]
+    return OptimizeResult(t=np.concatenate(ts), y=np.hstack(ys), status=0, message=sol.message, success=True,
+                          nfev=nfev, njev=njev, nlu=nlu)
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    from model import initial_values, simulate
+    from integrator import solve_ensemble
+    from parameters import parameter_table
+
+    init = initial_values()
+    t_eval = np.linspace(0, 50, 101)
+    ref = simulate(init, t_eval=t_eval)
+    sol = simulate_schedule(init, constant(0.2), t_eval=t_eval)
+    print(f'constant(0.2) against Feed: max difference {np.max(np.abs(sol.y - ref.y)):.1e}')
+
+    ## Candidate profiles for an ensemble: one schedule per member
+    rng = np.random.default_rng(0)
+    N = 2000
+    tables = []
+    for n in range(N):
+        kind = n % 4
+        if kind == 0:
+            tables.append(piecewise_constant([0, 10, 25], rng.uniform(0, 0.4, 3)))
+        elif kind == 1:
+            tables.append(piecewise_linear([0, 20, 50], rng.uniform(0, 0.4, 3)))
+        elif kind == 2:
+            tables.append(spline(np.linspace(0, 50, 6), rng.uniform(0, 0.4, 6)))
+        else:
+            tables.append(exponential(0.02, rng.uniform(0.02, 0.1), t_start=2.0, F_max=0.4))
+    S = stack(tables)
+    X0 = np.tile(init, (N, 1))
+    solve_ensemble(X0[:2], parameter_table(2), X0[:2], t_eval, schedules=S[:2])    # Compile
+    tic = perf_counter()
+    Cfeed = X0.copy()
+    Cfeed[:, 7] = 0
+    res = solve_ensemble(X0, parameter_table(N), Cfeed, t_eval, schedules=S)
+    print(f'{N} feed profiles in {perf_counter()-tic:.2f} s, {np.sum(res.status == 0)} ok, '
+          f'best final ethanol mass {np.max(res.y[:, 6, -1] * res.y[:, 8, -1]):.1f} g')
+    n = 5
+    sol = simulate_schedule(init, tables[n], t_eval=t_eval)
+    print(f'member {n} against simulate_schedule: max difference {np.max(np.abs(res.y[n] - sol.y)):.1e}')
@@ -0,0 +1,115 @@
+import os
+import json
+import numpy as np
+from numpy.lib.format import open_memmap
+from parameters import dtype as parameter_dtype
+
+
+## COLUMNAR TRAJECTORY STORE.
+# Ensemble outputs on a common time grid, kept in a directory:
+#     meta.json   shapes, dtype and state names
+#     t.npy       time grid (nt,)
+#     y.npy       states, (9, n_runs, nt): one state of all runs is contiguous
+#     runs.npy    one record per run: inputs (init, parameters), seed (-1
+#                 for none), run index in its campaign, solver statistics
+#                 and a written flag
+# The .npy files are preallocated and written in place as runs finish, and
+# read back through memory mapping: slicing y or runs only touches the pages
+# that are used, so 100k runs need not fit in RAM.
+
+STATES = ['Glucose', 'Xylose', 'Furfural', 'Furfuryl alcohol', '5-HMF', 'HAc', 'Ethanol', 'Biomass', 'Volume']
+
+RUN_DTYPE = np.dtype([('init', np.float64, 9),
+                      ('par', parameter_dtype),
+                      ('seed', np.int64),
+                      ('run', np.int64),
+                      ('status', np.int64),
+                      ('nfev', np.int64),
+                      ('njev', np.int64),
+                      ('nlu', np.int64),
+                      ('written', np.bool_)])
+NO_SEED = -1                                                        # seed of runs without a seed
+
+
+class TrajectoryStore():
+    '''Memory-mapped (state, run, time) trajectories with per-run metadata'''
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.t = np.load(os.path.join(path, 't.npy'))
+        self.y = np.load(os.path.join(path, 'y.npy'), mmap_mode=mode)
+        self.runs = np.load(os.path.join(path, 'runs.npy'), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, path, t, n_runs, dtype=np.float32, states=STATES):
+        '''Preallocate a store for n_runs trajectories on the time grid t'''
+        os.makedirs(path, exist_ok=True)
+        t = np.asarray(t, dtype=np.float64)
+        np.save(os.path.join(path, 't.npy'), t)
+        y = open_memmap(os.path.join(path, 'y.npy'), mode='w+', dtype=dtype, shape=(len(states), n_runs, len(t)))
+        y[:] = np.nan
+        y.flush()
+        runs = open_memmap(os.path.join(path, 'runs.npy'), mode='w+', dtype=RUN_DTYPE, shape=(n_runs,))
+        runs[:] = np.zeros((), dtype=RUN_DTYPE)
+        runs.flush()
+        del y, runs
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'n_runs': n_runs, 'nt': len(t), 'dtype': np.dtype(dtype).str, 'states': list(states)}, f)
+        return cls(path, mode='r+')
+
+    def __len__(self):
+        return self.y.shape[1]
+
+    def write(self, index, y, init=None, par=None, seed=0, run=None, status=0, nfev=0, njev=0, nlu=0):
+        '''Write runs index (int, slice or array) with states y ((9, nt) or (9, n, nt)).
+        Metadata arguments are scalars or arrays matching the runs; seed=None
+        (unseeded runs) is stored as NO_SEED.'''
+        self.y[:, index] = y
+        rec = self.runs[index]
+        if init is not None:
+            rec['init'] = init
+        if par is not None:
+            rec['par'] = par
+        rec['seed'] = NO_SEED if seed is None else seed
+        rec['run'] = np.arange(len(self))[index] if run is None else run
+        rec['status'] = status
+        rec['nfev'] = nfev
+        rec['njev'] = njev
+        rec['nlu'] = nlu
+        rec['written'] = True
+        self.runs[index] = rec
+
+    def flush(self):
+        self.y.flush()
+        self.runs.flush()
+
+    def state(self, name):
+        '''View (n_runs, nt) of one state, by name or index (no copy)'''
+        k = self.meta['states'].index(name) if isinstance(name, str) else name
+        return self.y[k]
+
+    def member(self, index):
+        '''Run index as a solve_ivp-like object with t and y (9, nt)'''
+        from scipy.optimize import OptimizeResult
+        return OptimizeResult(t=self.t, y=self.y[:, index], status=self.runs['status'][index])
+
+    def written(self):
+        '''Indices of the runs written so far'''
+        return np.flatnonzero(self.runs['written'])
+
+
+def open_store(path, mode='r'):
+    '''Open an existing store read-only (mode='r') or for appending (mode='r+')'''
+    return TrajectoryStore(path, mode=mode)
+
+
+if __name__=='__main__':
+    import tempfile
+    from campaign import run_campaign, random_feedstock
+    path = os.path.join(tempfile.gettempdir(), 'random_feedstock_store')
+    run_campaign(random_feedstock, 64, seed=1, store=path)
+    store = open_store(path)
+    ethanol = store.state('Ethanol')                 # memmap view, nothing is loaded yet
+    print(f'{len(store.written())}/{len(store)} runs, final ethanol {ethanol[:, -1].mean():.2f} g/L on average')
+    print(f'furfural < 0.0005 at t_end in {np.sum(store.state("Furfural")[:, -1] < 0.0005)} runs')
@@ -0,0 +1,170 @@
+import itertools
+import numpy as np
+from scipy.optimize import OptimizeResult
+from model import simulate, feed_values
+from parameters import names as parameter_names
+from store import STATES
+
+
+## POLYNOMIAL CHAOS SURROGATE OF THE FED-BATCH.
+# Maps the initial feedstock composition and Parameters fields to the whole
+# trajectory (9 states on the time grid of the training data), trained from
+# an ensemble (campaign.run_campaign result or store.TrajectoryStore).
+#   1. The inputs are scaled to [-1, 1] on the box spanned by the training
+#      runs, and expanded in orthonormal Legendre polynomials of total
+#      degree <= degree.
+#   2. The standardized trajectories are compressed by a principal component
+#      decomposition (SVD), keeping the modes with a fraction `energy` of
+#      the variance.
+#   3. The mode scores are fitted by least squares. The leave-one-out
+#      residuals (closed form, r_i / (1 - h_ii)) give the error estimate of
+#      every state and time, err (9, nt).
+# A prediction is one matrix product, microseconds per run in batches. Runs
+# outside the training box (by more than margin, in scaled units) are
+# simulated with the ODE model instead.
+
+def multi_indices(d, degree):
+    '''Exponents (n_terms, d) of all monomials of d variables with total degree <= degree'''
+    out = [alpha for total in range(degree + 1)
+           for alpha in itertools.product(range(total + 1), repeat=d) if sum(alpha) == total]
+    return np.array(out, dtype=np.int64).reshape(-1, d)
+
+def legendre_basis(Z, alpha):
+    '''Orthonormal (uniform measure) Legendre products at Z (m, d) in [-1, 1]'''
+    m, d = Z.shape
+    p = int(alpha.max()) if alpha.size else 0
+    L = np.ones((m, d, p + 1))
+    if p >= 1:
+        L[:, :, 1] = Z
+    for n in range(1, p):
+        L[:, :, n+1] = ((2*n + 1) * Z * L[:, :, n] - n * L[:, :, n-1]) / (n + 1)
+    L *= np.sqrt(2 * np.arange(p + 1) + 1)
+    return np.prod(L[:, np.arange(d)[None, :], alpha], axis=2)
+
+
+class Surrogate():
+    '''Polynomial chaos expansion of fed-batch trajectories'''
+    def __init__(self, inputs=None, degree=3, energy=0.99999, margin=0.02):
+        self.inputs = inputs                # State names (initial values) and Parameters names; None: all that vary
+        self.degree = degree
+        self.energy = energy
+        self.margin = margin
+
+    def _features(self, init, P):
+        cols = []
+        for name in self.inputs:
+            cols.append(init[:, STATES.index(name)] if name in STATES else P[name])
+        return np.column_stack(cols).astype(np.float64)
+
+    def _scale(self, X):
+        return 2 * (X - self.lo) / (self.hi - self.lo) - 1
+
+    def fit(self, t, init, P, Y):
+        '''Train on runs with initial values init (n, 9), parameters P (structured,
+        n) and trajectories Y (n, 9, nt) on the grid t. Failed runs (nan) are skipped.'''
+        init = np.asarray(init, dtype=np.float64)
+        ok = np.all(np.isfinite(Y), axis=(1, 2))
+        init, P, Y = init[ok], P[ok], np.asarray(Y[ok], dtype=np.float64)
+        if self.inputs is None:
+            self.inputs = [name for k, name in enumerate(STATES) if np.ptp(init[:, k]) > 0] + \
+                          [name for name in parameter_names if np.ptp(P[name]) > 0]
+        X = self._features(init, P)
+        self.lo, self.hi = X.min(axis=0), X.max(axis=0)
+        self.alpha = multi_indices(X.shape[1], self.degree)
+        A = legendre_basis(self._scale(X), self.alpha)
+        if A.shape[0] <= A.shape[1]:
+            raise ValueError(f'{A.shape[0]} runs for {A.shape[1]} polynomial terms: use more runs or a lower degree')
+
+        n, nx, nt = Y.shape
+        self.t = np.asarray(t, dtype=np.float64)
+        Yf = Y.reshape(n, nx * nt)
+        self.mean = Yf.mean(axis=0)
+        self.sd = Yf.std(axis=0)
+        self.sd[self.sd == 0] = 1.0
+        Yc = (Yf - self.mean) / self.sd
+        _, sv, Vt = np.linalg.svd(Yc, full_matrices=False)
+        r = int(np.searchsorted(np.cumsum(sv**2) / np.sum(sv**2), self.energy) + 1)
+        self.modes = Vt[:r]                                         # (r, 9*nt)
+        scores = Yc @ self.modes.T
+
+        Q, R = np.linalg.qr(A)
+        self.coef = np.linalg.solve(R, Q.T @ scores)                # (n_terms, r)
+        h = np.sum(Q**2, axis=1)                                    # Leverages
+        loo = (scores - A @ self.coef) / (1 - h)[:, None]
+        resid = (loo @ self.modes + (Yc - scores @ self.modes)) * self.sd
+        self.err = np.sqrt(np.mean(resid**2, axis=0)).reshape(nx, nt)
+        self.W = self.coef @ self.modes * self.sd                   # (n_terms, 9*nt): basis -> trajectory
+        self.shape = (nx, nt)
+        self.n_train = n
+        return self
+
+    def fit_store(self, store):
+        '''Train on the written runs of a store.TrajectoryStore'''
+        idx = store.written()
+        runs = store.runs[idx]
+        Y = np.transpose(np.asarray(store.y[:, idx], dtype=np.float64), (1, 0, 2))
+        return self.fit(store.t, runs['init'], runs['par'], Y)
+
+    def inside(self, init, P):
+        '''True for the runs inside the training box'''
+        Z = self._scale(self._features(np.atleast_2d(init), np.atleast_1d(P)))
+        return np.all(np.abs(Z) <= 1 + self.margin, axis=1)
+
+    def predict(self, init, P, fallback=True, rtol=1e-8, atol=1e-8):
+        '''Trajectories (m, 9, nt) for initial values init (m, 9) and parameters P
+        (structured, m). Returns an OptimizeResult with t, y, err (9, nt)
+        (leave-one-out RMS error of the surrogate) and inside (m,). With
+        fallback, the runs outside the training box are simulated (LSODA).'''
+        init = np.atleast_2d(np.asarray(init, dtype=np.float64))
+        P = np.atleast_1d(P)
+        Z = self._scale(self._features(init, P))
+        inside = np.all(np.abs(Z) <= 1 + self.margin, axis=1)
+        y = (self.mean + legendre_basis(Z, self.alpha) @ self.W).reshape(len(init), *self.shape)
+        if fallback:
+            for k in np.flatnonzero(~inside):
+                sol = simulate(init[k], par=P[k], Cfeed=feed_values(init[k]),
+                               tspan=(self.t[0], self.t[-1]), t_eval=self.t, rtol=rtol, atol=atol)
+                y[k] = np.nan
+                y[k, :, :sol.y.shape[1]] = sol.y
+        return OptimizeResult(t=self.t, y=y, err=self.err, inside=inside)
+
+    def predict_final(self, init, P, fallback=True):
+        '''Final states (m, 9) and their error estimate (9,); only the last
+        column of the expansion is evaluated'''
+        init = np.atleast_2d(np.asarray(init, dtype=np.float64))
+        P = np.atleast_1d(P)
+        nx, nt = self.shape
+        last = np.arange(nx) * nt + nt - 1
+        Z = self._scale(self._features(init, P))
+        inside = np.all(np.abs(Z) <= 1 + self.margin, axis=1)
+        y = self.mean[last] + legendre_basis(Z, self.alpha) @ self.W[:, last]
+        if fallback and not np.all(inside):
+            out = np.flatnonzero(~inside)
+            y[out] = self.predict(init[out], P[out]).y[:, :, -1]
+        return y, self.err[:, -1]
+
+if __name__=='__main__':
+    from time import perf_counter
+    from campaign import run_campaign, variable_feedstock
+    tic = perf_counter()
+    train = run_campaign(variable_feedstock, 600, seed=1)
+    test = run_campaign(variable_feedstock, 200, seed=2)
+    print(f'800 LSODA runs in {perf_counter()-tic:.1f} s')
+    sur = Surrogate(degree=3).fit(train.t, train.init, train.par, train.y)
+    print(f'inputs {sur.inputs}: {len(sur.alpha)} terms, {sur.modes.shape[0]} modes')
+    big_init = np.repeat(test.init, 50, axis=0)
+    big_P = np.repeat(test.par, 50)
+    sur.predict(big_init[:10], big_P[:10])
+    tic = perf_counter()
+    pred = sur.predict(big_init, big_P, fallback=False)
+    print(f'{len(big_init)} predictions: {1e6*(perf_counter()-tic)/len(big_init):.1f} us each')
+    tic = perf_counter()
+    pred = sur.predict(test.init, test.par)
+    print(f'{len(test.init)} test runs: {np.sum(~pred.inside)} outside the training box (simulated), {perf_counter()-tic:.2f} s')
+    rmse = np.sqrt(np.mean((pred.y - test.y)**2, axis=0))
+    for k in [0, 1, 6, 7]:
+        print(f'{STATES[k]:8s} test RMSE {rmse[k].max():.4f} g/L (max over t), estimate {sur.err[k].max():.4f}')
+    outside = test.init[:1].copy()
+    outside[0, 0] = 60.0                                         # Glucose far above the training range
+    res = sur.predict(outside, test.par[:1])
+    print(f'outside the training box: inside={res.inside[0]}, simulated final ethanol {res.y[0, 6, -1]:.2f} g/L')
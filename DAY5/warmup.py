@@ -0,0 +1,181 @@
+import os
+from time import perf_counter
+import numpy as np
+from numba import njit
+from numba.core.registry import CPUDispatcher
+from scipy.optimize import OptimizeResult
+try:
+    import yeast_fermentation
+except ModuleNotFoundError:                                         # Not installed: use the package of this repository
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import yeast_fermentation.kinetics
+import yeast_fermentation.reactor
+from yeast_fermentation.jitcache import check_stamp, remove_cached
+from parameters import nominal, parameter_table
+
+
+## COMPILED CODE CACHE AND WARM-UP.
+# The compiled functions of model.py, events.py, schedules.py, integrator.py
+# and of the kinetics core and operating modes of the yeast_fermentation
+# package are cached on disk by numba (cache=True), in __pycache__ next to
+# the sources or in NUMBA_CACHE_DIR. The first process that needs a
+# function compiles it and writes it there; every later process, notebook
+# kernel or pool worker loads it instead, in milliseconds. The library solves
+# with parameter records (see parameters.nominal): a function called with a
+# Parameters instance is compiled again in every process, and each writes a
+# cache entry that is never reused.
+#   warmup(groups)   compiles or loads the functions of some groups now, so
+#                    that the first solve does not wait (pool initializer)
+#   ready(groups)    True once the groups were warmed up in this process
+#   clear_cache()    removes the cached functions
+# Numba checks the timestamp of the file a function is defined in, but not of
+# the files it calls into, whose functions are inlined. So this module calls
+# check_cache() when it is imported (model.py imports it first), before any
+# cached function is loaded: the DAY5 cache holds a stamp, the hash of
+# SOURCES, and when an edit of the kinetics core or of a DAY5 module changed
+# it, the cached functions of the DAY5 modules are removed and compiled
+# again (the package guards its own, see yeast_fermentation/jitcache.py).
+
+MODULES = ['yeast_fermentation.kinetics', 'yeast_fermentation.reactor', 'model', 'events', 'schedules', 'integrator']
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = [yeast_fermentation.kinetics.__file__, yeast_fermentation.reactor.__file__] + \
+          [os.path.join(HERE, name + '.py') for name in MODULES if not name.startswith('yeast_fermentation')]
+
+@njit(cache=True)
+def _probe():
+    '''Never called: its cache directory is the one of the DAY5 modules'''
+    return 0
+
+def check_cache():
+    '''Clear the cached functions of the DAY5 modules if SOURCES changed since
+    they were compiled. Returns the number of files removed.'''
+    stems = [name for name in MODULES if not name.startswith('yeast_fermentation')]
+    return check_stamp(_probe.stats.cache_path, 'DAY5', SOURCES, stems)
+
+def _model():
+    from model import initial_values, feed_values, stoichiometry, fedbatch_jit, fedbatch_jac
+    par, x = nominal(), initial_values()
+    args = (par, feed_values(x), stoichiometry(par))
+    fedbatch_jit(0.0, x, *args)
+    fedbatch_jac(0.0, x, *args)
+
+def _events():
+    from model import initial_values, feed_values, stoichiometry
+    from events import fedbatch_switched, fedbatch_switched_jac
+    par, x = nominal(), initial_values()
+    args = (par, feed_values(x), stoichiometry(par), 0.1, 0.005, 2.0)
+    fedbatch_switched(0.0, x, *args)
+    fedbatch_switched_jac(0.0, x, *args)
+
+def _schedules():
+    from model import initial_values, feed_values, stoichiometry
+    from schedules import constant, fedbatch_schedule, fedbatch_schedule_jac, next_switch
+    par, x = nominal(), initial_values()
+    table = constant(0.1)
+    args = (par, feed_values(x), stoichiometry(par), table)
+    fedbatch_schedule(0.0, x, *args)
+    fedbatch_schedule_jac(0.0, x, *args)
+    next_switch(table, 0.0)
+
+def _ensemble():
+    from model import initial_values, feed_values
+    from integrator import solve_ensemble
+    from schedules import constant, stack
+    X0 = initial_values()[None]
+    Cfeed = feed_values(X0[0])[None]
+    t_eval = np.array([0.0, 1e-3])
+    solve_ensemble(X0, parameter_table(1), Cfeed, t_eval)
+    solve_ensemble(X0, parameter_table(1), Cfeed, t_eval, schedules=stack([constant(0.1)]))
+
+def _reactor():
+    from yeast_fermentation import Reactor
+    for mode in ['batch', 'fedbatch', 'continuous']:
+        reactor = Reactor(mode)
+        x = reactor.initial_values()
+        reactor.rhs(0.0, x, *reactor.args())
+        reactor.jac(0.0, x, *reactor.args())
+
+GROUPS = {'model': _model, 'reactor': _reactor, 'events': _events, 'schedules': _schedules, 'ensemble': _ensemble}
+
+_ready = set()
+
+def _dispatchers():
+    import importlib
+    for name in MODULES:
+        module = importlib.import_module(name)
+        for func in vars(module).values():
+            if isinstance(func, CPUDispatcher) and func.py_func.__module__ == name:
+                yield f'{name}.{func.__name__}', func
+
+def warmup(groups=None):
+    '''Compile (or load from the cache) the functions of groups (default: all
+    of GROUPS). Returns an OptimizeResult with the time of every group,
+    loaded (functions read from the cache) and compiled (functions compiled
+    and written to the cache) in this process so far.'''
+    groups = list(GROUPS) if groups is None else [groups] if isinstance(groups, str) else list(groups)
+    check_cache()
+    times = {}
+    for group in groups:
+        tic = perf_counter()
+        GROUPS[group]()
+        times[group] = perf_counter() - tic
+        _ready.add(group)
+    loaded, compiled = [], []
+    for name, func in _dispatchers():
+        if sum(func.stats.cache_hits.values()):
+            loaded.append(name)
+        if sum(func.stats.cache_misses.values()):
+            compiled.append(name)
+    return OptimizeResult(times=times, elapsed=sum(times.values()), loaded=loaded, compiled=compiled)
+
+def ready(groups=None):
+    '''True if the groups (default: all) were warmed up in this process'''
+    groups = list(GROUPS) if groups is None else [groups] if isinstance(groups, str) else list(groups)
+    return all(group in _ready for group in groups)
+
+def clear_cache():
+    '''Remove the cached compiled functions of MODULES; returns the number of files removed'''
+    paths = {func.stats.cache_path for _, func in _dispatchers()}
+    stems = [name.rsplit('.', 1)[-1] for name in MODULES]           # Files are named after the module file
+    return sum(remove_cached(path, stems) for path in paths)
+
+check_cache()                                                       # Before any cached function is loaded
+
+
+def startup(groups=None, env=None):
+    '''Wall time (s) of a fresh Python process that imports the model, warms up
+    and solves one fed-batch, measured from its start; and its warmup result'''
+    import sys
+    import json
+    import subprocess
+    code = ('import time; tic = time.perf_counter()\n'
+            'import json, warmup, model\n'
+            f'res = warmup.warmup({groups!r})\n'
+            'model.simulate(model.initial_values())\n'
+            'print(json.dumps([time.perf_counter() - tic, res.elapsed, len(res.loaded), len(res.compiled)]))\n')
+    tic = perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    total = perf_counter() - tic
+    inside, elapsed, n_loaded, n_compiled = json.loads(out.stdout.strip().splitlines()[-1])
+    return OptimizeResult(total=total, inside=inside, warmup=elapsed, loaded=n_loaded, compiled=n_compiled)
+
+
+if __name__=='__main__':
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import tempfile
+    env = dict(os.environ, NUMBA_CACHE_DIR=tempfile.mkdtemp())     # Start from an empty cache
+    for label in ['cold (empty cache)', 'warm (cached)']:
+        res = startup(env=env)
+        print(f'{label:19s}: process {res.total:5.2f} s, warm-up {res.warmup:5.2f} s '
+              f'({res.loaded} functions loaded, {res.compiled} compiled)')
+
+    res = warmup()
+    print(f'this process: warm-up {res.elapsed:.2f} s, {len(res.loaded)} loaded, {len(res.compiled)} compiled, '
+          f'ready: {ready()}')
+    tic = perf_counter()
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=warmup, initargs=(['model'],)) as pool:
+        assert all(pool.map(ready, [['model']] * 2))
+    print(f'pool of 2 spawned workers ready in {perf_counter()-tic:.2f} s')
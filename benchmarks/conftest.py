@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import importlib
+from contextlib import contextmanager
+import numpy as np
+import pytest
+
+
+## BENCHMARK HARNESS.
+# Each benchmark test times one case with the `bench` fixture:
+#     bench(func, *args, rounds=5)
+# func is called once to warm up (numba compilation, caches), then timed
+# over `rounds` rounds of `number` calls each (chosen so that a round takes
+# at least --bench-min-time seconds). The time per call of each round is
+# kept; min, median and mean are reported.
+# At the end of the session the results are appended as one JSON line to
+# the history file (--bench-history) with the commit and the versions, and
+# compared to the baseline (--bench-baseline, written with
+# --bench-save-baseline): cases slower than the baseline median by more than
+# --bench-tolerance are listed as regressions (failing with --bench-fail).
+#     python -m pytest benchmarks -q --bench-save-baseline
+#     python -m pytest benchmarks -q
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+DAY_FOLDERS = ['DAY1/Yeast_model_python', 'DAY3', 'DAY4', 'DAY5']
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)                        # closed_loop, pid
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench')
+    group.addoption('--bench-history', default=os.path.join(HERE, 'history.jsonl'),
+                    help='JSON lines file the results are appended to')
+    group.addoption('--bench-baseline', default=os.path.join(HERE, 'baseline.json'),
+                    help='JSON file with the baseline results')
+    group.addoption('--bench-save-baseline', action='store_true', help='store the results as the new baseline')
+    group.addoption('--bench-tolerance', type=float, default=1.2,
+                    help='slowdown factor of the median over the baseline counted as a regression')
+    group.addoption('--bench-fail', action='store_true', help='fail the session on regressions')
+    group.addoption('--bench-min-time', type=float, default=0.05, help='minimum duration of one round (s)')
+
+
+## MODULES OF THE DAY FOLDERS.
+# The DAY folders have modules with the same names (model, parameters), that
+# import each other by plain name. day(folder) puts the modules of one
+# folder in sys.modules (and the folder on sys.path) for the duration of the
+# block, and keeps them for the next block of the same folder. The modules
+# loaded before the block are restored after it, so that functions imported
+# by other test modules still pickle (by reference) for worker processes.
+
+_modules = {folder: {} for folder in DAY_FOLDERS}
+
+def _folder_of(module):
+    path = os.path.abspath(getattr(module, '__file__', None) or '')
+    for folder in DAY_FOLDERS:
+        if os.path.dirname(path) == os.path.join(ROOT, folder):
+            return folder
+    return None
+
+@contextmanager
+def day(folder):
+    '''with day('DAY5') as load: model = load('model')'''
+    loaded = {}
+    for name, module in list(sys.modules.items()):
+        other = _folder_of(module)
+        if other is not None:
+            _modules[other][name] = loaded[name] = sys.modules.pop(name)
+    sys.modules.update(_modules[folder])
+    path = os.path.join(ROOT, folder)
+    sys.path.insert(0, path)
+    cwd = os.getcwd()
+    os.chdir(path)                                  # Data files are read relative to the folder
+    try:
+        yield importlib.import_module
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(path)
+        for name, module in list(sys.modules.items()):
+            if _folder_of(module) == folder:
+                _modules[folder][name] = sys.modules.pop(name)
+        sys.modules.update(loaded)
+
+
+## TIMING.
+_results = {}
+
+def _time(func, args, number):
+    tic = time.perf_counter()
+    for _ in range(number):
+        func(*args)
+    return (time.perf_counter() - tic) / number
+
+@pytest.fixture
+def bench(request):
+    min_time = request.config.getoption('--bench-min-time')
+    def run(func, *args, rounds=5, number=None):
+        func(*args)                                 # Warm up
+        if number is None:
+            number = 1
+            while True:
+                t = _time(func, args, number)
+                if t * number >= min_time or number >= 10**6:
+                    break
+                number = max(number * 2, int(1.2 * min_time / max(t, 1e-9)))
+        times = np.array([_time(func, args, number) for _ in range(rounds)])
+        _results[request.node.name] = {'min': float(times.min()), 'median': float(np.median(times)),
+                                      'mean': float(times.mean()), 'rounds': rounds, 'number': number}
+        return _results[request.node.name]
+    return run
+
+
+## HISTORY AND BASELINE.
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _versions():
+    versions = {'python': platform.python_version()}
+    for name in ['numpy', 'scipy', 'numba', 'statsmodels']:
+        try:
+            versions[name] = importlib.import_module(name).__version__
+        except ImportError:
+            pass
+    return versions
+
+def _compare(config):
+    '''(name, median, baseline median, ratio, regression) for every result'''
+    baseline = {}
+    if os.path.exists(config.getoption('--bench-baseline')):
+        with open(config.getoption('--bench-baseline')) as f:
+            baseline = json.load(f)['results']
+    tolerance = config.getoption('--bench-tolerance')
+    rows = []
+    for name, res in sorted(_results.items()):
+        ref = baseline.get(name, {}).get('median')
+        ratio = res['median'] / ref if ref else None
+        rows.append((name, res['median'], ref, ratio, ratio is not None and ratio > tolerance))
+    return rows
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    config = session.config
+    record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': _commit(), 'machine': platform.node(),
+              'cpus': os.cpu_count(), 'versions': _versions(), 'results': _results}
+    with open(config.getoption('--bench-history'), 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    config._bench_rows = _compare(config)
+    if config.getoption('--bench-save-baseline'):
+        with open(config.getoption('--bench-baseline'), 'w') as f:
+            json.dump(record, f, indent=1)
+    if config.getoption('--bench-fail') and any(row[4] for row in config._bench_rows):
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+def _fmt(t):
+    if t is None:
+        return '-'
+    for unit, scale in [('s', 1.0), ('ms', 1e-3), ('us', 1e-6)]:
+        if t >= scale:
+            return f'{t/scale:.3g} {unit}'
+    return f'{t*1e9:.3g} ns'
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    rows = getattr(config, '_bench_rows', None)
+    if not rows:
+        return
+    tr = terminalreporter
+    tr.section('benchmarks (median per call)')
+    width = max(len(row[0]) for row in rows)
+    for name, median, ref, ratio, regression in rows:
+        change = '' if ratio is None else f'x{ratio:.2f} of baseline'
+        tr.write_line(f'{name:{width}s}  {_fmt(median):>10s}  {_fmt(ref):>10s}  {change}{"  REGRESSION" if regression else ""}')
+    n_regressions = sum(row[4] for row in rows)
+    if n_regressions:
+        tr.write_line(f'{n_regressions} regression(s) over x{config.getoption("--bench-tolerance")}')
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+from conftest import day
+
+
+## RIGHT-HAND SIDE EVALUATIONS.
+def test_day1_kinetics_rhs(bench):
+    with day('DAY1/Yeast_model_python') as load:
+        model = load('model')
+        par = load('parameters').Parameters()
+        x = np.array(model.initial_values(), dtype=np.float64)
+        bench(model.kinetics, 0.0, x, par)
+
+def test_day3_fedbatch_rhs(bench):
+    with day('DAY3') as load:
+        model = load('model')
+        par = load('parameters').Parameters()
+        x = np.array(model.initial_values(), dtype=np.float64)
+        bench(model.fedbatch, 3.0, x, par, model.feed_values(x))
+
+def test_day5_fedbatch_rhs(bench):
+    with day('DAY5') as load:
+        model = load('model')
+        par = load('parameters').Parameters()
+        x = model.initial_values()
+        bench(model.fedbatch, 0.0, x, par, model.feed_values(x))
+
+def test_day5_fedbatch_jit_rhs(bench):
+    with day('DAY5') as load:
+        model = load('model')
+        par = load('parameters').nominal()                          # A record, like the library solves
+        x = model.initial_values()
+        bench(model.fedbatch_jit, 0.0, x, par, model.feed_values(x), model.stoichiometry(par))
+
+@pytest.mark.parametrize('kinetics', ['core', 'generated'])
+def test_reactor_fedbatch_rhs(bench, kinetics):
+    from yeast_fermentation import Reactor, YEAST, compile_network
+    reactor = Reactor('fedbatch', network=compile_network(YEAST) if kinetics == 'generated' else None)
+    x = reactor.initial_values()
+    bench(reactor.rhs, 0.0, x, *reactor.args(x))
+
+
+## FULL SOLVES, 0-50 h.
+@pytest.mark.parametrize('method', ['RK45', 'LSODA', 'BDF'])
+def test_day5_solve(bench, method):
+    with day('DAY5') as load:
+        model = load('model')
+        x = model.initial_values()
+        bench(model.simulate, x, None, None, (0, 50), None, method, 1e-8, 1e-8, rounds=3)
+
+def test_day3_solve_lsoda(bench):
+    with day('DAY3') as load:
+        model = load('model')
+        par = load('parameters').Parameters()
+        x = np.array(model.initial_values(), dtype=np.float64)
+        def solve():
+            return solve_ivp(model.fedbatch, (0, 50), x, args=(par, model.feed_values(x)), method='LSODA',
+                             rtol=1e-8, atol=1e-8)
+        bench(solve, rounds=3)
+
+
+## ENSEMBLES (100 runs of ML.ipynb).
+def test_ml_ensemble_lsoda(bench):
+    with day('DAY5') as load:
+        campaign = load('campaign')
+        bench(lambda: campaign.run_campaign(campaign.random_feedstock, 100, seed=42, workers=1), rounds=3)
+
+def test_ml_ensemble_rosenbrock(bench):
+    with day('DAY5') as load:
+        model = load('model')
+        integrator = load('integrator')
+        parameters = load('parameters')
+        rng = np.random.default_rng(42)
+        X0 = np.array([model.initial_values() for _ in range(100)])
+        X0[:, 0] = rng.normal(39.7, 39.7*0.25, 100)
+        X0[:, 1] = rng.normal(23.5, 23.5*0.25, 100)
+        X0[:, 2:6] *= (X0[:, 0] / 39.7)[:, None]
+        Cfeed = X0.copy()
+        Cfeed[:, 7] = 0
+        P = parameters.parameter_table(100)
+        t_eval = np.linspace(0, 50, 101)
+        bench(integrator.solve_ensemble, X0, P, Cfeed, t_eval, rounds=3)
+
+
+## SIGNAL PROCESSING (DAY4).
+@pytest.fixture(scope='module')
+def signal():
+    '''The 8 kHz, two channel noisy sinusoids of data_smoothng.ipynb'''
+    rng = np.random.default_rng(2)
+    time = np.arange(start=0, stop=10, step=1/8E3)
+    X = np.zeros(shape=(len(time), 2))
+    X[:, 0] = 0.5*rng.normal(size=len(time)) + np.sin(2*np.pi*50*time + np.pi/9)
+    X[:, 1] = 0.5*rng.normal(size=len(time)) + np.sin(2*np.pi*10*time + np.pi/3)
+    return X
+
+def test_exp_smooth_loop(bench, signal):
+    with day('DAY4') as load:
+        bench(load('smoothing').exp_smooth, signal, 0.1, rounds=3)
+
+def test_exp_smooth_fast(bench, signal):
+    with day('DAY4') as load:
+        bench(load('smoothing').exp_smooth_fast, signal, 0.1)
+
+def test_arima_walk_forward(bench):
+    with day('DAY4') as load:
+        forecasting = load('forecasting')
+        data = np.loadtxt('data.csv')
+        bench(forecasting.walk_forward, data, rounds=3)
+
+
+## CSTR PI LOOP (PI_controller.ipynb).
+KC, TAUI = 4.61730615181, 0.913444964569
+X0_CSTR = [0.87725294608097, 324.475443431599]
+
+def test_cstr_pi_loop_odeint(bench):
+    import closed_loop
+    t, sp = closed_loop.doublet()
+    bench(closed_loop.pi_loop_odeint, t, sp, X0_CSTR, KC, TAUI, rounds=3)
+
+def test_cstr_pi_loop(bench):
+    import closed_loop
+    t, sp = closed_loop.doublet()
+    bench(closed_loop.pi_loop, t, sp, X0_CSTR, KC, TAUI)
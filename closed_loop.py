@@ -0,0 +1,259 @@
+import numpy as np
+from numba import njit, prange
+from scipy.integrate import odeint
+from scipy.optimize import OptimizeResult
+from pid import STATE, tuning, state, pid_update
+
+
+## 1. CSTR MODEL (PI_controller.ipynb).
+Q = 100             # Volumetric Flowrate (m^3/sec)
+VR = 100            # Volume of CSTR (m^3)
+RHO = 1000          # Density of A-B Mixture (kg/m^3)
+CP = 0.239          # Heat capacity of A-B Mixture (J/kg-K)
+MDELH = 5e4         # Heat of reaction for A->B (J/mol)
+EOVERR = 8750       # E/R, Arrhenius Equation (K)
+K0 = 7.2e10         # Pre-exponential factor (1/sec)
+UA = 5e4            # Overall Heat Transfer Coefficient times Area (W/K)
+
+def cstr(x,t,u,Tf,Caf):
+    '''CSTR right hand side, odeint signature of the notebook.
+    x = [Ca, T], u = jacket temperature Tc, Tf = feed temperature, Caf = feed concentration'''
+    dxdt = np.zeros(2)
+    cstr_inplace(x, u, Tf, Caf, dxdt)
+    return dxdt
+
+@njit
+def cstr_inplace(x, u, Tf, Caf, dxdt):
+    '''Compiled CSTR right hand side, written into dxdt'''
+    Ca = x[0]
+    T = x[1]
+    rA = K0*np.exp(-EOVERR/T)*Ca                                    # reaction rate
+    dxdt[0] = Q/VR*(Caf - Ca) - rA
+    dxdt[1] = Q/VR*(Tf - T) + MDELH/(RHO*CP)*rA + UA/VR/RHO/CP*(u - T)
+
+
+## 2. REFERENCE LOOP.
+# The loop of PI_controller.ipynb: the controller output is computed at t[i]
+# and held on [t[i], t[i+1]], over which odeint is restarted from scratch.
+
+def pi_loop_odeint(t, sp, x0, Kc, tauI, tauD=0.0, op_hi=350.0, op_lo=250.0, Tf=350.0, Caf=1.0, u0=300.0):
+    '''Reference closed loop, one odeint call per control interval'''
+    n = len(t)
+    x = np.array(x0, dtype=np.float64)
+    y = np.zeros((2, n))
+    y[:, 0] = x
+    u = np.ones(n) * u0
+    op = np.zeros(n); pv = np.zeros(n); e = np.zeros(n); ie = np.zeros(n); dpv = np.zeros(n)
+    pv[0] = x[1]
+    for i in range(n-1):
+        delta_t = t[i+1]-t[i]
+        e[i] = sp[i] - pv[i]
+        if i >= 1:
+            dpv[i] = (pv[i]-pv[i-1])/delta_t
+            ie[i] = ie[i-1] + e[i] * delta_t
+        op[i] = op[0] + Kc*e[i] + Kc/tauI*ie[i] - Kc*tauD*dpv[i]
+        if op[i] > op_hi:
+            op[i] = op_hi
+            ie[i] = ie[i] - e[i] * delta_t
+        if op[i] < op_lo:
+            op[i] = op_lo
+            ie[i] = ie[i] - e[i] * delta_t
+        u[i+1] = op[i]
+        x = odeint(cstr, x, [t[i], t[i+1]], args=(u[i+1], Tf, Caf))[-1]
+        y[:, i+1] = x
+        pv[i+1] = x[1]
+    op[n-1] = op[n-2]
+    ie[n-1] = ie[n-2]
+    return OptimizeResult(t=t, y=y, u=u, op=op, sp=sp, ie=ie)
+
+
+## 3. PERSISTENT INTEGRATOR.
+# Dormand-Prince 5(4) with error control, compiled together with the
+# controller. The integration never restarts: the step size accepted in one
+# control interval is carried to the next one, a step is only shortened to
+# land exactly on the sample times (where the input jumps), and the proposed
+# step before shortening is kept for after the sample.
+
+A21 = 1/5
+A31, A32 = 3/40, 9/40
+A41, A42, A43 = 44/45, -56/15, 32/9
+A51, A52, A53, A54 = 19372/6561, -25360/2187, 64448/6561, -212/729
+A61, A62, A63, A64, A65 = 9017/3168, -355/33, 46732/5247, 49/176, -5103/18656
+B1, B3, B4, B5, B6 = 35/384, 500/1113, 125/192, -2187/6784, 11/84
+E1, E3, E4, E5, E6, E7 = 71/57600, -71/16695, 71/1920, -17253/339200, 22/525, -1/40
+HMIN = 1e-12        # Smallest step, relative to max(|t|, 1)
+MAX_STEPS = 100000  # Most steps (accepted and rejected) per control interval
+
+@njit
+def dopri_advance(x, t0, t1, h, u, Tf, Caf, rtol, atol, k):
+    '''Integrate x in place from t0 to t1 with input u held constant.
+    h is the proposed first step, k (7, n) is work space. Returns
+    (proposed next step, accepted steps, rejected steps, status), status 0 on
+    success, -1 if the step fell below HMIN (e.g. on a non-finite state) and
+    -2 after MAX_STEPS steps, with x left at the last accepted step.'''
+    n = x.shape[0]
+    k1, k2, k3, k4, k5, k6, k7 = k[0], k[1], k[2], k[3], k[4], k[5], k[6]
+    y = np.empty(n)
+    ynew = np.empty(n)
+    t = t0
+    accepted = 0
+    rejected = 0
+    cstr_inplace(x, u, Tf, Caf, k1)
+    while t < t1:
+        last = t + h >= t1
+        hs = t1 - t if last else h
+        for j in range(n): y[j] = x[j] + hs*A21*k1[j]
+        cstr_inplace(y, u, Tf, Caf, k2)
+        for j in range(n): y[j] = x[j] + hs*(A31*k1[j] + A32*k2[j])
+        cstr_inplace(y, u, Tf, Caf, k3)
+        for j in range(n): y[j] = x[j] + hs*(A41*k1[j] + A42*k2[j] + A43*k3[j])
+        cstr_inplace(y, u, Tf, Caf, k4)
+        for j in range(n): y[j] = x[j] + hs*(A51*k1[j] + A52*k2[j] + A53*k3[j] + A54*k4[j])
+        cstr_inplace(y, u, Tf, Caf, k5)
+        for j in range(n): y[j] = x[j] + hs*(A61*k1[j] + A62*k2[j] + A63*k3[j] + A64*k4[j] + A65*k5[j])
+        cstr_inplace(y, u, Tf, Caf, k6)
+        for j in range(n): ynew[j] = x[j] + hs*(B1*k1[j] + B3*k3[j] + B4*k4[j] + B5*k5[j] + B6*k6[j])
+        cstr_inplace(ynew, u, Tf, Caf, k7)
+        err = 0.0
+        for j in range(n):
+            ej = hs*(E1*k1[j] + E3*k3[j] + E4*k4[j] + E5*k5[j] + E6*k6[j] + E7*k7[j])
+            sc = atol + rtol*max(abs(x[j]), abs(ynew[j]))
+            err += (ej/sc)**2
+        err = np.sqrt(err/n)
+        if not err <= 1.0 and hs <= HMIN*max(abs(t), 1.0):
+            return h, accepted, rejected, -1
+        if accepted + rejected >= MAX_STEPS:
+            return h, accepted, rejected, -2
+        if err != err:
+            err = np.inf                                            # nan: reject with the largest reduction
+        fac = 10.0 if err == 0.0 else min(10.0, max(0.2, 0.9*err**-0.2))
+        if err <= 1.0:
+            t = t1 if last else t + hs
+            for j in range(n):
+                x[j] = ynew[j]
+                k1[j] = k7[j]                                       # First same as last
+            accepted += 1
+            if not last or fac < 1.0:                               # Keep the unshortened proposal across the sample
+                h = hs*fac
+        else:
+            h = hs*max(fac, 0.2)
+            rejected += 1
+    return h, accepted, rejected, 0
+
+
+## 4. CLOSED LOOP.
+# The controller is pid.pid_update: with bias=nan it reproduces the notebook
+# loop, where the bias op[0] is the first (limited) output.
+
+@njit
+def _run_loop(t, sp, x, tun, st, Tf, Caf, u0, rtol, atol, y, u, ie, k):
+    n = t.shape[0]
+    y[:, 0] = x
+    u[:] = u0
+    h = (t[1] - t[0]) if n > 1 else 0.0
+    steps = 0
+    rejected = 0
+    for i in range(n-1):
+        u[i+1] = pid_update(tun, st, sp[i], x[1], t[i+1]-t[i])
+        ie[i] = st.ie
+        h, acc, rej, status = dopri_advance(x, t[i], t[i+1], h, u[i+1], Tf, Caf, rtol, atol, k)
+        steps += acc
+        rejected += rej
+        if status < 0:
+            y[:, i+1:] = np.nan                                     # Failed: no trajectory after t[i]
+            return steps, rejected, status
+        y[:, i+1] = x
+    if n > 1:
+        ie[n-1] = ie[n-2]
+    return steps, rejected, 0
+
+@njit
+def _pi_loop(t, sp, x0, tun, Tf, Caf, u0, rtol, atol):
+    n = t.shape[0]
+    y = np.zeros((2, n)); u = np.zeros(n); ie = np.zeros(n)
+    st = np.zeros(1, dtype=STATE)[0]
+    steps, rejected, status = _run_loop(t, sp, x0.copy(), tun, st, Tf, Caf, u0, rtol, atol, y, u, ie, np.empty((7, 2)))
+    return y, u, ie, steps, rejected, status
+
+@njit(parallel=True)
+def _pi_sweep(t, sp, x0, tun, st, Tf, Caf, u0, rtol, atol):
+    N = tun.shape[0]
+    n = t.shape[0]
+    y = np.zeros((N, 2, n)); u = np.zeros((N, n)); ie = np.zeros((N, n))
+    steps = np.zeros(N, dtype=np.int64)
+    status = np.zeros(N, dtype=np.int64)
+    for m in prange(N):
+        steps[m], _, status[m] = _run_loop(t, sp, x0.copy(), tun[m], st[m], Tf, Caf, u0, rtol, atol,
+                                           y[m], u[m], ie[m], np.empty((7, 2)))
+    return y, u, ie, steps, status
+
+def _output(u):
+    op = np.empty_like(u)
+    op[..., :-1] = u[..., 1:]                                       # op[i] is applied on [t[i], t[i+1]]
+    op[..., -1] = u[..., -1]
+    return op
+
+def pi_loop(t, sp, x0, Kc, tauI, tauD=0.0, op_hi=350.0, op_lo=250.0, Tf=350.0, Caf=1.0, u0=300.0,
+            rtol=1e-8, atol=1e-8, bias=np.nan, bumpless=False):
+    '''Closed loop of PI_controller.ipynb with one persistent compiled integrator.
+    Same arguments and outputs as pi_loop_odeint, plus the number of
+    accepted (nsteps) and rejected (nrejected) integration steps. Raises
+    RuntimeError if the integration fails (see dopri_advance).'''
+    t = np.asarray(t, dtype=np.float64)
+    sp = np.broadcast_to(np.asarray(sp, dtype=np.float64), t.shape).copy()
+    tun = tuning(Kc, tauI, tauD, op_lo, op_hi, bias, bumpless)
+    y, u, ie, steps, rejected, status = _pi_loop(t, sp, np.asarray(x0, dtype=np.float64), tun, Tf, Caf, u0, rtol, atol)
+    if status < 0:
+        when = t[np.argmax(np.isnan(y[1]))-1]
+        raise RuntimeError(f'pi_loop: integration failed after t = {when} '
+                           f'({"step size too small" if status == -1 else "too many steps"})')
+    return OptimizeResult(t=t, y=y, u=u, op=_output(u), sp=sp, ie=ie, nsteps=steps, nrejected=rejected)
+
+def pi_sweep(t, sp, x0, tun, Tf=350.0, Caf=1.0, u0=300.0, rtol=1e-8, atol=1e-8):
+    '''Closed loops for an array of pid.TUNING records, in parallel.
+    Returns t, y (N, 2, nt), u, op, ie (N, nt), nsteps and status (N,): 0, or
+    the failure of dopri_advance, y being nan after the failed interval.'''
+    t = np.asarray(t, dtype=np.float64)
+    sp = np.broadcast_to(np.asarray(sp, dtype=np.float64), t.shape).copy()
+    y, u, ie, steps, status = _pi_sweep(t, sp, np.asarray(x0, dtype=np.float64), tun, state(len(tun)), Tf, Caf, u0,
+                                        rtol, atol)
+    return OptimizeResult(t=t, y=y, u=u, op=_output(u), sp=sp, ie=ie, nsteps=steps, status=status)
+
+
+def doublet(n_cycles=1):
+    '''Time grid and set point of the notebook (300 K, 320 K, 280 K doublet), repeated n_cycles times'''
+    t = np.linspace(0, 25*n_cycles, 250*n_cycles+1)
+    sp = np.tile(np.r_[np.full(80, 300.0), np.full(70, 320.0), np.full(100, 280.0)], n_cycles)
+    return t, np.r_[sp, sp[-1]]
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    Kc, tauI = 4.61730615181, 0.913444964569            # from IMC tuning
+    x0 = [0.87725294608097, 324.475443431599]            # Steady State Initial Conditions
+    t, sp = doublet()
+    pi_loop(t[:3], sp[:3], x0, Kc, tauI)                 # compile
+    tic = perf_counter()
+    ref = pi_loop_odeint(t, sp, x0, Kc, tauI)
+    t_ref = perf_counter() - tic
+    tic = perf_counter()
+    res = pi_loop(t, sp, x0, Kc, tauI)
+    t_new = perf_counter() - tic
+    print(f'notebook doublet: odeint loop {1e3*t_ref:.1f} ms, persistent integrator {1e3*t_new:.2f} ms')
+    print(f'max |dT| {np.max(np.abs(res.y[1]-ref.y[1])):.2e} K, max |dCa| {np.max(np.abs(res.y[0]-ref.y[0])):.2e}, '
+          f'max |du| {np.max(np.abs(res.u-ref.u)):.2e} K')
+    t, sp = doublet(400)                                 # 10000 min, about a week of operation
+    tic = perf_counter()
+    res = pi_loop(t, sp, x0, Kc, tauI)
+    print(f'{len(t)-1} control intervals in {perf_counter()-tic:.3f} s ({res.nsteps} steps, {res.nrejected} rejected)')
+    ## Tuning sweep around the IMC tuning, bumpless set point changes from the steady state
+    t, sp = doublet()
+    rng = np.random.default_rng(0)
+    tun = tuning(Kc*rng.uniform(0.25, 2.0, 2000), tauI*rng.uniform(0.25, 4.0, 2000), 0.0, 250.0, 350.0,
+                 bias=300.0, bumpless=True, n=2000)
+    pi_sweep(t[:3], sp[:3], x0, tun[:1])                 # compile
+    tic = perf_counter()
+    sweep = pi_sweep(t, sp, x0, tun)
+    iae = np.sum(np.abs(sweep.y[:, 1] - sp), axis=1)*(t[1]-t[0])
+    best = np.argmin(iae)
+    print(f'{len(tun)} loops in {perf_counter()-tic:.2f} s; best Kc={tun["Kc"][best]:.2f}, tauI={tun["tauI"][best]:.2f} (IAE {iae[best]:.1f} K min)')
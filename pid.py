@@ -0,0 +1,132 @@
+import numpy as np
+from numba import njit, prange
+
+
+## PID CONTROLLER.
+# One implementation of the controller of PI_controller.ipynb, PID.ipynb and
+# DAY2 (tankPI, kla_PI), compiled with numba:
+#     op = bias + Kc*(e + ie/tauI - tauD*dpv/dt),    e = sp - pv
+# - derivative on measurement: a set point step gives no derivative kick,
+# - output limits op_lo <= op <= op_hi, with anti-reset windup: the error of
+#   a step that saturates the output is not integrated,
+# - bumpless set point changes (bumpless=True): when the set point moves by
+#   dsp, ie is shifted by -tauI*dsp, so the proportional jump is absorbed and
+#   the output moves on through the integral action only.
+# Tuning and controller state are records (one per loop) of the dtypes
+# below; arrays of them hold many independent loops, stepped together with
+# pid_step. tauI = inf disables the integral action.
+
+TUNING = np.dtype([('Kc', np.float64),
+                   ('tauI', np.float64),
+                   ('tauD', np.float64),
+                   ('op_lo', np.float64),
+                   ('op_hi', np.float64),
+                   ('bias', np.float64),         # nan: the first output, computed without bias, as in the notebook (pid_rhs: 0)
+                   ('bumpless', np.bool_)])
+
+STATE = np.dtype([('ie', np.float64),            # Integral of the error
+                  ('pv', np.float64),            # Last measurement
+                  ('sp', np.float64),            # Last set point
+                  ('op0', np.float64),           # First output, the bias of later updates when tun.bias is nan
+                  ('n', np.int64)])              # Number of updates
+
+def tuning(Kc, tauI=np.inf, tauD=0.0, op_lo=-np.inf, op_hi=np.inf, bias=0.0, bumpless=False, n=None):
+    '''Tuning record (n=None) or array of n records; arguments broadcast'''
+    out = np.zeros(1 if n is None else n, dtype=TUNING)
+    for name, value in zip(TUNING.names, [Kc, tauI, tauD, op_lo, op_hi, bias, bumpless]):
+        out[name] = value
+    return out[0] if n is None else out
+
+def state(n=None):
+    '''Fresh controller state record (n=None) or array of n records'''
+    out = np.zeros(1 if n is None else n, dtype=STATE)
+    return out[0] if n is None else out
+
+
+@njit
+def pid_update(tun, st, sp, pv, dt):
+    '''Discrete controller update at one sample: returns the output and updates st in place'''
+    e = sp - pv
+    dpv = 0.0
+    if st.n >= 1:                                           # calculate starting on second cycle
+        if tun.bumpless and sp != st.sp and np.isfinite(tun.tauI):
+            st.ie -= tun.tauI*(sp - st.sp)
+        dpv = (pv - st.pv)/dt
+        st.ie += e*dt
+    bias = tun.bias
+    if np.isnan(bias):
+        bias = st.op0 if st.n >= 1 else 0.0
+    op = bias + tun.Kc*(e + st.ie/tun.tauI - tun.tauD*dpv)
+    if op > tun.op_hi:
+        op = tun.op_hi
+        st.ie -= e*dt                                       # anti-reset windup
+    elif op < tun.op_lo:
+        op = tun.op_lo
+        st.ie -= e*dt
+    if st.n == 0 and np.isnan(tun.bias):
+        st.op0 = op
+    st.pv = pv
+    st.sp = sp
+    st.n += 1
+    return op
+
+@njit(parallel=True)
+def pid_step(tun, st, sp, pv, dt, op):
+    '''Update arrays of independent loops: tun, st (n,), sp, pv (n,) -> op (n,)'''
+    for i in prange(st.shape[0]):
+        op[i] = pid_update(tun[i], st[i], sp[i], pv[i], dt)
+    return op
+
+
+## CONTINUOUS FORM.
+# For a controller integrated inside an ODE right hand side, ie is one of
+# the states: pid_rhs gives the output and d(ie)/dt from the measurement and
+# its time derivative (derivative on measurement). The integration stops
+# while the output is saturated and the error drives it further into the
+# limit. A bumpless set point change is a jump of ie, applied with
+# bumpless_shift when the integrator is restarted at the change. There is no
+# first sample to take the bias from, so bias=nan is 0, the bias of the
+# first output of pid_update.
+
+@njit
+def pid_rhs(tun, ie, sp, pv, dpvdt):
+    '''Continuous controller: returns (op, d(ie)/dt)'''
+    e = sp - pv
+    bias = 0.0 if np.isnan(tun.bias) else tun.bias
+    op = bias + tun.Kc*(e + ie/tun.tauI - tun.tauD*dpvdt)
+    if op > tun.op_hi:
+        return tun.op_hi, (e if e < 0.0 else 0.0)
+    if op < tun.op_lo:
+        return tun.op_lo, (e if e > 0.0 else 0.0)
+    return op, e
+
+@njit
+def bumpless_shift(tun, ie, sp_old, sp_new):
+    '''Integral state after a bumpless set point change'''
+    if tun.bumpless and np.isfinite(tun.tauI):
+        return ie - tun.tauI*(sp_new - sp_old)
+    return ie
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    ## Discrete first order process dx/dt = (K*u - x)/tau, many loops at once
+    n, K, tau, dt = 10000, 2.0, 5.0, 0.1
+    rng = np.random.default_rng(0)
+    tun = tuning(Kc=rng.uniform(0.2, 3.0, n), tauI=rng.uniform(1.0, 10.0, n), tauD=0.1,
+                 op_lo=-5.0, op_hi=5.0, bumpless=True, n=n)
+    st = state(n)
+    x = np.zeros(n)
+    op = np.zeros(n)
+    sp = np.ones(n)
+    a = np.exp(-dt/tau)
+    pid_step(tun, st, sp, x, dt, op)                        # compile
+    st[:] = state(n)
+    tic = perf_counter()
+    iae = np.zeros(n)
+    for k in range(600):
+        pid_step(tun, st, sp if k < 300 else 2*sp, x, dt, op)
+        x = a*x + (1-a)*K*op                                # Exact zero order hold response
+        iae += np.abs((1.0 if k < 300 else 2.0) - x)*dt
+    best = np.argmin(iae)
+    print(f'{n} loops x 600 samples in {perf_counter()-tic:.2f} s; best Kc={tun["Kc"][best]:.2f}, tauI={tun["tauI"][best]:.2f} (IAE {iae[best]:.2f})')
@@ -0,0 +1,93 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import cache
+from cache import SimulationCache, simulation_key
+from model import initial_values, feed_values, simulate
+from parameters import nominal, from_record
+from schedules import constant
+
+X0 = initial_values()
+
+
+## KEYS.
+def test_key_depends_on_every_input():
+    args = (X0, nominal(), feed_values(X0), (0, 50), None, 'LSODA', 1e-8, 1e-8)
+    key = simulation_key(*args)
+    assert simulation_key(*args) == key
+    par = nominal()
+    par['numaxG'] *= 1.01
+    x = X0.copy()
+    x[0] += 1e-9
+    others = [simulation_key(x, *args[1:]),
+              simulation_key(args[0], par, *args[2:]),
+              simulation_key(*args[:3], (0, 40), *args[4:]),
+              simulation_key(*args[:4], np.linspace(0, 50, 11), *args[5:]),
+              simulation_key(*args[:5], 'BDF', *args[6:]),
+              simulation_key(*args, feed=constant(0.2)),
+              simulation_key(*args, feed=constant(0.3))]
+    assert len({key, *others}) == len(others) + 1
+
+def test_key_of_parameters_instance():
+    args = (X0, feed_values(X0), (0, 50), None, 'LSODA', 1e-8, 1e-8)
+    assert simulation_key(X0, from_record(nominal()), *args[1:]) == simulation_key(X0, nominal(), *args[1:])
+
+
+## TWO-TIER CACHE.
+@pytest.fixture
+def store(tmp_path):
+    return SimulationCache(str(tmp_path), memory_items=2)
+
+def test_hits_match_simulate(store):
+    ref = simulate(X0)
+    first = store.simulate(X0)
+    second = store.simulate(X0)
+    store.memory.clear()
+    third = store.simulate(X0)                                      # From disk
+    assert (store.misses, store.hits) == (1, 2)
+    for res in (first, second, third):
+        np.testing.assert_array_equal(res.y, ref.y)
+        assert res.success and res.nfev == ref.nfev
+
+def test_results_are_copies(store):
+    res = store.simulate(X0)
+    res.y[:] = 0
+    assert np.all(store.simulate(X0).y[:, 0] == X0)
+
+def test_schedule(store):
+    table = constant(0.3)
+    res = store.simulate(X0, schedule=table)
+    assert store.simulate(X0, schedule=table.copy()).y[8, -1] == res.y[8, -1]
+    assert store.simulate(X0).y[8, -1] != res.y[8, -1]
+    assert (store.misses, store.hits) == (2, 1)
+
+def test_failed_solves_are_not_stored(store, monkeypatch):
+    def failing(*args, **kwargs):
+        sol = simulate(*args, **kwargs)
+        sol.status, sol.success = -1, False
+        return sol
+    monkeypatch.setattr(cache, 'simulate', failing)
+    assert not store.simulate(X0).success
+    assert not store.simulate(X0).success
+    assert store.misses == 2 and len(store.memory) == 0 and os.listdir(store.path) == []
+
+def test_evict(store):
+    for k, F in enumerate([0.1, 0.2, 0.3]):
+        store.simulate(X0, schedule=constant(F))
+        for entry in os.scandir(store.path):
+            if entry.stat().st_mtime > 1e6:                         # Just written
+                os.utime(entry.path, (1000 + k, 1000 + k))          # Distinct use times, oldest first
+    size = max(entry.stat().st_size for entry in os.scandir(store.path))
+    store.max_bytes = 2*size
+    store.evict()
+    assert len(os.listdir(store.path)) == 2
+    store.memory.clear()
+    store.simulate(X0, schedule=constant(0.1))                      # The least recently used one was evicted
+    assert store.misses == 4
@@ -0,0 +1,48 @@
+import os
+import sys
+import multiprocessing
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from campaign import run_campaign, random_feedstock, variable_growth
+
+
+@pytest.fixture(scope='module')
+def serial():
+    return run_campaign(variable_growth, 8, seed=7, workers=1, chunksize=3)
+
+
+## REPRODUCIBILITY.
+def test_workers_do_not_change_results(serial):
+    parallel = run_campaign(variable_growth, 8, seed=7, workers=2, chunksize=3,
+                            mp_context=multiprocessing.get_context('spawn'))
+    np.testing.assert_array_equal(parallel.y, serial.y)
+    np.testing.assert_array_equal(parallel.init, serial.init)
+    np.testing.assert_array_equal(parallel.par, serial.par)
+
+def test_chunks_do_not_change_results(serial):
+    res = run_campaign(variable_growth, 8, seed=7, workers=1, chunksize=8)
+    np.testing.assert_array_equal(res.y, serial.y)
+
+def test_seed_changes_results(serial):
+    res = run_campaign(variable_growth, 8, seed=8, workers=1)
+    assert not np.any(res.init[:, 0] == serial.init[:, 0])
+
+
+## RESULTS.
+def test_results(serial):
+    assert serial.y.shape == (8, 9, 101)
+    assert np.all(serial.status == 0)
+    assert np.all(serial.nfev > 0)
+    np.testing.assert_allclose(serial.y[:, :, 0], serial.init, rtol=1e-12)
+    assert np.all(serial.par['numaxG'] > 0) and len(np.unique(serial.par['numaxG'])) == 8
+
+def test_instrument():
+    res = run_campaign(random_feedstock, 2, seed=0, workers=1, instrument=True)
+    np.testing.assert_array_equal(res.stats['nfev'], res.nfev)
+    assert np.all(res.stats['t_total'] > 0)
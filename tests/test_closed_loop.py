@@ -0,0 +1,69 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import closed_loop
+from closed_loop import pi_loop, pi_loop_odeint, pi_sweep, doublet
+from pid import tuning
+
+KC, TAUI = 4.61730615181, 0.913444964569                            # IMC tuning of PI_controller.ipynb
+X0 = [0.87725294608097, 324.475443431599]
+
+
+@pytest.fixture(scope='module')
+def notebook():
+    t, sp = doublet()
+    return t, sp, pi_loop_odeint(t, sp, X0, KC, TAUI)
+
+
+## PERSISTENT INTEGRATOR AGAINST THE ODEINT LOOP.
+def test_matches_odeint_loop(notebook):
+    t, sp, ref = notebook
+    res = pi_loop(t, sp, X0, KC, TAUI)
+    np.testing.assert_allclose(res.y[1], ref.y[1], atol=1e-3)
+    np.testing.assert_allclose(res.y[0], ref.y[0], atol=1e-5)
+    np.testing.assert_allclose(res.u, ref.u, atol=1e-2)
+    np.testing.assert_allclose(res.op, ref.op, atol=1e-2)
+    np.testing.assert_allclose(res.ie, ref.ie, atol=1e-4)
+    assert res.nsteps > 0
+
+def test_tolerance_converges(notebook):
+    t, sp, _ = notebook
+    ref = pi_loop(t, sp, X0, KC, TAUI, rtol=1e-12, atol=1e-12).y
+    errors = [np.max(np.abs(pi_loop(t, sp, X0, KC, TAUI, rtol=tol, atol=tol).y - ref)) for tol in [1e-4, 1e-8]]
+    assert errors[1] < errors[0] / 10
+
+def test_sweep_matches_single_loops(notebook):
+    t, sp, _ = notebook
+    tun = tuning([KC, 2.0, 8.0], [TAUI, 0.5, 2.0], 0.0, 250.0, 350.0, bias=300.0, bumpless=True, n=3)
+    sweep = pi_sweep(t, sp, X0, tun)
+    assert np.all(sweep.status == 0)
+    for m in range(3):
+        single = pi_loop(t, sp, X0, tun['Kc'][m], tun['tauI'][m], op_lo=250.0, op_hi=350.0, bias=300.0,
+                         bumpless=True)
+        np.testing.assert_array_equal(sweep.y[m], single.y)
+        np.testing.assert_array_equal(sweep.u[m], single.u)
+
+
+## FAILURES.
+def test_nan_state_raises(notebook):
+    t, sp, _ = notebook
+    with pytest.raises(RuntimeError):
+        pi_loop(t, sp, [np.nan, X0[1]], KC, TAUI)
+
+def test_sweep_reports_failures(notebook):
+    t, sp, _ = notebook
+    sweep = pi_sweep(t[:20], sp[:20], [np.nan, X0[1]], tuning(KC, TAUI, 0.0, 250.0, 350.0, n=2))
+    assert np.all(sweep.status == -1)
+    assert np.all(np.isnan(sweep.y[:, :, 1:]))
+
+def test_step_budget():
+    x = np.array(X0)
+    h, accepted, rejected, status = closed_loop.dopri_advance(x, 0.0, 1e6, 1e-3, 300.0, 350.0, 1.0, 1e-8, 1e-8,
+                                                              np.empty((7, 2)))
+    assert status == -2 and accepted + rejected == closed_loop.MAX_STEPS
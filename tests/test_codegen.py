@@ -0,0 +1,55 @@
+import os
+import sys
+import copy
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from yeast_fermentation import Reactor, YEAST, with_acetate, compile_network
+from yeast_fermentation.codegen import check_jacobian
+
+
+def states(reactor, n=20, seed=0):
+    '''Random states around the initial values, away from the max(0, .) kinks'''
+    rng = np.random.default_rng(seed)
+    return reactor.initial_values() * rng.uniform(0.5, 1.5, (n, reactor.n_states))
+
+
+## GENERATED CODE AGAINST THE KINETICS CORE.
+@pytest.mark.parametrize('mode', ['batch', 'fedbatch', 'continuous'])
+def test_generated_matches_core(tmp_path, mode):
+    net = compile_network(YEAST, directory=str(tmp_path))
+    core, generated = Reactor(mode), Reactor(mode, network=net)
+    for x in states(core):
+        args = core.args(x)
+        np.testing.assert_allclose(generated.rhs(0.0, x, *args), core.rhs(0.0, x, *args), rtol=1e-12, atol=1e-15)
+        np.testing.assert_allclose(generated.jac(0.0, x, *args), core.jac(0.0, x, *args), rtol=1e-12, atol=1e-15)
+
+@pytest.mark.parametrize('mode', ['batch', 'fedbatch'])
+def test_acetate_jacobian(tmp_path, mode):
+    net = compile_network(with_acetate(), directory=str(tmp_path))
+    for x in states(Reactor(mode, network=net), n=5):
+        assert check_jacobian(net, x, mode) < 1e-6
+
+
+## INVALID NETWORKS.
+def _broken(edit):
+    network = copy.deepcopy(YEAST)
+    edit(network)
+    return network
+
+@pytest.mark.parametrize('edit', [
+    lambda n: n['reactions'][2].update(rate=[]),
+    lambda n: n['not_fed'].append('Biomas'),
+    lambda n: n['reactions'][0]['stoichiometry'].update(Lactate=1),
+    lambda n: n['reactions'][0]['rate'].append(('hill', 'Glucose', 'KiGlu')),
+    lambda n: n['reactions'][0]['rate'].append(('inhibition', 'Glucose')),
+    lambda n: n['reactions'][4]['rate'].append(('inhibition', 'Ethanol', 'KiEtOH')),
+])
+def test_invalid_network(tmp_path, edit):
+    with pytest.raises(ValueError):
+        compile_network(_broken(edit), directory=str(tmp_path))
+    assert os.listdir(tmp_path) == []                               # Nothing written
@@ -0,0 +1,82 @@
+import os
+import sys
+import multiprocessing
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import dataset
+from dataset import generate, load, initial, parameter, final, below, maximum, product_yield, _chunk_file
+from campaign import run_campaign, variable_growth
+
+FEATURES = {'Glucose0': initial('Glucose'), 'numaxG': parameter('numaxG'), 'titre': final('Ethanol'),
+            'depleted': below('Furfural', 0.0005), 'peak': maximum('Biomass'), 'yield': product_yield()}
+OPTIONS = dict(sampler=variable_growth, n_rows=10, features=FEATURES, chunk_size=4, seed=3)
+
+
+@pytest.fixture(scope='module')
+def reference(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('dataset'))
+    res = generate(path, workers=1, **OPTIONS)
+    return path, res, load(path, as_frame=False)
+
+
+## FEATURES.
+def test_features_match_campaign(reference):
+    _, _, data = reference
+    camp = run_campaign(variable_growth, 10, seed=3, workers=1)
+    np.testing.assert_array_equal(data['run'], np.arange(10))
+    np.testing.assert_array_equal(data['status'], camp.status)
+    np.testing.assert_array_equal(data['Glucose0'], camp.init[:, 0])
+    np.testing.assert_array_equal(data['numaxG'], camp.par['numaxG'])
+    np.testing.assert_array_equal(data['titre'], camp.y[:, 6, -1])
+    np.testing.assert_array_equal(data['depleted'], camp.y[:, 2, -1] < 0.0005)
+    np.testing.assert_array_equal(data['peak'], camp.y[:, 7].max(axis=1))
+
+def test_product_yield_in_batch():
+    init = np.array([[40.0, 20.0, 0, 0, 0, 0, 1.0, 1.0, 1.0]])
+    Y = np.zeros((1, 9, 2))
+    Y[0, :, -1] = [10.0, 10.0, 0, 0, 0, 0, 21.0, 2.0, 1.0]           # No feed: V = V0
+    assert product_yield()(None, Y, init, None)[0] == pytest.approx(20.0 / 40.0)
+
+
+## CHUNKED PIPELINE.
+def test_chunks(reference):
+    path, res, _ = reference
+    assert (res.n_chunks, res.done, res.skipped) == (3, 3, 0)
+    assert all(os.path.exists(_chunk_file(path, c)) for c in range(3))
+    frame = load(path, columns=['run', 'titre'])
+    assert list(frame.columns) == ['run', 'titre'] and len(frame) == 10
+
+def test_resume_runs_only_missing_chunks(reference, tmp_path, monkeypatch):
+    path, _, data = reference
+    path = str(tmp_path)
+    generate(path, workers=1, **OPTIONS)
+    os.remove(_chunk_file(path, 1))                                 # An interrupted run: one chunk missing
+    assert len(load(path)) == 6
+    res = generate(path, workers=1, **OPTIONS)
+    assert (res.done, res.skipped) == (1, 2)
+    again = load(path, as_frame=False)
+    for name in data:
+        np.testing.assert_array_equal(again[name], data[name])
+    monkeypatch.setattr(dataset, '_make_chunk', lambda *args: pytest.fail('rewrote a complete chunk'))
+    assert generate(path, workers=1, **OPTIONS).skipped == 3
+
+def test_chunking_and_workers_do_not_change_rows(reference, tmp_path):
+    _, _, data = reference
+    generate(str(tmp_path / 'one'), workers=1, **dict(OPTIONS, chunk_size=10))
+    generate(str(tmp_path / 'two'), workers=2, mp_context=multiprocessing.get_context('spawn'), **OPTIONS)
+    for other in (load(str(tmp_path / 'one'), as_frame=False), load(str(tmp_path / 'two'), as_frame=False)):
+        for name in data:
+            np.testing.assert_array_equal(other[name], data[name])
+
+def test_configuration_mismatch(reference):
+    path, _, _ = reference
+    with pytest.raises(ValueError):
+        generate(path, workers=1, **dict(OPTIONS, seed=4))
+    with pytest.raises(ValueError):
+        generate(path, workers=1, **dict(OPTIONS, features={'titre': final('Ethanol')}))
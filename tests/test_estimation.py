@@ -0,0 +1,51 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import estimation
+
+TRUTH = {'numaxG': 1.9, 'KSPG': 0.8}
+BOUNDS = {'numaxG': (0.5, 3.8), 'KSPG': (0.4, 1.6)}
+
+
+@pytest.fixture(scope='module')
+def experiments():
+    return estimation.synthetic_experiments(3, TRUTH, seed=2)
+
+
+## RECOVERY OF THE TRUE PARAMETERS.
+def test_fit_recovers_truth(experiments):
+    res = estimation.fit(experiments, BOUNDS, n_starts=2, workers=1, seed=1)
+    assert res.names == list(BOUNDS)
+    truth = np.array(list(TRUTH.values()))
+    assert np.all(np.abs(res.x - truth) < 3*res.stderr)
+    assert np.all((res.ci[:, 0] < truth) & (truth < res.ci[:, 1]))
+    assert res.cost == res.start_costs.min()
+    assert np.all(np.isfinite(res.fun))
+
+def test_noise_free_fit_is_exact():
+    experiments = estimation.synthetic_experiments(2, TRUTH, noise=1e-9, seed=3)
+    res = estimation.fit(experiments, BOUNDS, n_starts=1, workers=1)
+    np.testing.assert_allclose(res.x, list(TRUTH.values()), rtol=1e-4)
+
+
+## FAILED SIMULATIONS.
+def test_failed_start_is_dropped(experiments, monkeypatch):
+    simulate = estimation._simulate
+    def failing(experiments, names, thetas, *args):
+        Y, status = simulate(experiments, names, thetas, *args)
+        bad = thetas[:, 0] > 3.0                                    # The solver 'fails' above numaxG = 3
+        status[bad] = -1
+        Y[bad] = np.nan
+        return Y, status
+    monkeypatch.setattr(estimation, '_simulate', failing)
+    res = estimation.fit(experiments, BOUNDS, n_starts=3, workers=1, seed=1)
+    assert np.any(res.start_costs >= 1e12)                          # The start at numaxG > 3
+    np.testing.assert_allclose(res.x, list(TRUTH.values()), rtol=0.05)
+    assert np.all(np.isfinite(res.stderr))
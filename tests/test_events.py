@@ -0,0 +1,85 @@
+import os
+import sys
+import numpy as np
+import pytest
+from numba import njit
+from scipy.integrate import solve_ivp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from events import simulate_events
+from model import initial_values, feed_values, stoichiometry, balances
+from parameters import nominal
+
+X0 = initial_values()
+T_EVAL = np.linspace(0, 50, 101)
+
+
+@njit
+def feed_day3(t, V):
+    if t<2 or V>=2:
+        return 0.0
+    return 0.1+0.005*(t-2)
+
+@njit
+def fedbatch_day3(t, x, par, Cfeed, st):
+    '''The DAY3 feed switches inside the right hand side'''
+    dxdt = np.empty(9, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    balances(x, par, Cfeed, st, feed_day3(t, x[8]), rates, dxdt)
+    return dxdt
+
+
+@pytest.fixture(scope='module')
+def truth():
+    return simulate_events(X0, t_eval=T_EVAL, rtol=1e-12, atol=1e-12)
+
+
+## FEED SWITCHES.
+def test_matches_day3_feed(truth):
+    par = nominal()
+    ref = solve_ivp(fedbatch_day3, (0, 50), X0, method='LSODA', args=(par, feed_values(X0), stoichiometry(par)),
+                    t_eval=T_EVAL, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(truth.y, ref.y, rtol=1e-4, atol=1e-5)
+    sol = simulate_events(X0, t_eval=T_EVAL, rtol=1e-6, atol=1e-6)
+    assert np.max(np.abs(sol.y - truth.y)) < 1e-3
+
+def test_events_recorded(truth):
+    assert truth.success and truth.status == 0 and truth.stop is None
+    np.testing.assert_array_equal(truth.t, T_EVAL)
+    assert truth.t_events['feed_start'].tolist() == [2.0]
+    (t_full,) = truth.t_events['volume']
+    assert 2.0 < t_full < 50.0
+    assert truth.y_events['volume'][0, 8] == pytest.approx(2.0)
+    assert truth.segments == 3                                      # Batch, feed, full
+    after = T_EVAL > t_full
+    np.testing.assert_allclose(truth.y[8, after], 2.0)              # No feed past V_max
+
+def test_feed_stop():
+    sol = simulate_events(X0, feed_stop=5.0, rtol=1e-8, atol=1e-8)
+    assert sol.t_events['feed_stop'].tolist() == [5.0]
+    assert len(sol.t_events['volume']) == 0
+    V = sol.y[8]
+    assert V[-1] == pytest.approx(V[np.searchsorted(sol.t, 5.0)])
+    assert V[-1] > X0[8]
+
+
+## STOP CONDITIONS.
+def test_depletion_stops():
+    sol = simulate_events(X0, S_min=0.5)
+    assert sol.stop == 'depletion' and sol.status == 1 and sol.success
+    assert sol.t[-1] < 50.0 and sol.t_events['depletion'][0] == sol.t[-1]
+    assert sol.y[0, -1] + sol.y[1, -1] == pytest.approx(0.5)
+
+def test_ethanol_stops():
+    sol = simulate_events(X0, EtOH_target=10.0)
+    assert sol.stop == 'ethanol'
+    assert sol.y[6, -1] == pytest.approx(10.0)
+
+def test_stop_at_start():
+    sol = simulate_events(X0, EtOH_target=X0[6])
+    assert sol.stop == 'ethanol' and sol.segments == 0
+    assert sol.t.tolist() == [0.0]
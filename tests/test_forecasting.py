@@ -0,0 +1,53 @@
+import os
+import sys
+import numpy as np
+import pytest
+from statsmodels.tsa.arima.model import ARIMA
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.join(ROOT, 'DAY4') not in sys.path:
+    sys.path.insert(0, os.path.join(ROOT, 'DAY4'))
+
+from forecasting import RollingARIMA, walk_forward, walk_forward_refit
+
+ORDER, SEASONAL = (1, 0, 0), (0, 0, 0, 0)
+
+
+@pytest.fixture
+def series():
+    '''AR(1) series around 10'''
+    rng = np.random.default_rng(0)
+    x = np.zeros(90)
+    for n in range(1, len(x)):
+        x[n] = 0.7*x[n-1] + rng.normal()
+    return 10 + x
+
+
+## ROLLING UPDATES.
+def test_updates_are_filtering_with_fixed_parameters(series):
+    test, predictions, rmse, forecaster = walk_forward(series, ORDER, SEASONAL)
+    assert forecaster.refits == 1
+    size = len(series) - len(test)
+    params = ARIMA(series[:size], order=ORDER, seasonal_order=SEASONAL).fit(method='statespace').params
+    full = ARIMA(series, order=ORDER, seasonal_order=SEASONAL).filter(params)
+    np.testing.assert_allclose(predictions, full.predict()[size:], rtol=1e-8)
+    assert rmse == pytest.approx(np.sqrt(np.mean((test - predictions)**2)))
+
+def test_refit_every_step_matches_reference(series):
+    _, predictions, rmse, forecaster = walk_forward(series, ORDER, SEASONAL, refit_every=1)
+    _, reference, rmse_ref = walk_forward_refit(series, ORDER, SEASONAL)
+    assert forecaster.refits == len(reference) + 1
+    np.testing.assert_allclose(predictions, reference, rtol=1e-3)
+    assert rmse == pytest.approx(rmse_ref, rel=1e-3)
+
+
+## DRIFT DETECTION.
+def test_drift_triggers_refit(series):
+    forecaster = RollingARIMA(ORDER, SEASONAL, drift_window=4).fit(series[:60])
+    for obs in series[60:70]:
+        forecaster.update(obs)
+    assert forecaster.refits == 1
+    for obs in series[70:80] + 50:                                  # Level shift
+        forecaster.update(obs)
+    assert forecaster.refits > 1
+    assert len(forecaster.history) == 80
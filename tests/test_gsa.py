@@ -0,0 +1,69 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import gsa
+
+RANGES = {'a': (0.0, 1.0), 'b': (1.0, 3.0), 'c': (-1.0, 1.0)}
+SLOPES = np.array([[1.0, 2.0, 0.0],                                 # Three outputs, linear in (a, b, c)
+                   [0.5, 0.0, 1.0],
+                   [0.0, 0.0, 3.0]])
+
+
+def linear(names, values, pool=None, **kwargs):
+    '''Stands in for the simulations: outputs linear in the parameters'''
+    return values @ SLOPES
+
+
+## SOBOL INDICES OF A LINEAR MODEL.
+def test_sobol_linear(monkeypatch):
+    monkeypatch.setattr(gsa, 'evaluate', linear)
+    names, S, ST, n = gsa.sobol(RANGES, tol=0.0, batch=256, max_samples=2048, verbose=False)
+    width = np.array([hi - lo for lo, hi in RANGES.values()])
+    var = (SLOPES * width[:, None])**2 / 12
+    expected = var / var.sum(axis=0)                                # Additive: S = ST
+    assert names == list(RANGES) and n == 2048
+    np.testing.assert_allclose(S, expected, atol=0.05)
+    np.testing.assert_allclose(ST, expected, atol=0.05)
+
+
+## MORRIS ELEMENTARY EFFECTS.
+def test_morris_linear(monkeypatch):
+    monkeypatch.setattr(gsa, 'evaluate', linear)
+    for n, mu_star, sigma in gsa.iter_morris(RANGES, r=6, batch=4):
+        pass
+    width = np.array([hi - lo for lo, hi in RANGES.values()])
+    assert n == 6
+    np.testing.assert_allclose(mu_star, np.abs(SLOPES) * width[:, None], rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(sigma, 0.0, atol=1e-9)
+
+def test_morris_trajectories():
+    traj = gsa.morris_trajectories(5, 3, levels=4, seed=1)
+    assert traj.shape == (5, 4, 3)
+    assert np.all((traj >= 0) & (traj <= 1))
+    steps = np.abs(np.diff(traj, axis=1))
+    assert np.all(np.sum(steps > 0, axis=2) == 1)                   # One factor at a time
+    np.testing.assert_allclose(steps.max(axis=2), 2/3)
+
+def test_morris_all_failed(monkeypatch):
+    monkeypatch.setattr(gsa, 'evaluate', lambda names, values, **kwargs: np.full((len(values), 3), np.nan))
+    with pytest.warns(RuntimeWarning):
+        results = list(gsa.iter_morris(RANGES, r=4, batch=2))
+    for n, mu_star, sigma in results:
+        assert n == 0 and np.all(np.isnan(mu_star)) and np.all(np.isnan(sigma))
+
+
+## SIMULATION BACKEND.
+def test_evaluate():
+    ranges = gsa.bdg_ranges()
+    values = gsa._scale(np.array([[0.0]*6, [1.0]*6]), ranges)
+    f = gsa.evaluate(list(ranges), values, block=1)
+    assert f.shape == (2, len(gsa.OUTPUTS))
+    assert np.all(np.isfinite(f))
+    assert f[1, 0] != f[0, 0]
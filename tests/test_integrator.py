@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from integrator import solve_ensemble, member
+from model import initial_values, simulate
+from parameters import parameter_table
+from schedules import constant, piecewise_linear, stack, simulate_schedule
+
+T_EVAL = np.linspace(0, 50, 51)
+
+
+@pytest.fixture(scope='module')
+def ensemble():
+    '''Six members with random feedstocks and growth rates'''
+    rng = np.random.default_rng(1)
+    X0 = np.tile(initial_values(), (6, 1))
+    X0[:, 0] = rng.normal(39.7, 5.0, 6)
+    X0[:, 1] = rng.normal(23.5, 3.0, 6)
+    Cfeed = X0.copy()
+    Cfeed[:, 7] = 0
+    P = parameter_table(6)
+    P['numaxG'] *= rng.uniform(0.9, 1.1, 6)
+    return X0, P, Cfeed
+
+
+## ODE23S AGAINST LSODA.
+def test_matches_lsoda(ensemble):
+    X0, P, Cfeed = ensemble
+    res = solve_ensemble(X0, P, Cfeed, T_EVAL, rtol=1e-7, atol=1e-9)
+    assert res.success
+    for n in range(len(X0)):
+        ref = simulate(X0[n], par=P[n], Cfeed=Cfeed[n], t_eval=T_EVAL, rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(res.y[n], ref.y, rtol=1e-4, atol=1e-4)
+
+def test_tolerance_converges(ensemble):
+    X0, P, Cfeed = ensemble
+    ref = simulate(X0[0], par=P[0], Cfeed=Cfeed[0], t_eval=T_EVAL, rtol=1e-11, atol=1e-11).y
+    errors = [np.max(np.abs(solve_ensemble(X0[:1], P[:1], Cfeed[:1], T_EVAL, rtol=tol, atol=tol).y[0] - ref))
+              for tol in [1e-4, 1e-6, 1e-8]]
+    assert errors[2] < errors[1] < errors[0]
+
+def test_members_are_independent(ensemble):
+    X0, P, Cfeed = ensemble
+    full = solve_ensemble(X0, P, Cfeed, T_EVAL)
+    single = solve_ensemble(X0[2:3], P[2:3], Cfeed[2:3], T_EVAL)
+    np.testing.assert_array_equal(full.y[2], single.y[0])
+    assert full.nsteps[2] == single.nsteps[0]
+
+
+## SCHEDULES.
+def test_schedules_match_simulate_schedule(ensemble):
+    X0, P, Cfeed = ensemble
+    tables = [constant(0.2), piecewise_linear([0, 10, 20], [0.0, 0.3, 0.1])]
+    res = solve_ensemble(X0[:2], P[:2], Cfeed[:2], T_EVAL, rtol=1e-7, atol=1e-9, schedules=stack(tables))
+    for n, table in enumerate(tables):
+        ref = simulate_schedule(X0[n], table, par=P[n], Cfeed=Cfeed[n], t_eval=T_EVAL, rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(res.y[n], ref.y, rtol=1e-4, atol=1e-4)
+
+
+## FAILURES.
+def test_step_budget(ensemble):
+    X0, P, Cfeed = ensemble
+    res = solve_ensemble(X0[:2], P[:2], Cfeed[:2], T_EVAL, max_sweeps=5)
+    assert not res.success
+    assert np.all(res.status == -2)
+    assert not member(res, 0).success
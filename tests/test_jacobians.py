@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import model
+from yeast_fermentation import Reactor
+
+
+def states(x0, n=10, seed=0):
+    '''Random states around x0, away from the max(0, .) kinks'''
+    rng = np.random.default_rng(seed)
+    return x0 * rng.uniform(0.5, 1.5, (n, len(x0)))
+
+
+## DAY5 FED-BATCH (model.fedbatch_jac).
+@pytest.mark.parametrize('x', states(model.initial_values()))
+def test_fedbatch_jacobian(x):
+    assert model.check_jacobian(x) < 1e-6
+
+def test_fedbatch_jacobian_later_time():
+    assert model.check_jacobian(t=10.0) < 1e-6
+
+
+## DAY1 BATCH (reactor.batch_jac, behind model.kinetics_jac).
+@pytest.mark.parametrize('mode', ['batch', 'fedbatch', 'continuous'])
+def test_reactor_jacobian(mode):
+    reactor = Reactor(mode)
+    for x in states(reactor.initial_values(), n=5):
+        args = reactor.args(x)
+        J = reactor.jac(0.0, x, *args)
+        J_fd = np.zeros_like(J)
+        for k in range(len(x)):
+            h = 1e-6 * max(1.0, abs(x[k]))
+            xp, xm = x.copy(), x.copy()
+            xp[k] += h
+            xm[k] -= h
+            J_fd[:, k] = (reactor.rhs(0.0, xp, *args) - reactor.rhs(0.0, xm, *args)) / (2*h)
+        assert np.max(np.abs(J - J_fd)) / np.max(np.abs(J)) < 1e-6
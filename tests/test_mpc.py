@@ -0,0 +1,61 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from mpc import FeedMPC
+from model import initial_values, feed_values
+from schedules import simulate_schedule, constant
+
+X0 = initial_values()
+CFEED = feed_values(X0)
+
+
+## SHOOTING.
+def test_shoot_matches_simulate_schedule():
+    mpc = FeedMPC(Cfeed=CFEED, horizon=2, dt=1.0)
+    S = np.vstack([X0, X0 * 1.1])
+    U = np.array([0.1, 0.3])
+    Phi = mpc.shoot(S, U)
+    for k in range(2):
+        ref = simulate_schedule(S[k], constant(U[k]), Cfeed=CFEED, tspan=(0, 1.0), rtol=1e-10, atol=1e-12)
+        np.testing.assert_allclose(Phi[k], ref.y[:, -1], rtol=1e-6, atol=1e-8)
+    assert mpc.sims == 2
+
+def test_sensitivities():
+    mpc = FeedMPC(Cfeed=CFEED, horizon=1, dt=1.0)
+    u, h = 0.1, 1e-3
+    Phi, dPhi_ds, dPhi_du = mpc.shoot(X0[None], np.array([u]), sensitivities=True)
+    assert dPhi_ds.shape == (1, 9, 9) and dPhi_du.shape == (1, 9)
+    np.testing.assert_array_equal(Phi[0], mpc.shoot(X0[None], np.array([u]))[0])
+    central = (mpc.shoot(X0[None], np.array([u + h])) - mpc.shoot(X0[None], np.array([u - h])))[0] / (2*h)
+    np.testing.assert_allclose(dPhi_du[0], central, rtol=1e-3, atol=1e-6)
+    np.testing.assert_allclose(dPhi_ds[0, 8, 8], 1.0)                # The volume only depends on the feed
+
+
+## RECEDING HORIZON.
+def test_solution_respects_bounds():
+    V_max = X0[8] + 0.1
+    mpc = FeedMPC(Cfeed=CFEED, horizon=3, dt=1.0, V_max=V_max, move_weight=0.0)
+    res = mpc.solve(X0)
+    assert res.success
+    assert res.u.shape == (3,) and res.s.shape == (3, 9)
+    assert np.all(res.u >= 0.0) and np.all(res.u <= mpc.F_max)
+    assert np.all(res.s[:, 8] <= V_max + 1e-6)
+    assert res.s[-1, 8] == pytest.approx(V_max, abs=1e-6)          # More feed is more ethanol: V_max is active
+    plant = simulate_schedule(X0, constant(res.u[0]), Cfeed=CFEED, tspan=(0, 1.0))
+    np.testing.assert_allclose(plant.y[:, -1], res.s[0], rtol=1e-4, atol=1e-6)
+
+def test_step_warm_starts():
+    mpc = FeedMPC(Cfeed=CFEED, horizon=2, dt=1.0)
+    x = X0
+    for _ in range(2):
+        u = mpc.step(x)
+        assert 0.0 <= u <= mpc.F_max and mpc.u_prev == u
+        x = simulate_schedule(x, constant(u), Cfeed=CFEED, tspan=(0, mpc.dt)).y[:, -1]
+    assert mpc.w is not None and len(mpc.w) == 2 + 2*9
@@ -0,0 +1,60 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.join(ROOT, 'DAY4') not in sys.path:
+    sys.path.insert(0, os.path.join(ROOT, 'DAY4'))
+
+import order_search
+from order_search import FitCache, grid, differencing, fit_order, search, rebuild
+
+
+@pytest.fixture(scope='module')
+def ar2():
+    '''AR(2) series, 300 samples'''
+    rng = np.random.default_rng(3)
+    x = np.zeros(300)
+    for n in range(2, len(x)):
+        x[n] = 0.6*x[n-1] - 0.3*x[n-2] + rng.normal()
+    return x
+
+
+## CANDIDATES AND DIFFERENCING.
+def test_grid():
+    candidates = grid(p=range(3), d=(1,), q=range(2), P=(0, 1), D=(1,), Q=(0,), s=12)
+    assert len(candidates) == 12
+    assert ((2, 1, 1), (1, 1, 0, 12)) in candidates
+    assert all(so[3] == 12 for _, so in candidates)
+
+def test_differencing(ar2):
+    rng = np.random.default_rng(4)
+    assert differencing(ar2) == (0, 0)
+    assert differencing(np.cumsum(rng.normal(size=300)))[0] == 1
+    t = np.arange(240)
+    seasonal = 10*np.sin(2*np.pi*t/12) + rng.normal(size=240)
+    assert differencing(seasonal, 12)[1] == 1
+
+
+## FITS.
+def test_fit_order_records_errors(ar2):
+    fit = fit_order(ar2, (1, 0, 0), (1, 0, 0, 1))                   # Invalid seasonal period
+    assert fit['aic'] == np.inf and not fit['converged'] and 'ValueError' in fit['error']
+
+def test_search_finds_order_and_caches(ar2, tmp_path, monkeypatch):
+    cache = FitCache(str(tmp_path))
+    candidates = grid(p=range(3), d=(0,), q=range(2))
+    fits = search(ar2, candidates, workers=1, cache=cache, d=0, D=0)
+    assert tuple(fits[0]['order']) == (2, 0, 0)
+    assert [f['aic'] for f in fits] == sorted(f['aic'] for f in fits)
+    results = rebuild(ar2, fits[0])
+    assert results.aic == pytest.approx(fits[0]['aic'])
+    # A repeated search, even from a new process (empty memory tier), fits nothing
+    monkeypatch.setattr(order_search, 'fit_order', lambda *args: pytest.fail('refitted a cached candidate'))
+    again = search(ar2, candidates, workers=1, cache=FitCache(str(tmp_path)), d=0, D=0)
+    assert again == fits
+
+def test_search_without_candidates(ar2, tmp_path):
+    with pytest.raises(ValueError):
+        search(ar2, grid(d=(1,)), workers=1, cache=FitCache(str(tmp_path)), d=0, D=0)
@@ -0,0 +1,49 @@
+import os
+import sys
+import pickle
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from yeast_fermentation.parameters import (Parameters, names, dtype, values, to_record, as_record, nominal,
+                                           parameter_table, jit_parameters)
+
+
+## RECORDS.
+def test_nominal_matches_parameter_sets():
+    for parameter_set in ('DAY1', 'DAY3'):
+        rec = nominal(parameter_set)
+        assert isinstance(rec, np.void) and rec.dtype == dtype
+        assert {name: rec[name] for name in names} == values(parameter_set)
+    with pytest.raises(ValueError):
+        nominal('DAY2')
+
+def test_as_record():
+    rec = nominal()
+    assert as_record(rec) is rec                                    # Records pass through
+    assert as_record(parameter_table(3)[1]) == rec
+    assert as_record(np.array(rec)) == rec                          # 0-d array
+    assert as_record(Parameters()) == rec
+    par = Parameters('DAY1')
+    par.numaxG = 1.5
+    assert as_record(par)['numaxG'] == 1.5 and to_record(par).shape == ()
+
+def test_parameter_table_overrides():
+    P = parameter_table(4, {'numaxG': np.arange(4.0), 'YPSg': 0.3})
+    assert P['numaxG'].tolist() == [0.0, 1.0, 2.0, 3.0] and np.all(P['YPSg'] == 0.3)
+    assert P[0]['numaxX'] == nominal()['numaxX']
+
+
+## JITCLASS.
+def test_jit_parameters():
+    cls = jit_parameters('DAY1')
+    assert jit_parameters('DAY1') is cls                            # Built once per parameter set
+    par = cls()
+    assert as_record(par) == nominal('DAY1')
+    assert as_record(jit_parameters()()) == nominal()
+    init = cls.class_type.methods['__init__']
+    assert init.__module__ == 'yeast_fermentation.parameters'   # Generated code in a real module
+    pickle.dumps(cls.class_type.jit_methods['__init__'])
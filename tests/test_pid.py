@@ -0,0 +1,117 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from pid import tuning, state, pid_update, pid_step, pid_rhs, bumpless_shift
+
+K, TAU, DT = 2.0, 5.0, 0.1                                          # First order process dx/dt = (K*u - x)/tau
+A = np.exp(-DT/TAU)
+
+
+def notebook_loop(sp, Kc, tauI, tauD, op_lo, op_hi, x0=0.0):
+    '''The controller loop of PI_controller.ipynb on the first order process'''
+    n = len(sp)
+    op = np.zeros(n); pv = np.zeros(n); e = np.zeros(n); ie = np.zeros(n); dpv = np.zeros(n)
+    pv[0] = x0
+    for i in range(n-1):
+        e[i] = sp[i] - pv[i]
+        if i >= 1:
+            dpv[i] = (pv[i]-pv[i-1])/DT
+            ie[i] = ie[i-1] + e[i] * DT
+        op[i] = op[0] + Kc*e[i] + Kc/tauI*ie[i] - Kc*tauD*dpv[i]
+        if op[i] > op_hi:
+            op[i] = op_hi
+            ie[i] = ie[i] - e[i] * DT
+        if op[i] < op_lo:
+            op[i] = op_lo
+            ie[i] = ie[i] - e[i] * DT
+        pv[i+1] = A*pv[i] + (1-A)*K*op[i]
+    return op[:-1], pv
+
+def run(tun, sp, x0=0.0):
+    st = state()
+    x = x0
+    ops, pvs = [], [x]
+    for s in sp[:-1]:
+        op = pid_update(tun, st, s, x, DT)
+        x = A*x + (1-A)*K*op
+        ops.append(op)
+        pvs.append(x)
+    return np.array(ops), np.array(pvs)
+
+
+## DISCRETE CONTROLLER.
+@pytest.mark.parametrize('tauD', [0.0, 0.2])
+def test_matches_notebook_loop(tauD):
+    sp = np.r_[np.full(100, 1.0), np.full(100, 3.0), np.full(100, -1.0)]
+    tun = tuning(1.5, 2.0, tauD, -2.0, 2.0, bias=np.nan)
+    op, pv = run(tun, sp)
+    op_ref, pv_ref = notebook_loop(sp, 1.5, 2.0, tauD, -2.0, 2.0)
+    np.testing.assert_allclose(op, op_ref, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(pv, pv_ref, rtol=1e-12, atol=1e-12)
+    assert op.max() == 2.0 and op.min() == -2.0                     # Both limits were hit
+
+def test_anti_windup():
+    tun = tuning(1.0, 1.0, 0.0, -1.0, 1.0)
+    st = state()
+    assert pid_update(tun, st, 10.0, 0.0, DT) == 1.0
+    ie = st['ie']
+    for _ in range(50):
+        assert pid_update(tun, st, 10.0, 0.0, DT) == 1.0
+    assert st['ie'] == ie                                           # Saturated steps are not integrated
+    assert pid_update(tun, st, 0.0, 0.0, DT) == ie                  # Back at once: no windup to unwind
+
+def test_bumpless_set_point_change():
+    st = state()
+    tun = tuning(2.0, 1.0, bumpless=True)
+    before = pid_update(tun, st, 1.0, 1.0, DT)
+    after = pid_update(tun, st, 2.0, 1.0, DT)
+    assert after - before == pytest.approx(2.0*1.0*DT/1.0)          # Integral action only: Kc*e*dt/tauI
+    st = state()
+    tun = tuning(2.0, 1.0)
+    pid_update(tun, st, 1.0, 1.0, DT)
+    assert pid_update(tun, st, 2.0, 1.0, DT) - before == pytest.approx(2.0 + 0.2)
+
+def test_no_derivative_kick():
+    st = state()
+    tun = tuning(1.0, np.inf, 5.0)
+    pid_update(tun, st, 0.0, 0.0, DT)
+    assert pid_update(tun, st, 1.0, 0.0, DT) == 1.0                 # Proportional only
+    assert pid_update(tun, st, 1.0, 0.1, DT) == pytest.approx(0.9 - 5.0)
+
+def test_step_matches_update():
+    n = 20
+    rng = np.random.default_rng(0)
+    tun = tuning(rng.uniform(0.5, 2, n), rng.uniform(1, 5, n), 0.1, -1.0, 1.0, bumpless=True, n=n)
+    st, st_ref = state(n), state(n)
+    op = np.zeros(n)
+    x = np.zeros(n)
+    for k in range(30):
+        sp = np.full(n, 0.5 if k < 15 else -0.5)
+        pid_step(tun, st, sp, x, DT, op)
+        ref = [pid_update(tun[i], st_ref[i], sp[i], x[i], DT) for i in range(n)]
+        np.testing.assert_array_equal(op, ref)
+        x = A*x + (1-A)*K*op
+    np.testing.assert_array_equal(st, st_ref)
+
+
+## CONTINUOUS CONTROLLER.
+def test_rhs():
+    tun = tuning(2.0, 4.0, 1.0, -5.0, 5.0, bias=1.0)
+    assert pid_rhs(tun, 2.0, 1.0, 0.5, 0.1) == pytest.approx((1.0 + 2.0*(0.5 + 0.5 - 0.1), 0.5))
+    assert pid_rhs(tun, 40.0, 1.0, 0.5, 0.0) == (5.0, 0.0)          # Saturated: no further integration
+    assert pid_rhs(tun, 40.0, 1.0, 2.0, 0.0) == (5.0, -1.0)         # ... unless the error drives it back
+    assert pid_rhs(tun, -40.0, 1.0, 2.0, 0.0) == (-5.0, 0.0)
+
+def test_rhs_nan_bias():
+    assert pid_rhs(tuning(2.0, bias=np.nan), 0.0, 1.0, 0.0, 0.0) == pid_rhs(tuning(2.0), 0.0, 1.0, 0.0, 0.0)
+
+def test_bumpless_shift():
+    assert bumpless_shift(tuning(2.0, 4.0, bumpless=True), 1.0, 0.0, 0.5) == -1.0
+    assert bumpless_shift(tuning(2.0, 4.0), 1.0, 0.0, 0.5) == 1.0
+    assert bumpless_shift(tuning(2.0, bumpless=True), 1.0, 0.0, 0.5) == 1.0
@@ -0,0 +1,78 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from schedules import (constant, piecewise_constant, piecewise_linear, spline, exponential, concatenate, stack,
+                       piece, feed_rate, next_switch, simulate_schedule)
+from model import initial_values, simulate
+
+X0 = initial_values()
+
+
+## FEED RATES.
+def test_constant_and_piecewise_constant():
+    assert feed_rate(constant(0.2), 0.0) == 0.2
+    assert feed_rate(constant(0.2, t_start=5.0), 4.9) == 0.0        # F = 0 before the first row
+    table = piecewise_constant([0, 10, 25], [0.1, 0.3, 0.0])
+    assert [feed_rate(table, t) for t in (0.0, 9.9, 10.0, 24.0, 40.0)] == [0.1, 0.1, 0.3, 0.3, 0.0]
+    assert [piece(table, t) for t in (-1.0, 0.0, 10.0, 1e9)] == [-1, 0, 1, 2]
+    assert next_switch(table, 10.0) == 25.0 and next_switch(table, 30.0) == np.inf
+
+def test_piecewise_linear():
+    table = piecewise_linear([0, 20, 50], [0.0, 0.4, 0.1])
+    for t in (0.0, 5.0, 20.0, 35.0, 50.0):
+        assert feed_rate(table, t) == pytest.approx(np.interp(t, [0, 20, 50], [0.0, 0.4, 0.1]))
+    assert feed_rate(table, 80.0) == pytest.approx(0.1)
+
+def test_spline():
+    from scipy.interpolate import CubicSpline
+    times, rates = np.linspace(0, 50, 6), np.array([0.1, 0.3, 0.2, 0.4, 0.3, 0.2])
+    table, ref = spline(times, rates), CubicSpline(times, rates)
+    for t in np.linspace(0, 50, 23):
+        assert feed_rate(table, t) == pytest.approx(max(ref(t), 0.0))
+    assert feed_rate(table, 60.0) == pytest.approx(0.2)
+
+def test_exponential():
+    table = exponential(0.02, 0.1, t_start=2.0, t_stop=40.0, F_max=0.3)
+    assert feed_rate(table, 1.0) == 0.0
+    assert feed_rate(table, 12.0) == pytest.approx(0.02*np.exp(1.0))
+    assert feed_rate(table, 39.0) == 0.3                            # Capped
+    assert feed_rate(table, 40.0) == 0.0                            # Stopped
+
+def test_negative_rates_clipped():
+    assert feed_rate(piecewise_linear([0, 10], [0.1, -0.1]), 8.0) == 0.0
+
+def test_concatenate_and_stack():
+    table = concatenate(constant(0.3, 10.0), constant(0.1))
+    assert table[:, 0].tolist() == [0.0, 10.0]
+    assert feed_rate(table, 5.0) == 0.1 and feed_rate(table, 15.0) == 0.3
+    S = stack([table, constant(0.2)])
+    assert S.shape == (2, 2, 6) and S[1, 1, 0] == np.inf
+    assert feed_rate(S[1], 100.0) == 0.2                            # Padding rows are never reached
+
+
+## SIMULATION.
+def test_constant_matches_model_feed():
+    t_eval = np.linspace(0, 50, 51)
+    ref = simulate(X0, t_eval=t_eval)
+    sol = simulate_schedule(X0, constant(0.2), t_eval=t_eval)
+    assert sol.success
+    np.testing.assert_array_equal(sol.t, t_eval)
+    np.testing.assert_allclose(sol.y, ref.y, rtol=1e-5, atol=1e-6)
+
+def test_switches_are_restarts():
+    t_eval = np.linspace(0, 50, 51)
+    table = piecewise_constant([0, 10, 25], [0.0, 0.3, 0.0])
+    sol = simulate_schedule(X0, table, t_eval=t_eval)
+    np.testing.assert_array_equal(sol.t, t_eval)
+    V = sol.y[8]
+    np.testing.assert_allclose(V[:11], X0[8])                       # No feed before t = 10
+    np.testing.assert_allclose(V[25:], X0[8] + 0.3*15, rtol=1e-8)   # Exactly 15 h of feed
+    dense = simulate_schedule(X0, table)
+    assert dense.t[0] == 0.0 and dense.t[-1] == 50.0 and np.all(np.diff(dense.t) > 0)
@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.join(ROOT, 'DAY4') not in sys.path:
+    sys.path.insert(0, os.path.join(ROOT, 'DAY4'))
+
+from smoothing import exp_smooth, exp_smooth_fast, ExpSmoother
+
+
+@pytest.fixture
+def X():
+    '''Two noisy sinusoids, as in data_smoothng.ipynb (shorter)'''
+    rng = np.random.default_rng(2)
+    time = np.arange(0, 0.5, 1/8E3)
+    return np.column_stack((0.5*rng.normal(size=len(time)) + np.sin(2*np.pi*50*time + np.pi/9),
+                            0.5*rng.normal(size=len(time)) + np.sin(2*np.pi*10*time + np.pi/3)))
+
+
+## VECTORIZED AND STREAMING AGAINST THE LOOP.
+@pytest.mark.parametrize('alpha', [0.01, 0.1, 0.5, 1.0])
+def test_fast_matches_loop(X, alpha):
+    np.testing.assert_array_equal(exp_smooth_fast(X, alpha), exp_smooth(X, alpha))
+
+def test_one_dimensional(X):
+    np.testing.assert_array_equal(exp_smooth_fast(X[:, 1], 0.1), exp_smooth(X, 0.1)[:, 1])
+
+@pytest.mark.parametrize('n_chunks', [1, 7, 400])
+def test_streaming_matches_loop(X, n_chunks):
+    smoother = ExpSmoother(0.1)
+    S = np.concatenate([smoother.update(chunk) for chunk in np.array_split(X, n_chunks)])
+    np.testing.assert_array_equal(S, exp_smooth(X, 0.1))
+
+def test_streaming_empty_chunk_and_reset(X):
+    smoother = ExpSmoother(0.1)
+    first = smoother.update(X[:10])
+    assert smoother.update(X[:0]).shape == (0, 2)
+    smoother.reset()
+    np.testing.assert_array_equal(smoother.update(X[:10]), first)
+
+def test_empty():
+    assert exp_smooth_fast(np.empty((0, 2)), 0.1).shape == (0, 2)
@@ -0,0 +1,64 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from store import TrajectoryStore, open_store, NO_SEED
+from campaign import run_campaign, random_feedstock
+from parameters import parameter_table
+
+
+## WRITE AND READ BACK.
+def test_round_trip(tmp_path):
+    t = np.linspace(0, 1, 5)
+    store = TrajectoryStore.create(str(tmp_path), t, 4, dtype=np.float64)
+    y = np.arange(9*2*5, dtype=np.float64).reshape(9, 2, 5)
+    P = parameter_table(2)
+    store.write(slice(1, 3), y, init=y[:, :, 0].T, par=P, seed=[11, 12], status=[0, -1], nfev=[5, 6])
+    store.write(0, y[:, 0], seed=None)
+    store.flush()
+    del store
+
+    store = open_store(str(tmp_path))
+    assert len(store) == 4
+    np.testing.assert_array_equal(store.t, t)
+    np.testing.assert_array_equal(store.y[:, 1:3], y)
+    np.testing.assert_array_equal(store.member(2).y, y[:, 1])
+    np.testing.assert_array_equal(store.state('Ethanol')[1:3], y[6])
+    np.testing.assert_array_equal(store.written(), [0, 1, 2])
+    assert np.all(np.isnan(store.y[:, 3]))
+    assert list(store.runs['seed']) == [NO_SEED, 11, 12, 0]
+    assert list(store.runs['run'][:3]) == [0, 1, 2]
+    assert list(store.runs['status'][1:3]) == [0, -1]
+    np.testing.assert_array_equal(store.runs['par'][1:3], P)
+    with pytest.raises(ValueError):
+        store.y[0, 0, 0] = 1.0                                      # Read-only by default
+
+
+## CAMPAIGN STORES.
+@pytest.fixture(scope='module')
+def campaign_store(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('campaign'))
+    run_campaign(random_feedstock, 6, seed=5, workers=1, chunksize=4, store=path)
+    return path
+
+def test_campaign_store_matches_memory(campaign_store):
+    res = run_campaign(random_feedstock, 6, seed=5, workers=1)
+    stored = open_store(campaign_store)
+    np.testing.assert_allclose(stored.y.transpose(1, 0, 2), res.y, rtol=1e-6)   # float32
+    np.testing.assert_array_equal(stored.runs['init'], res.init)
+    np.testing.assert_array_equal(stored.runs['nfev'], res.nfev)
+    np.testing.assert_array_equal(stored.written(), np.arange(6))
+
+def test_seed_reproduces_run(campaign_store):
+    stored = open_store(campaign_store)
+    seeds = stored.runs['seed']
+    assert len(np.unique(seeds)) == 6 and np.all(seeds >= 0)
+    for k in range(6):
+        init, _ = random_feedstock(np.random.default_rng(seeds[k]))
+        np.testing.assert_array_equal(init, stored.runs['init'][k])
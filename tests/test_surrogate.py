@@ -0,0 +1,89 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'DAY5')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from surrogate import Surrogate, multi_indices, legendre_basis
+from campaign import run_campaign, variable_feedstock
+from model import simulate, feed_values
+from parameters import parameter_table
+
+
+@pytest.fixture(scope='module')
+def campaigns():
+    return run_campaign(variable_feedstock, 60, seed=1, workers=1), run_campaign(variable_feedstock, 10, seed=2, workers=1)
+
+@pytest.fixture(scope='module')
+def surrogate(campaigns):
+    train, _ = campaigns
+    return Surrogate(degree=2).fit(train.t, train.init, train.par, train.y)
+
+
+## BASIS.
+def test_multi_indices():
+    alpha = multi_indices(3, 2)
+    assert alpha.shape == (10, 3)
+    assert alpha.sum(axis=1).max() == 2 and len(np.unique(alpha, axis=0)) == 10
+    assert multi_indices(2, 0).tolist() == [[0, 0]]
+
+def test_legendre_basis_is_orthonormal():
+    z, w = np.polynomial.legendre.leggauss(10)
+    Z = np.column_stack([np.repeat(z, 10), np.tile(z, 10)])
+    W = np.outer(w, w).ravel() / 4                                  # Uniform measure on [-1, 1]^2
+    A = legendre_basis(Z, multi_indices(2, 4))
+    np.testing.assert_allclose(A.T @ (W[:, None] * A), np.eye(A.shape[1]), atol=1e-12)
+
+
+## FIT AND PREDICTION.
+def test_exact_for_polynomials():
+    rng = np.random.default_rng(0)
+    n = 30
+    init = np.tile(np.arange(1.0, 10.0), (n, 1))
+    init[:, 0] = rng.uniform(30, 40, n)
+    P = parameter_table(n)
+    P['numaxG'] *= rng.uniform(0.9, 1.1, n)
+    t = np.linspace(0, 1, 5)
+    g, m = init[:, 0], P['numaxG']
+    Y = np.broadcast_to((1 + g*m + g**2)[:, None, None] * (1 + t), (n, 9, 5)).copy()
+    sur = Surrogate(degree=2).fit(t, init, P, Y)
+    assert sur.inputs == ['Glucose', 'numaxG']
+    pred = sur.predict(init[:5], P[:5], fallback=False)
+    np.testing.assert_allclose(pred.y, Y[:5], rtol=1e-10)
+    assert np.all(pred.err < 1e-8 * np.abs(Y).max())
+
+def test_predicts_held_out_runs(campaigns, surrogate):
+    _, test = campaigns
+    assert surrogate.n_train == 60 and len(surrogate.alpha) == 28       # 6 varying inputs, degree 2
+    pred = surrogate.predict(test.init, test.par)
+    rmse = np.sqrt(np.mean((pred.y - test.y)**2, axis=0))
+    assert np.all(rmse <= 5 * surrogate.err + 1e-3)
+    assert np.max(np.abs(pred.y[:, 6] - test.y[:, 6])) < 0.05 * np.max(test.y[:, 6])     # Ethanol within 5%
+    final, err = surrogate.predict_final(test.init, test.par)
+    np.testing.assert_allclose(final, pred.y[:, :, -1], rtol=1e-10, atol=1e-10)
+    np.testing.assert_array_equal(err, surrogate.err[:, -1])
+
+def test_fallback_outside_training_box(campaigns, surrogate):
+    _, test = campaigns
+    init = test.init[:2].copy()
+    init[0, 0] = 60.0                                               # Glucose far above the training range
+    assert surrogate.inside(init, test.par[:2]).tolist() == [False, True]
+    pred = surrogate.predict(init, test.par[:2])
+    ref = simulate(init[0], par=test.par[0], Cfeed=feed_values(init[0]), t_eval=surrogate.t)
+    np.testing.assert_array_equal(pred.y[0], ref.y)
+    np.testing.assert_allclose(pred.y[1], surrogate.predict(init[1:], test.par[1:2]).y[0], rtol=1e-12)
+    final, _ = surrogate.predict_final(init, test.par[:2])
+    np.testing.assert_array_equal(final[0], ref.y[:, -1])
+
+def test_skips_failed_runs_and_needs_enough_runs(campaigns):
+    train, _ = campaigns
+    Y = train.y.copy()
+    Y[0, 3, 5] = np.nan
+    sur = Surrogate(degree=1).fit(train.t, train.init, train.par, Y)
+    assert sur.n_train == 59
+    with pytest.raises(ValueError):
+        Surrogate(degree=3).fit(train.t, train.init, train.par, train.y)    # 84 terms for 60 runs
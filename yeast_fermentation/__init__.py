@@ -0,0 +1,15 @@
+'''Kinetic model of the yeast fermentation of lignocellulosic hydrolysate
+(glucose, xylose and inhibitors), in batch, fed-batch and continuous mode.
+Variants of the reaction network are compiled from data, see network.py.
+
+    from yeast_fermentation import Reactor
+    sol = Reactor('fedbatch').simulate(t_eval=np.linspace(0, 50, 101))
+'''
+from .parameters import (names, units, descriptions, PARAMETER_SETS, Parameters, dtype, to_record, as_record,
+                         nominal, parameter_table, jit_parameters)
+from .kinetics import (COMPONENTS, STATES, initial_values, feed_values, reference_rates, stoichiometry,
+                       reaction_rates, reactions, balances, rate_jacobian, reactions_jac, balances_jac,
+                       parameter_jacobian)
+from .reactor import MODES, Reactor, feed_profile, feed_rate
+from .network import YEAST, with_acetate
+from .codegen import TERMS, generate, compile_network, CompiledNetwork
@@ -0,0 +1,401 @@
+import os
+import sys
+import hashlib
+import importlib.util
+import numpy as np
+from .parameters import names as base_names, values, dtype as base_dtype
+from .jitcache import check_stamp
+from .reactor import Reactor
+
+
+## RATE LAW AND INHIBITION TERMS.
+# Each kind of factor (see network.py) is a function that emits the code of
+# its value and returns it with the derivatives w.r.t. its species:
+#     term(e, *args) -> (value, [(k, derivative expression), ...])
+# args are the local names of the species (first n_species) and parameters,
+# k the position of the species in args. Clamped factors max(0, .) have zero
+# derivative where the clamp is active, as in kinetics.rate_jacobian.
+
+def _haldane(e, S, X, numax, KS, Ki):
+    sq = e(f'{S}**2')
+    den = e(f'{KS} + {S} + ({sq})/{Ki}')
+    raw = e(f'{numax} * {S} * {X} / {den}')
+    return e(f'max(0.0, {raw})'), [(0, f'{numax} * {X} * ({KS} - ({sq})/{Ki}) / {den}**2 if {raw} > 0.0 else 0.0'),
+                                   (1, f'{numax} * {S} / {den} if {raw} > 0.0 else 0.0')]
+
+def _monod(e, S, X, numax, KS):
+    den = e(f'{KS} + {S}')
+    raw = e(f'{numax} * {S} * {X} / {den}')
+    return e(f'max(0.0, {raw})'), [(0, f'{numax} * {X} * {KS} / {den}**2 if {raw} > 0.0 else 0.0'),
+                                   (1, f'{numax} * {S} / {den} if {raw} > 0.0 else 0.0')]
+
+def _inhibition(e, c, Ki):
+    value = e(f'max(0.0, 1 / (1 + {c}/{Ki}))')
+    return value, [(0, f'-{value}**2 / {Ki}')]
+
+def _repression(e, c, Ki):
+    value = e(f'1 / (1 + {c}/{Ki})')
+    return value, [(0, f'-{value}**2 / {Ki}')]
+
+def _power(e, c, Pm, gamma):
+    q = e(f'{c}/{Pm}')
+    raw = e(f'1-{q}**{gamma}')
+    return e(f'max(0.0, {raw})'), [(0, f'-{gamma}/{Pm} * {q}**({gamma}-1) if {raw} > 0.0 and {c} > 0.0 else 0.0')]
+
+def _mass_action(e, S, k):
+    return e(f'{k} * {S}'), [(0, k)]
+
+def _dissociation(e, A, B, k, pH, pKa):
+    K = e(f'10.0**({pH} - {pKa})')
+    return e(f'{k} * ({A}*{K} - {B})'), [(0, f'{k} * {K}'), (1, f'-{k}')]
+
+# kind: (term, number of species arguments, number of parameter arguments)
+TERMS = {'haldane': (_haldane, 2, 3),
+         'monod': (_monod, 2, 2),
+         'inhibition': (_inhibition, 1, 1),
+         'repression': (_repression, 1, 1),
+         'power': (_power, 1, 2),
+         'mass_action': (_mass_action, 1, 1),
+         'dissociation': (_dissociation, 2, 3)}
+
+
+## CODE GENERATION.
+# The network is turned into straight-line numba code: the states and
+# parameters are read once into locals, every distinct subexpression is
+# computed once (the emitter hash-conses the expressions, so that a factor
+# shared by two reactions or the denominator of a rate law and its
+# derivative are not recomputed), and the stoichiometry is inlined: zero
+# coefficients produce no code at all, -1 and 1 no multiplication. The
+# Jacobian is generated from the sparsity pattern of the network, only the
+# entries that can be nonzero are written; the product of the other factors
+# of a rate, for the derivative of one factor, is a prefix product times a
+# suffix product.
+
+class _Emitter():
+    '''Collects the assignments of a function body, one local per distinct expression'''
+    def __init__(self):
+        self.lines, self.locals = [], {}
+
+    def __call__(self, expr, name=None):
+        if expr.isidentifier() or expr in self.locals.values():
+            return expr
+        if expr not in self.locals:
+            self.locals[expr] = name or f'c{len(self.locals)}'
+            self.lines.append(f'    {self.locals[expr]} = {expr}')
+        return self.locals[expr]
+
+def _check(network):
+    species = [name for name, _ in network['species']]
+    known = set(base_names) | set(network.get('parameters', {}))
+    for name in network.get('not_fed', []):
+        if name not in species:
+            raise ValueError(f'not_fed: unknown species {name!r}')
+    for reaction in network['reactions']:
+        if not reaction['rate']:
+            raise ValueError(f"{reaction['name']}: the rate needs at least one factor")
+        for name, coefficient in reaction['stoichiometry'].items():
+            if name not in species:
+                raise ValueError(f"{reaction['name']}: unknown species {name!r}")
+            if isinstance(coefficient, str) and coefficient not in known:
+                raise ValueError(f"{reaction['name']}: unknown parameter {coefficient!r}")
+        for factor in reaction['rate']:
+            if factor[0] not in TERMS:
+                raise ValueError(f"{reaction['name']}: unknown factor {factor[0]!r}, expected one of {list(TERMS)}")
+            _, n_species, n_par = TERMS[factor[0]]
+            if len(factor) != 1 + n_species + n_par:
+                raise ValueError(f"{reaction['name']}: {factor[0]} takes {n_species} species and {n_par} parameters")
+            for name in factor[1:1+n_species]:
+                if name not in species:
+                    raise ValueError(f"{reaction['name']}: unknown species {name!r}")
+            for name in factor[1+n_species:]:
+                if name not in known:
+                    raise ValueError(f"{reaction['name']}: unknown parameter {name!r}")
+    return species
+
+def _scaled(coefficient, term, e):
+    '''Code of coefficient * term, or None for a zero coefficient'''
+    if isinstance(coefficient, str):
+        return f'{e(f"par.{coefficient}", f"p_{coefficient}")} * {term}'
+    if coefficient == 0:
+        return None
+    if coefficient == 1:
+        return term
+    if coefficient == -1:
+        return f'-{term}'
+    return f'{float(coefficient)!r} * {term}'
+
+def _body(network, species, jac):
+    '''Body of reactions (jac=False: dxdt[i] = ...) or reactions_jac (J[i, k] = ...)'''
+    e = _Emitter()
+    index = {name: i for i, name in enumerate(species)}
+    state = lambda name: e(f'x[{index[name]}]', f'x{index[name]}')
+    rates, drdx = [], []
+    for j, reaction in enumerate(network['reactions']):
+        factors, derivatives = [], []
+        for factor in reaction['rate']:
+            term, n_species, _ = TERMS[factor[0]]
+            args = [state(name) for name in factor[1:1+n_species]]
+            args += [e(f'par.{name}', f'p_{name}') for name in factor[1+n_species:]]
+            value, deriv = term(e, *args)
+            factors.append(value)
+            derivatives.append([(factor[1+k], expr) for k, expr in deriv])
+        if not jac:
+            rates.append(e(' * '.join(factors), f'r{j}'))
+            continue
+        prefix, suffix = [None], [None]                             # Products of the factors before/after l
+        for value in factors:
+            prefix.append(e(f'{prefix[-1]} * {value}') if prefix[-1] else value)
+        for value in reversed(factors):
+            suffix.insert(0, e(f'{value} * {suffix[0]}') if suffix[0] else value)
+        rates.append(prefix[-1])
+        dr = {}
+        for l, deriv in enumerate(derivatives):
+            others = [p for p in (prefix[l], suffix[l+1]) if p]
+            others = e(' * '.join(others)) if others else None
+            for name, expr in deriv:
+                d = e(expr)
+                dr.setdefault(name, []).append(e(f'{d} * {others}') if others else d)
+        drdx.append({name: e(' + '.join(terms)) for name, terms in dr.items()})
+
+    out = []
+    for i, name in enumerate(species):
+        if not jac:
+            terms = [_scaled(reaction['stoichiometry'].get(name, 0), rates[j], e)
+                     for j, reaction in enumerate(network['reactions'])]
+            terms = [term for term in terms if term is not None]
+            out.append(f'    dxdt[{i}] = {" + ".join(terms) if terms else "0.0"}')
+            continue
+        for k, other in enumerate(species):
+            terms = [_scaled(reaction['stoichiometry'].get(name, 0), drdx[j][other], e)
+                     for j, reaction in enumerate(network['reactions']) if other in drdx[j]]
+            terms = [term for term in terms if term is not None]
+            if terms:
+                out.append(f'    J[{i}, {k}] = {" + ".join(terms)}')
+    return e.lines + out, rates
+
+_MODES = '''
+@njit(cache=True)
+def batch(t, x, par, st):
+    dxdt = np.empty({n}, dtype=np.float64)
+    reactions(x, par, dxdt)
+    return dxdt
+
+@njit(cache=True)
+def batch_jac(t, x, par, st):
+    J = np.zeros(({n}, {n}), dtype=np.float64)
+    reactions_jac(x, par, J)
+    return J
+
+@njit(cache=True)
+def fedbatch(t, x, par, Cfeed, st, feed):
+    dxdt = np.empty({n1}, dtype=np.float64)
+    reactions(x, par, dxdt)
+    F = feed_rate(feed, t, x[{n}])
+    D = F / x[{n}]
+    for i in range({n}):
+        dxdt[i] += D * (Cfeed[i] - x[i])
+    dxdt[{n}] = F
+    return dxdt
+
+@njit(cache=True)
+def fedbatch_jac(t, x, par, Cfeed, st, feed):
+    J = np.zeros(({n1}, {n1}), dtype=np.float64)
+    reactions_jac(x, par, J)
+    F = feed_rate(feed, t, x[{n}])
+    for i in range({n}):
+        J[i, i] -= F / x[{n}]
+        J[i, {n}] = -F * (Cfeed[i] - x[i]) / x[{n}]**2
+    return J
+
+@njit(cache=True)
+def continuous(t, x, par, Cfeed, st, feed):
+    dxdt = fedbatch(t, x, par, Cfeed, st, feed)
+    dxdt[{n}] = 0.0
+    return dxdt
+
+@njit(cache=True)
+def continuous_jac(t, x, par, Cfeed, st, feed):
+    return fedbatch_jac(t, x, par, Cfeed, st, feed)
+'''
+
+def generate(network):
+    '''Python source of the compiled kinetics of network: stoichiometry(par),
+    reaction_rates(x, par, rates), reactions(x, par, dxdt), reactions_jac(x,
+    par, J), and the operating modes with the signatures of reactor.MODES
+    (st is accepted but not used, the stoichiometry is inlined).'''
+    species = _check(network)
+    n, n_reactions = len(species), len(network['reactions'])
+    rhs, rates = _body(network, species, jac=False)
+    jac, _ = _body(network, species, jac=True)
+    e = _Emitter()
+    stoich = []
+    for j, reaction in enumerate(network['reactions']):
+        for name, coefficient in reaction['stoichiometry'].items():
+            value = e(f'par.{coefficient}', f'p_{coefficient}') if isinstance(coefficient, str) else float(coefficient)
+            if isinstance(coefficient, str) or coefficient != 0:
+                stoich.append(f'    st[{j}, {species.index(name)}] = {value}')
+    lines = [f"# Generated by yeast_fermentation.codegen from the network {network['name']!r}. Do not edit.",
+             'import numpy as np',
+             'from numba import njit',
+             'from yeast_fermentation.reactor import feed_rate',
+             '',
+             f'SPECIES = {species!r}',
+             f"REACTIONS = {[reaction['name'] for reaction in network['reactions']]!r}",
+             '',
+             '@njit(cache=True)',
+             'def stoichiometry(par):',
+             f'    st = np.zeros(({n_reactions}, {n}), dtype=np.float64)',
+             *e.lines, *stoich,
+             '    return st',
+             '',
+             '@njit(cache=True)',
+             'def reaction_rates(x, par, rates):',
+             *[line for line in rhs if not line.startswith('    dxdt[')],
+             *[f'    rates[{j}] = {r}' for j, r in enumerate(rates)],
+             '',
+             '@njit(cache=True)',
+             'def reactions(x, par, dxdt):',
+             *rhs,
+             '',
+             '@njit(cache=True)',
+             'def reactions_jac(x, par, J):',
+             *jac,
+             _MODES.format(n=n, n1=n+1)]
+    return '\n'.join(lines)
+
+
+## COMPILED NETWORKS.
+# The generated source is written to a module file named after the network
+# and the hash of the source, in GENERATED, and imported from there: numba
+# caches the compiled functions of a file on disk, so a network is compiled
+# once, and a changed network gets a new file.
+GENERATED = os.environ.get('YEAST_FERMENTATION_GENERATED', os.path.join(os.path.dirname(__file__), '__generated__'))
+
+class CompiledNetwork():
+    '''A network compiled by compile_network. modes has the (rhs, jac,
+    n_states) of each operating mode, like reactor.MODES; pass it to
+    Reactor(mode, network=...) to simulate it.'''
+    def __init__(self, network, source, path, module):
+        self.network, self.source, self.path, self.module = network, source, path, module
+        self.species = module.SPECIES
+        self.stoichiometry = module.stoichiometry
+        self.reaction_rates = module.reaction_rates
+        self.modes = {'batch': (module.batch, module.batch_jac, len(self.species)),
+                      'fedbatch': (module.fedbatch, module.fedbatch_jac, len(self.species) + 1),
+                      'continuous': (module.continuous, module.continuous_jac, len(self.species) + 1)}
+        self.names = base_names + list(network.get('parameters', {}))
+        if self.names == base_names:
+            self.dtype = base_dtype                                 # numba types a record of this very dtype fastest
+        else:
+            self.dtype = np.dtype([(name, np.float64) for name in self.names])
+
+    def nominal(self, parameter_set='DAY3'):
+        '''Record of a parameter set and the parameters of the network'''
+        table = dict(values(parameter_set), **self.network.get('parameters', {}))
+        return np.array(tuple(table[name] for name in self.names), dtype=self.dtype)[()]
+
+    def as_record(self, par):
+        '''par as a record of dtype; missing network parameters take their default values'''
+        if isinstance(par, np.ndarray):
+            par = par[()]
+        if isinstance(par, np.void) and par.dtype == self.dtype:
+            return par
+        rec = np.array(self.nominal())
+        for name in self.names:
+            if isinstance(par, np.void) and name in par.dtype.names:
+                rec[name] = par[name]
+            elif hasattr(par, name):
+                rec[name] = getattr(par, name)
+        return rec[()]
+
+    def initial_values(self, mode='fedbatch'):
+        init = [value for _, value in self.network['species']]
+        if mode != 'batch':
+            init.append(0.7)                                        # V0 (L), as kinetics.initial_values
+        return np.array(init, dtype=np.float64)
+
+    def feed_values(self, ini):
+        '''Feed composition: the initial concentrations without the not_fed species'''
+        feed = np.array(ini, dtype=np.float64)
+        for name in self.network.get('not_fed', []):
+            feed[self.species.index(name)] = 0
+        return feed
+
+def compile_network(network, directory=None):
+    '''Generate, write and import the compiled kinetics of network'''
+    source = generate(network)
+    directory = GENERATED if directory is None else directory
+    name = f"{network['name']}_{hashlib.sha256(source.encode()).hexdigest()[:12]}"
+    path = os.path.join(directory, name + '.py')
+    code = compile(source, path, 'exec')                            # Never write a module that can not be imported
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(source)
+        os.replace(tmp, path)                                       # Atomic: concurrent processes see a whole file
+    module_name = f'yeast_fermentation.__generated__.{name}'
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        exec(code, vars(module))
+        inlined = [os.path.join(os.path.dirname(__file__), 'reactor.py')]                 # feed_rate
+        check_stamp(module.fedbatch.stats.cache_path, name, inlined, [name])
+        sys.modules[module_name] = module
+    return CompiledNetwork(network, source, path, sys.modules[module_name])
+
+def check_jacobian(network, x=None, mode='fedbatch', eps=1e-6):
+    '''Compare the Jacobian of a compiled network with central finite
+    differences of its right-hand side at x (default: initial_values).
+    Returns the largest deviation relative to the largest Jacobian entry.
+    Use states away from the max(0, .) kinks.'''
+    reactor = Reactor(mode, network=network)
+    x = reactor.initial_values() if x is None else np.asarray(x, dtype=np.float64)
+    args = reactor.args(x)
+    J = reactor.jac(0.0, x, *args)
+    J_fd = np.zeros_like(J)
+    for k in range(len(x)):
+        h = eps * max(1.0, abs(x[k]))
+        xp, xm = x.copy(), x.copy()
+        xp[k] += h
+        xm[k] -= h
+        J_fd[:, k] = (reactor.rhs(0.0, xp, *args) - reactor.rhs(0.0, xm, *args)) / (2*h)
+    return np.max(np.abs(J - J_fd)) / np.max(np.abs(J))
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    from numba import njit
+    from yeast_fermentation.network import YEAST, with_acetate
+    from yeast_fermentation.reactor import feed_profile
+
+    @njit
+    def repeat(f, n, x, par, Cfeed, st, feed):                      # Times f without the Python call overhead
+        s = 0.0
+        for i in range(n):
+            s += f(0.0, x, par, Cfeed, st, feed).ravel()[0]
+        return s
+
+    tic = perf_counter()
+    net = compile_network(YEAST)
+    print(f'generated {len(net.source.splitlines())} lines in {net.path} ({perf_counter()-tic:.2f} s)')
+    hand, generated = Reactor('fedbatch'), Reactor('fedbatch', network=net)
+    x = hand.initial_values()
+    args = hand.args()
+    for label, reactor in [('kinetics core', hand), ('generated', generated)]:
+        for name, f in [('rhs', reactor.rhs), ('jac', reactor.jac)]:
+            n = 200000
+            repeat(f, 10, x, *args)
+            tic = perf_counter()
+            repeat(f, n, x, *args)
+            print(f'{label:14s} fedbatch {name} {1e9*(perf_counter()-tic)/n:6.0f} ns/call')
+    print('max |difference| of the right-hand sides:', np.max(np.abs(hand.rhs(0.0, x, *args) - generated.rhs(0.0, x, *args))))
+    print('max |difference| of the Jacobians:       ', np.max(np.abs(hand.jac(0.0, x, *args) - generated.jac(0.0, x, *args))))
+
+    feed = feed_profile(0.1, 0.005, t_start=2.0, V_max=2.0)
+    acetate = compile_network(with_acetate())
+    print(f'with Ac-: Jacobian vs finite differences, max relative deviation {check_jacobian(acetate):.1e}')
+    for label, reactor in [('base', Reactor('fedbatch', feed=feed, network=net)),
+                           ('with Ac-', Reactor('fedbatch', feed=feed, network=acetate))]:
+        sol = reactor.simulate(t_eval=[50])
+        print(f'{label:9s} ethanol at 50 h {sol.y[6, -1]:6.2f} g/L, HAc {sol.y[5, -1]:5.2f} g/L, {sol.nfev} RHS calls')
@@ -0,0 +1,57 @@
+import os
+import glob
+import hashlib
+
+
+## STALE COMPILED CODE.
+# numba (cache=True) checks the timestamp of the file a cached function is
+# defined in, but not of the files whose functions it calls: these are
+# inlined at compilation, so after an edit of yeast_fermentation/kinetics.py
+# the cached reactor modes (and the DAY5 model) would still compute with the
+# old kinetics. check_stamp guards a cache directory with a stamp file, the
+# hash of all the sources its functions depend on; when the hash changes,
+# the cached functions are removed at import, before any is loaded, and
+# compiled again at their first call.
+
+def source_hash(files):
+    '''SHA-256 of the contents of files'''
+    h = hashlib.sha256()
+    for file in files:
+        with open(file, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def remove_cached(path, stems):
+    '''Remove the cached functions of the source files stems (names without .py) from path'''
+    removed = 0
+    for stem in stems:
+        for file in glob.glob(os.path.join(path, f'{stem}.*.nb[ic]')):
+            try:
+                os.remove(file)
+                removed += 1
+            except FileNotFoundError:                               # Removed by a concurrent process
+                pass
+    return removed
+
+def check_stamp(path, name, sources, stems):
+    '''Remove the cached functions of stems in the cache directory path if the
+    hash of sources differs from the stamp name stored there, and store the
+    new stamp. Returns the number of files removed.'''
+    digest = source_hash(sources)
+    stamp = os.path.join(path, name + '.stamp')
+    try:
+        with open(stamp) as f:
+            if f.read() == digest:
+                return 0
+    except OSError:
+        pass
+    removed = remove_cached(path, stems)
+    try:
+        os.makedirs(path, exist_ok=True)
+        tmp = f'{stamp}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(digest)
+        os.replace(tmp, stamp)
+    except OSError:                                                 # Read-only cache: check again next time
+        pass
+    return removed
@@ -0,0 +1,512 @@
+import numpy as np
+from numba import njit
+from .parameters import as_record
+
+
+## MODEL.
+#  The following 8 components are considered in the model (and the tank
+#  volume as 9th state in the fed-batch and continuous modes):
+#  0. Glucose
+#  1. Xylose
+#  2. Furfural
+#  3. Furfuryl alcohol
+#  4. 5-HMF
+#  5. HAc
+#  6. Ethanol
+#  7. Biomass
+#  8. Tank volume
+
+#  According to the kinetic model, the following chemical equations describe
+#  the system.
+
+#  1. Glucose  -----> Ethanol + Biomass
+#  2. Xylose   -----> Ethanol + Biomass
+#  3. Furfural -----> Furfuryl alcohol
+#  4. HMF      -----> Acetic acid
+#  5. HAc     <-----> Ac- [optional - not used here]
+#  6. HAc      -----> Biomass (maintenence)
+
+COMPONENTS = ['Glucose', 'Xylose', 'Furfural', 'Furfuryl alcohol', '5-HMF', 'Acetic acid', 'Ethanol', 'Biomass']
+STATES = COMPONENTS + ['Volume']
+
+def initial_values(mode='fedbatch'):
+    ## LIST OF INITIAL CONDITIONS.
+    # Name     Value     Index     Units
+    Glu0  =  39.7        # 1       g/L
+    Xyl0  =  23.5        # 2       g/L
+    Fur0  =  0.56        # 3       g/L
+    FA0   =  0.0         # 4       g/L
+    HMF0  =  0.2         # 5       g/L
+    HAc0  =  3.05        # 6       g/L
+    # Ac0   =  0.0001;    # 7       g/L
+    EtOH0 =  0.62        # 7       g/L
+    X0    =  1.75        # 8       g/L
+    V0    =  0.7         # 9       L (not a state in batch mode)
+
+    init = [Glu0, Xyl0, Fur0, FA0, HMF0, HAc0, EtOH0, X0]
+    if mode != 'batch':
+        init.append(V0)
+    return np.array(init, dtype=np.float64)
+
+def feed_values(ini):
+    '''Feed composition: the initial concentrations without biomass'''
+    feed = np.array(ini, dtype=np.float64)
+    feed[7] = 0             # Xf = 0 !
+    return feed
+
+
+## READABLE REFERENCE.
+def reference_rates(x, par):
+    '''Reaction rates (5) in plain Python, one phenomenon at a time. The
+    compiled reaction_rates below computes the same.'''
+    ## DEFINE INDIVIDUAL KINETICS AND INHIBITION TERMS.
+    # Ph stands for phenomena, and it includes all the phenomena considered in
+    # the model, including reaction, inhibition and equilibria. Each of the
+    # phenomena is implemented separately below, for clarity
+    # 1. GLUCOSE UPTAKE RATE.
+    # numaxG: max consumption rate of glucose           s^-1       [1]
+    # KSPG:   affinity constant glucose                 g/L        [1]
+    # KiPG:   inhibition constant glucose               g/L        [1]
+    Ph1 = par.numaxG * x[0] * x[7] / (par.KSPG + x[0] + (x[0]**2)/par.KiPG)
+    Ph1 = max(0,Ph1)
+    # 2. XYLOSE UPTAKE RATE.
+    # numaxX: max consumption rate of xylose            s^-1       [1]
+    # KSPX:   affinity constant xylose                  g/L        [1]
+    # KiPX:   inhibition constant xylose                g/L        [1]
+    Ph2 = par.numaxX * x[1] * x[7] / (par.KSPX + x[1] + (x[1]**2)/par.KiPX)
+    Ph2 = max(0,Ph2)
+
+    # 3. FURFURAL UPTAKE RATE.
+    # numaxFur: max uptake rate of furfural               s^-1       [2]
+    # KSFur:    affinity constant furfural                g/L        [2]
+    Ph3 = par.numaxFur * x[2] * x[7] / (par.KSFur + x[2])
+    Ph3 = max(0,Ph3)
+
+    # 4. FURFURAL CONVERSION INTO FURFURYL ALCOHOL.
+    # Y_FA_Fur:  yield coefficient FA/Fur                  gFA/gFur   [2]
+    # (the yield is in the stoichiometric matrix)
+
+    # 5. FURFURYL ALCOHOL INHIBITS GLUCOSE UPTAKE RATE.
+    # KiFAg:    inhibition constant of FA on Glu uptake   g/L        [2]
+    Ph5 = 1 / (1 + x[3]/par.KiFAg)
+    Ph5 = max(0,Ph5)
+
+    # 6. FURFURYL ALCOHOL INHIBITS XYLOSE UPTAKE RATE.
+    # KiFAx:    inhibition constant of FA on Xyl uptake   g/L        [2]
+    Ph6 = 1 / (1 + x[3]/par.KiFAx)
+    Ph6 = max(0,Ph6)
+
+    # 7. FURFURAL INHIBITS GLUCOSE UPTAKE RATE.
+    # KiFurg:   inhibition constant of Fur on Glu uptake  g/L        [2]
+    Ph7 = 1 / (1 + x[2]/par.KiFurg)
+    Ph7 = max(0,Ph7)
+
+    # 8. FURFURAL INHIBITS XYLOSE UPTAKE RATE.
+    # KiFurx:   inhibition constant of Fur on Xyl uptake  g/L        [2]
+    Ph8 = 1 / (1 + x[2]/par.KiFurx)
+    Ph8 = max(0,Ph8)
+
+    # 9. FURFURAL INHIBITS HMF UPTAKE RATE.
+    # KiFurHMF: inhibition constant of Fur on HMF         g/L        [2]
+    Ph9 = 1 / (1 + x[2]/par.KiFurHMF)
+    Ph9 = max(0,Ph9)
+
+    # 10. HMF INHIBITS GLUCOSE UPTAKE RATE.
+    # KiHMFg:   inhibition constant of HMF on Glu         g/L        [2]
+    Ph10 = 1 / (1 + x[4]/par.KiHMFg)
+    Ph10 = max(0,Ph10)
+
+    # 11. HMF INHIBITS XYLOSE UPTAKE RATE.
+    # KiHMFx:   inhibition constant of HMF on Xyl         g/L        [2]
+    Ph11 = 1 / (1 + x[4]/par.KiHMFx)
+    Ph11 = max(0,Ph11)
+
+    # 12. HMF UPTAKE RATE.
+    # numaxHMF: max uptake rate of HMF                    s^-1       [2]
+    # KSHMF:    affinity constant HMF                     g/L        [2]
+    Ph12 = par.numaxHMF * x[7] * x[4] / (par.KSHMF + x[4])
+    Ph12 = max(0,Ph12)
+
+    #  13. pH INFLUENCES THE PAIR HAc/Ac.
+    # pH = 5.5;              % pH is controlled
+    # pKa = 4.75;            % pKa of acetic acid.
+    # Ph13 = x(7,1) / x(6,1) * 1 / (1 + 10^(-pH)/10^(-pKa));
+    # Ph13 = max(0,Ph13);
+
+    # 14. HAc UPTAKE RATE.
+    # numaxHAc: max uptake rate of HAc                    s^-1       [2]
+    # KSHAc:    affinity constant HAc                     g/L        [2]
+    Ph14 = x[7] * x[5] * par.numaxHAc / (par.KSHAc + x[5])
+    Ph14 = max(0,Ph14)
+
+    #15. HMF CONVERSION INTO HAc
+    #Y_HAc_HMF = p(21);     % yield coefficient HAc/HMF                 gHAc/gHMF  [2], [3]
+    # (the yield is in the stoichiometric matrix)
+
+    # 16. HAc INHIBITS GLUCOSE UPTAKE RATE.
+    # KiHAcg:   inhibition constant of HAc on Glu         g/L        [2]
+    Ph16 = 1 / (1 + x[5]/par.KiHAcg)
+    Ph16 = max(0,Ph16)
+
+    # 17. HAc INHIBITS XYLOSE UPTAKE RATE.
+    # KiHAcx:   inhibition constant of HAc on Xyl         g/L         [2]
+    Ph17 = 1 / (1 + x[5]/par.KiHAcx)
+    Ph17 = max(0,Ph17)
+
+    #  18. PRODUCTION OF ETHANOL FORM GLUCOSE AND XYLOSE.
+    # YPSg:     yield ethanol-glucose                     gEtOH/gGlu [1]
+    # YPSx:     yield ethanol-xylose                      gEtOH/gGlu [1]
+    # (the yields are in the stoichiometric matrix)
+
+    # 19. ETHANOL INHIBITS THE UPTAKE OF GLUCOSE AND XYLOSE.
+    # PMPg:     inhibition constant for glucose           g/L        [1]
+    # gammaG:   exponent factor inhibition glucose        g/L        [1]
+    # PMPx:     inhibition constant for xylose            g/L        [1]
+    # gammaX:   exponent factor inhibition xylose         g/L        [1]
+    Ph19a = 1-(x[6]/par.PMPg)**par.gammaG
+    Ph19b = 1-(x[6]/par.PMPx)**par.gammaX
+    Ph19a = max(0,Ph19a)
+    Ph19b = max(0,Ph19b)
+
+    #  20. CELL GROWTH.
+    # mGlu:     maintenance constant from glucose         g/L        [1]
+    # mXyl:     maintenance constant from xylose          g/L        [1]
+    # YXSg:     yield X-Glu                               gX/gGlu    [1]
+    # YXSx:     yield X-Xyl                               gX/gXyl    [1]
+    # mumaxG:   max growth of X from Glu                  h-1        [1]
+    # mumaxX:   max frowth of X from Xyl                  h-1        [1]
+    # Ph20a = max(0,(Ph1 + mGlu*x(8,1))*YXSg);
+    # Ph20b = max(0,(Ph1 + mXyl*x(8,1))*YXSx);
+
+    # 21. CATABOLITE REPRESSION.
+    # KiGlu:    inhibition constant of Glu to Xyl         g/L        Unknown
+    Ph21 = 1 / (1 + x[0]/par.KiGlu)
+
+    # 22. ACETATE IS USED FOR MAINTENANCE.
+    # mHAc:     maintenance constant from HAc              g/L        Unknown
+    # YXSHAc:   yield acetate biomass                      g/L        Unknown
+    # Ph22 = max(0,par.mHAc * x[7] * par.YXSHAc)   (no reaction uses it)
+
+    ## REACTION RATES.
+    # This includes the reaction rates with inhibition terms.
+    rates = np.zeros(5)
+    rates[0]  = Ph1 * Ph5 * Ph7 * Ph10 * Ph16 * Ph19a                            # Glucose uptake rate considering inhibitions.
+    rates[1]  = Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21                     # Xylose uptake rate considering inhibitions.
+    rates[2]  = Ph3                                                              # Furfural uptake rate.
+    rates[3]  = Ph12 *  Ph9                                                      # 5-HMF uptake rate considering inhibitions.
+    rates[4]  = Ph14                                                             # HAc uptake rate.
+    return rates
+
+
+## COMPILED KINETICS CORE.
+# Shared by all operating modes (reactor.py) and by the DAY folders. The
+# stoichiometric matrix is built once per parameter set, the reaction terms
+# write into preallocated arrays, and the zeros of the sparse matrix are
+# skipped. par is a parameter record (or a jitclass Parameters instance).
+
+@njit(cache=True)
+def stoichiometry(par):
+    '''Stoichiometric matrix (5 reactions x 8 components) of the model'''
+    st = np.zeros((5, 8), dtype=np.float64)
+    st[0, 0] = -1.0                 # Glucose uptake
+    st[0, 6] = par.YPSg
+    st[0, 7] = par.YXSg
+    st[1, 1] = -1.0                 # Xylose uptake
+    st[1, 6] = par.YPSx
+    st[1, 7] = par.YXSx
+    st[2, 2] = -1.0                 # Furfural uptake
+    st[2, 3] = par.Y_FA_Fur
+    st[3, 4] = -1.0                 # HMF uptake
+    st[3, 5] = par.Y_HAc_HMF
+    st[4, 5] = -1.0                 # HAc uptake
+    return st
+
+@njit(cache=True)
+def reaction_rates(x, par, rates):
+    '''Reaction rates with inhibition terms, written into rates (size 5).
+    Same phenomena Ph1-Ph22 as in reference_rates, see the comments there.'''
+    Ph1 = max(0.0, par.numaxG * x[0] * x[7] / (par.KSPG + x[0] + (x[0]**2)/par.KiPG))
+    Ph2 = max(0.0, par.numaxX * x[1] * x[7] / (par.KSPX + x[1] + (x[1]**2)/par.KiPX))
+    Ph3 = max(0.0, par.numaxFur * x[2] * x[7] / (par.KSFur + x[2]))
+    Ph5 = max(0.0, 1 / (1 + x[3]/par.KiFAg))
+    Ph6 = max(0.0, 1 / (1 + x[3]/par.KiFAx))
+    Ph7 = max(0.0, 1 / (1 + x[2]/par.KiFurg))
+    Ph8 = max(0.0, 1 / (1 + x[2]/par.KiFurx))
+    Ph9 = max(0.0, 1 / (1 + x[2]/par.KiFurHMF))
+    Ph10 = max(0.0, 1 / (1 + x[4]/par.KiHMFg))
+    Ph11 = max(0.0, 1 / (1 + x[4]/par.KiHMFx))
+    Ph12 = max(0.0, par.numaxHMF * x[7] * x[4] / (par.KSHMF + x[4]))
+    Ph14 = max(0.0, x[7] * x[5] * par.numaxHAc / (par.KSHAc + x[5]))
+    Ph16 = max(0.0, 1 / (1 + x[5]/par.KiHAcg))
+    Ph17 = max(0.0, 1 / (1 + x[5]/par.KiHAcx))
+    Ph19a = max(0.0, 1-(x[6]/par.PMPg)**par.gammaG)
+    Ph19b = max(0.0, 1-(x[6]/par.PMPx)**par.gammaX)
+    Ph21 = 1 / (1 + x[0]/par.KiGlu)
+
+    rates[0] = Ph1 * Ph5 * Ph7 * Ph10 * Ph16 * Ph19a                # Glucose uptake rate considering inhibitions.
+    rates[1] = Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21         # Xylose uptake rate considering inhibitions.
+    rates[2] = Ph3                                                  # Furfural uptake rate.
+    rates[3] = Ph12 * Ph9                                           # 5-HMF uptake rate considering inhibitions.
+    rates[4] = Ph14                                                 # HAc uptake rate.
+
+@njit(cache=True)
+def reactions(x, par, st, rates, dxdt):
+    '''Reaction terms st^T rates of the 8 components, written into dxdt[:8].
+    rates (size 5) is used as scratch space.'''
+    reaction_rates(x, par, rates)
+    r, c = st.shape
+    for i in range(c):
+        acc = 0.0
+        for j in range(r):
+            if st[j, i] != 0.0:                                     # Skip the zeros of the sparse matrix
+                acc += rates[j] * st[j, i]
+        dxdt[i] = acc
+
+@njit(cache=True)
+def balances(x, par, Cfeed, st, F, rates, dxdt):
+    '''Fed-batch mass balances for feed rate F, written into dxdt (size 9).
+    rates (size 5) is used as scratch space.'''
+    reactions(x, par, st, rates, dxdt)
+    D = F / x[8]                                                    # Dilution rate
+    for i in range(st.shape[1]):
+        dxdt[i] += D * (Cfeed[i] - x[i])                            # Components mass balance -> FedBatch
+    dxdt[8] = F                                                     # Tank volume mass balance
+
+
+## ANALYTIC JACOBIAN.
+# Exact partial derivatives of the reaction terms and mass balances, so that
+# the stiff solvers (BDF, Radau, LSODA) do not need finite differences.
+# Phenomena clamped with max(0, .) have zero derivative where the clamp is
+# active. The feed rate is treated as independent of the volume (dF/dV = 0).
+
+@njit(cache=True)
+def rate_jacobian(x, par, drdx):
+    '''Derivatives of the 5 reaction rates w.r.t. the 8 concentrations, written into drdx (5 x 8)'''
+    drdx[:, :] = 0.0
+
+    # 1./2. Haldane glucose and xylose uptake: d/dS S/(KS+S+S^2/Ki) = (KS-S^2/Ki)/den^2
+    den = par.KSPG + x[0] + (x[0]**2)/par.KiPG
+    Ph1 = par.numaxG * x[0] * x[7] / den
+    if Ph1 > 0:
+        dPh1_G = par.numaxG * x[7] * (par.KSPG - (x[0]**2)/par.KiPG) / den**2
+        dPh1_X = par.numaxG * x[0] / den
+    else:
+        Ph1, dPh1_G, dPh1_X = 0.0, 0.0, 0.0
+    den = par.KSPX + x[1] + (x[1]**2)/par.KiPX
+    Ph2 = par.numaxX * x[1] * x[7] / den
+    if Ph2 > 0:
+        dPh2_S = par.numaxX * x[7] * (par.KSPX - (x[1]**2)/par.KiPX) / den**2
+        dPh2_X = par.numaxX * x[1] / den
+    else:
+        Ph2, dPh2_S, dPh2_X = 0.0, 0.0, 0.0
+
+    # 3./12./14. Monod uptake of furfural, HMF and HAc: d/dS S/(KS+S) = KS/(KS+S)^2
+    Ph3 = par.numaxFur * x[2] * x[7] / (par.KSFur + x[2])
+    if Ph3 > 0:
+        dPh3_S = par.numaxFur * x[7] * par.KSFur / (par.KSFur + x[2])**2
+        dPh3_X = par.numaxFur * x[2] / (par.KSFur + x[2])
+    else:
+        Ph3, dPh3_S, dPh3_X = 0.0, 0.0, 0.0
+    Ph12 = par.numaxHMF * x[7] * x[4] / (par.KSHMF + x[4])
+    if Ph12 > 0:
+        dPh12_S = par.numaxHMF * x[7] * par.KSHMF / (par.KSHMF + x[4])**2
+        dPh12_X = par.numaxHMF * x[4] / (par.KSHMF + x[4])
+    else:
+        Ph12, dPh12_S, dPh12_X = 0.0, 0.0, 0.0
+    Ph14 = x[7] * x[5] * par.numaxHAc / (par.KSHAc + x[5])
+    if Ph14 > 0:
+        dPh14_S = par.numaxHAc * x[7] * par.KSHAc / (par.KSHAc + x[5])**2
+        dPh14_X = par.numaxHAc * x[5] / (par.KSHAc + x[5])
+    else:
+        Ph14, dPh14_S, dPh14_X = 0.0, 0.0, 0.0
+
+    # 5.-11., 16., 17. Product inhibition 1/(1+c/Ki): derivative -Ph^2/Ki
+    Ph5 = max(0.0, 1 / (1 + x[3]/par.KiFAg))
+    Ph6 = max(0.0, 1 / (1 + x[3]/par.KiFAx))
+    Ph7 = max(0.0, 1 / (1 + x[2]/par.KiFurg))
+    Ph8 = max(0.0, 1 / (1 + x[2]/par.KiFurx))
+    Ph9 = max(0.0, 1 / (1 + x[2]/par.KiFurHMF))
+    Ph10 = max(0.0, 1 / (1 + x[4]/par.KiHMFg))
+    Ph11 = max(0.0, 1 / (1 + x[4]/par.KiHMFx))
+    Ph16 = max(0.0, 1 / (1 + x[5]/par.KiHAcg))
+    Ph17 = max(0.0, 1 / (1 + x[5]/par.KiHAcx))
+    dPh5 = -Ph5**2 / par.KiFAg
+    dPh6 = -Ph6**2 / par.KiFAx
+    dPh7 = -Ph7**2 / par.KiFurg
+    dPh8 = -Ph8**2 / par.KiFurx
+    dPh9 = -Ph9**2 / par.KiFurHMF
+    dPh10 = -Ph10**2 / par.KiHMFg
+    dPh11 = -Ph11**2 / par.KiHMFx
+    dPh16 = -Ph16**2 / par.KiHAcg
+    dPh17 = -Ph17**2 / par.KiHAcx
+
+    # 19. Ethanol inhibition 1-(E/PMP)^gamma: derivative -gamma/PMP*(E/PMP)^(gamma-1)
+    Ph19a = 1-(x[6]/par.PMPg)**par.gammaG
+    Ph19b = 1-(x[6]/par.PMPx)**par.gammaX
+    dPh19a = -par.gammaG/par.PMPg * (x[6]/par.PMPg)**(par.gammaG-1) if Ph19a > 0 and x[6] > 0 else 0.0
+    dPh19b = -par.gammaX/par.PMPx * (x[6]/par.PMPx)**(par.gammaX-1) if Ph19b > 0 and x[6] > 0 else 0.0
+    Ph19a = max(0.0, Ph19a)
+    Ph19b = max(0.0, Ph19b)
+
+    # 21. Catabolite repression (not clamped)
+    Ph21 = 1 / (1 + x[0]/par.KiGlu)
+    dPh21 = -Ph21**2 / par.KiGlu
+
+    # Product rule on each reaction rate.
+    # rates[0] = Ph1 * Ph5 * Ph7 * Ph10 * Ph16 * Ph19a
+    inh = Ph5 * Ph7 * Ph10 * Ph16 * Ph19a
+    drdx[0, 0] = dPh1_G * inh
+    drdx[0, 7] = dPh1_X * inh
+    drdx[0, 3] = Ph1 * dPh5 * Ph7 * Ph10 * Ph16 * Ph19a
+    drdx[0, 2] = Ph1 * Ph5 * dPh7 * Ph10 * Ph16 * Ph19a
+    drdx[0, 4] = Ph1 * Ph5 * Ph7 * dPh10 * Ph16 * Ph19a
+    drdx[0, 5] = Ph1 * Ph5 * Ph7 * Ph10 * dPh16 * Ph19a
+    drdx[0, 6] = Ph1 * Ph5 * Ph7 * Ph10 * Ph16 * dPh19a
+    # rates[1] = Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21
+    inh = Ph6 * Ph8 * Ph11 * Ph17 * Ph19b
+    drdx[1, 1] = dPh2_S * inh * Ph21
+    drdx[1, 7] = dPh2_X * inh * Ph21
+    drdx[1, 0] = Ph2 * inh * dPh21
+    drdx[1, 3] = Ph2 * dPh6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21
+    drdx[1, 2] = Ph2 * Ph6 * dPh8 * Ph11 * Ph17 * Ph19b * Ph21
+    drdx[1, 4] = Ph2 * Ph6 * Ph8 * dPh11 * Ph17 * Ph19b * Ph21
+    drdx[1, 5] = Ph2 * Ph6 * Ph8 * Ph11 * dPh17 * Ph19b * Ph21
+    drdx[1, 6] = Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * dPh19b * Ph21
+    # rates[2] = Ph3
+    drdx[2, 2] = dPh3_S
+    drdx[2, 7] = dPh3_X
+    # rates[3] = Ph12 * Ph9
+    drdx[3, 4] = dPh12_S * Ph9
+    drdx[3, 7] = dPh12_X * Ph9
+    drdx[3, 2] = Ph12 * dPh9
+    # rates[4] = Ph14
+    drdx[4, 5] = dPh14_S
+    drdx[4, 7] = dPh14_X
+
+@njit(cache=True)
+def reactions_jac(st, drdx, J):
+    '''Jacobian st^T drdx of the reaction terms, written into J[:8, :8] (the rest of J is zeroed)'''
+    J[:, :] = 0.0
+    r, c = st.shape
+    for i in range(c):
+        for j in range(r):
+            if st[j, i] != 0.0:
+                for k in range(c):
+                    J[i, k] += st[j, i] * drdx[j, k]
+
+@njit(cache=True)
+def balances_jac(x, Cfeed, st, F, drdx, J):
+    '''Jacobian of the fed-batch mass balances (9 x 9) from the rate derivatives drdx'''
+    reactions_jac(st, drdx, J)
+    for i in range(st.shape[1]):
+        J[i, i] -= F / x[8]                                         # Dilution of the component itself
+        J[i, 8] = -F * (Cfeed[i] - x[i]) / x[8]**2                  # Dilution depends on the volume
+    # Volume row is zero: dV/dt = F does not depend on the states.
+
+
+## PARAMETER SENSITIVITIES.
+def parameter_jacobian(x, par, names):
+    '''Analytic derivatives of the reaction terms st^T rates of the 8
+    components w.r.t. the parameters names (8 x len(names)). The dilution
+    terms do not depend on the parameters; parameters that do not enter the
+    model (pH, pKa, maintenance terms) give zero columns.'''
+    col = {name: k for k, name in enumerate(names)}
+    x = np.asarray(x, dtype=float)
+
+    ## 1. UPTAKE TERMS: value and derivatives w.r.t. numax, KS (and Ki).
+    def haldane(numax, S, X, KS, Ki):
+        den = KS + S + S**2/Ki
+        Ph = numax * S * X / den
+        if Ph <= 0:
+            return 0, 0, 0, 0
+        return Ph, S * X / den, -Ph / den, Ph / den * S**2 / Ki**2
+    def monod(numax, S, X, KS):
+        Ph = numax * S * X / (KS + S)
+        if Ph <= 0:
+            return 0, 0, 0
+        return Ph, S * X / (KS + S), -Ph / (KS + S)
+    Ph1, dPh1_numax, dPh1_KS, dPh1_Ki = haldane(par.numaxG, x[0], x[7], par.KSPG, par.KiPG)
+    Ph2, dPh2_numax, dPh2_KS, dPh2_Ki = haldane(par.numaxX, x[1], x[7], par.KSPX, par.KiPX)
+    Ph3, dPh3_numax, dPh3_KS = monod(par.numaxFur, x[2], x[7], par.KSFur)
+    Ph12, dPh12_numax, dPh12_KS = monod(par.numaxHMF, x[4], x[7], par.KSHMF)
+    Ph14, dPh14_numax, dPh14_KS = monod(par.numaxHAc, x[5], x[7], par.KSHAc)
+
+    ## 2. INHIBITION TERMS: 1/(1+c/Ki) has derivative Ph^2 c/Ki^2 w.r.t. Ki.
+    def inhibition(c, Ki):
+        Ph = max(0, 1 / (1 + c/Ki))
+        return Ph, Ph**2 * c / Ki**2
+    Ph5, dPh5 = inhibition(x[3], par.KiFAg)
+    Ph6, dPh6 = inhibition(x[3], par.KiFAx)
+    Ph7, dPh7 = inhibition(x[2], par.KiFurg)
+    Ph8, dPh8 = inhibition(x[2], par.KiFurx)
+    Ph9, dPh9 = inhibition(x[2], par.KiFurHMF)
+    Ph10, dPh10 = inhibition(x[4], par.KiHMFg)
+    Ph11, dPh11 = inhibition(x[4], par.KiHMFx)
+    Ph16, dPh16 = inhibition(x[5], par.KiHAcg)
+    Ph17, dPh17 = inhibition(x[5], par.KiHAcx)
+    # Ethanol inhibition 1-(E/PMP)^gamma, derivatives w.r.t. PMP and gamma
+    def ethanol(E, PMP, gamma):
+        Ph = 1 - (E/PMP)**gamma
+        if Ph <= 0 or E <= 0:
+            return max(0, Ph), 0, 0
+        return Ph, gamma/PMP * (E/PMP)**gamma, -(E/PMP)**gamma * np.log(E/PMP)
+    Ph19a, dPh19a_PMP, dPh19a_gamma = ethanol(x[6], par.PMPg, par.gammaG)
+    Ph19b, dPh19b_PMP, dPh19b_gamma = ethanol(x[6], par.PMPx, par.gammaX)
+    Ph21, dPh21 = inhibition(x[0], par.KiGlu)
+
+    ## 3. DERIVATIVES OF THE REACTION RATES: rate * dPh/dp / Ph for each factor.
+    rates = np.zeros(5)
+    rates[0] = Ph1 * Ph5 * Ph7 * Ph10 * Ph16 * Ph19a
+    rates[1] = Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21
+    rates[2] = Ph3
+    rates[3] = Ph12 * Ph9
+    rates[4] = Ph14
+    # (reaction, parameter, derivative of the factor, other factors of the rate)
+    terms = [(0, 'numaxG', dPh1_numax, Ph5 * Ph7 * Ph10 * Ph16 * Ph19a),
+             (0, 'KSPG', dPh1_KS, Ph5 * Ph7 * Ph10 * Ph16 * Ph19a),
+             (0, 'KiPG', dPh1_Ki, Ph5 * Ph7 * Ph10 * Ph16 * Ph19a),
+             (0, 'KiFAg', dPh5, Ph1 * Ph7 * Ph10 * Ph16 * Ph19a),
+             (0, 'KiFurg', dPh7, Ph1 * Ph5 * Ph10 * Ph16 * Ph19a),
+             (0, 'KiHMFg', dPh10, Ph1 * Ph5 * Ph7 * Ph16 * Ph19a),
+             (0, 'KiHAcg', dPh16, Ph1 * Ph5 * Ph7 * Ph10 * Ph19a),
+             (0, 'PMPg', dPh19a_PMP, Ph1 * Ph5 * Ph7 * Ph10 * Ph16),
+             (0, 'gammaG', dPh19a_gamma, Ph1 * Ph5 * Ph7 * Ph10 * Ph16),
+             (1, 'numaxX', dPh2_numax, Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21),
+             (1, 'KSPX', dPh2_KS, Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21),
+             (1, 'KiPX', dPh2_Ki, Ph6 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21),
+             (1, 'KiFAx', dPh6, Ph2 * Ph8 * Ph11 * Ph17 * Ph19b * Ph21),
+             (1, 'KiFurx', dPh8, Ph2 * Ph6 * Ph11 * Ph17 * Ph19b * Ph21),
+             (1, 'KiHMFx', dPh11, Ph2 * Ph6 * Ph8 * Ph17 * Ph19b * Ph21),
+             (1, 'KiHAcx', dPh17, Ph2 * Ph6 * Ph8 * Ph11 * Ph19b * Ph21),
+             (1, 'PMPx', dPh19b_PMP, Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph21),
+             (1, 'gammaX', dPh19b_gamma, Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph21),
+             (1, 'KiGlu', dPh21, Ph2 * Ph6 * Ph8 * Ph11 * Ph17 * Ph19b),
+             (2, 'numaxFur', dPh3_numax, 1),
+             (2, 'KSFur', dPh3_KS, 1),
+             (3, 'numaxHMF', dPh12_numax, Ph9),
+             (3, 'KSHMF', dPh12_KS, Ph9),
+             (3, 'KiFurHMF', dPh9, Ph12),
+             (4, 'numaxHAc', dPh14_numax, 1),
+             (4, 'KSHAc', dPh14_KS, 1)]
+    drdp = np.zeros((5, len(names)))
+    for j, name, dPh, rest in terms:
+        if name in col:
+            drdp[j, col[name]] = dPh * rest
+
+    ## 4. MASS BALANCE: d(st^T r)/dp = st^T dr/dp + (dst/dp)^T r
+    dfdp = stoichiometry(as_record(par)).T @ drdp
+    # (parameter, component, reaction) of the yield coefficients in st
+    for name, i, j in [('YPSg', 6, 0), ('YXSg', 7, 0), ('YPSx', 6, 1), ('YXSx', 7, 1),
+                       ('Y_FA_Fur', 3, 2), ('Y_HAc_HMF', 5, 3)]:
+        if name in col:
+            dfdp[i, col[name]] += rates[j]
+    return dfdp
+
+
+if __name__=='__main__':
+    from yeast_fermentation.parameters import Parameters, nominal
+    x = initial_values()
+    rates = np.empty(5)
+    reaction_rates(x, nominal(), rates)
+    print(rates)
+    print(reference_rates(x, Parameters()))
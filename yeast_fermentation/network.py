@@ -0,0 +1,82 @@
+import copy
+
+
+## DECLARATIVE REACTION NETWORK.
+# A network is plain data, a dict with
+#   'name'         identifier of the network (names the generated module)
+#   'species'      list of (name, initial concentration g/L)
+#   'not_fed'      species absent from the feed (see feed_values)
+#   'parameters'   dict {name: value} of parameters that are not in
+#                  yeast_fermentation.parameters (empty for the base model)
+#   'reactions'    list of dicts with
+#       'name'           description
+#       'stoichiometry'  {species: coefficient}, the coefficient a number or
+#                        a parameter name (a yield); absent species are 0
+#       'rate'           list of factors whose product is the reaction rate
+# A factor is a tuple (kind, species..., parameters...), see codegen.TERMS:
+#   ('haldane', S, X, numax, KS, Ki)    max(0, numax S X/(KS + S + S^2/Ki))
+#   ('monod', S, X, numax, KS)          max(0, numax S X/(KS + S))
+#   ('inhibition', c, Ki)               max(0, 1/(1 + c/Ki))
+#   ('repression', c, Ki)               1/(1 + c/Ki)
+#   ('power', c, Pm, gamma)             max(0, 1 - (c/Pm)^gamma)
+#   ('mass_action', S, k)               k S
+#   ('dissociation', A, B, k, pH, pKa)  k (A 10^(pH-pKa) - B), A <-> B + H+
+# codegen.compile_network turns a network into compiled right-hand sides
+# and Jacobians for the operating modes of reactor.py.
+
+YEAST = {
+    'name': 'yeast',
+    'species': [('Glucose', 39.7),
+                ('Xylose', 23.5),
+                ('Furfural', 0.56),
+                ('Furfuryl alcohol', 0.0),
+                ('5-HMF', 0.2),
+                ('Acetic acid', 3.05),
+                ('Ethanol', 0.62),
+                ('Biomass', 1.75)],
+    'not_fed': ['Biomass'],
+    'parameters': {},
+    'reactions': [
+        {'name': 'Glucose uptake',
+         'stoichiometry': {'Glucose': -1, 'Ethanol': 'YPSg', 'Biomass': 'YXSg'},
+         'rate': [('haldane', 'Glucose', 'Biomass', 'numaxG', 'KSPG', 'KiPG'),
+                  ('inhibition', 'Furfuryl alcohol', 'KiFAg'),
+                  ('inhibition', 'Furfural', 'KiFurg'),
+                  ('inhibition', '5-HMF', 'KiHMFg'),
+                  ('inhibition', 'Acetic acid', 'KiHAcg'),
+                  ('power', 'Ethanol', 'PMPg', 'gammaG')]},
+        {'name': 'Xylose uptake',
+         'stoichiometry': {'Xylose': -1, 'Ethanol': 'YPSx', 'Biomass': 'YXSx'},
+         'rate': [('haldane', 'Xylose', 'Biomass', 'numaxX', 'KSPX', 'KiPX'),
+                  ('inhibition', 'Furfuryl alcohol', 'KiFAx'),
+                  ('inhibition', 'Furfural', 'KiFurx'),
+                  ('inhibition', '5-HMF', 'KiHMFx'),
+                  ('inhibition', 'Acetic acid', 'KiHAcx'),
+                  ('power', 'Ethanol', 'PMPx', 'gammaX'),
+                  ('repression', 'Glucose', 'KiGlu')]},
+        {'name': 'Furfural uptake',
+         'stoichiometry': {'Furfural': -1, 'Furfuryl alcohol': 'Y_FA_Fur'},
+         'rate': [('monod', 'Furfural', 'Biomass', 'numaxFur', 'KSFur')]},
+        {'name': 'HMF uptake',
+         'stoichiometry': {'5-HMF': -1, 'Acetic acid': 'Y_HAc_HMF'},
+         'rate': [('monod', '5-HMF', 'Biomass', 'numaxHMF', 'KSHMF'),
+                  ('inhibition', 'Furfural', 'KiFurHMF')]},
+        {'name': 'HAc uptake',
+         'stoichiometry': {'Acetic acid': -1},
+         'rate': [('monod', 'Acetic acid', 'Biomass', 'numaxHAc', 'KSHAc')]},
+    ],
+}
+
+
+def with_acetate(network=YEAST, kAc=50.0):
+    '''Variant of network with the acetate ion Ac- as a species: acetic acid
+    dissociates towards the equilibrium Ac-/HAc = 10^(pH-pKa) with rate
+    constant kAc (1/h); only the undissociated acid inhibits and is taken up.'''
+    variant = copy.deepcopy(network)
+    variant['name'] = network['name'] + '_acetate'
+    variant['species'].append(('Acetate', 0.0))
+    variant['parameters']['kAc'] = kAc
+    variant['reactions'].append({'name': 'HAc dissociation',
+                                 'stoichiometry': {'Acetic acid': -1, 'Acetate': 1},
+                                 'rate': [('dissociation', 'Acetic acid', 'Acetate', 'kAc', 'pH', 'pKa')]})
+    return variant
@@ -0,0 +1,150 @@
+# [1] Krishnan et al, 1999
+# [2] Hanly et al, 2004
+# [3] Mauricio-Iglesias et al,
+import numpy as np
+
+
+## PARAMETER TABLE.
+# One line per model parameter, in the order of the model code (and of the
+# records, see below). Two parameter sets are in use:
+#   'DAY1'  the batch model of DAY1
+#   'DAY3'  the fed-batch model of DAY3 and DAY5 (default), refitted uptake,
+#           inhibition and ethanol yield constants
+#  name          DAY1              DAY3                      unit          description                                ref
+TABLE = [
+    ## 1. GLUCOSE UPTAKE RATE.
+    ('numaxG',     3.9872,           1.7271,                   'h^-1',       'max consumption rate of glucose',         '[1]'),
+    ('KSPG',       0.14637,          0.565,                    'g/L',        'affinity constant glucose to ethanol',    '[1]'),
+    ('KiPG',       4752.8,           4890,                     'g/L',        'inhibition constant glucose to ethanol',  '[1]'),
+    ## 2. XYLOSE UPTAKE RATE.
+    ('numaxX',     7.0531,           1.6222,                   'h^-1',       'max consumption rate of xylose',          '[1]'),
+    ('KSPX',       0.58763,          3.4,                      'g/L',        'affinity constant xylose to ethanol',     '[1]'),
+    ('KiPX',       21.608,           18.1,                     'g/L',        'inhibition constant xylose to ethanol',   '[1]'),
+    ## 3. FURFURAL UPTAKE RATE.
+    ('numaxFur',   0.14309,          4.67e-5*3600,             'h^-1',       'max uptake rate of furfural',             '[2]'),
+    ('KSFur',      0.05,             0.05,                     'g/L',        'affinity constant furfural',              '[2]'),
+    ## 4. FURFURAL CONVERSION INTO FURFURYL ALCOHOL.
+    ('Y_FA_Fur',   1.02,             1.02,                     'gFA/gFur',   'yield coefficient FA/Fur',                '[2]'),
+    ## 5.-11. FURFURYL ALCOHOL, FURFURAL AND HMF INHIBIT THE UPTAKE RATES.
+    ('KiFAg',      5,                5,                        'g/L',        'inhibition constant of FA on Glu uptake', '[2]'),
+    ('KiFAx',      6,                6,                        'g/L',        'inhibition constant of FA on Xyl uptake', '[2]'),
+    ('KiFurg',     0.4529,           0.75,                     'g/L',        'inhibition constant of Fur on Glu uptake','[2]'),
+    ('KiFurx',     0.35,             0.35,                     'g/L',        'inhibition constant of Fur on Xyl uptake','[2]'),
+    ('KiFurHMF',   0.25,             0.25,                     'g/L',        'inhibition constant of Fur on HMF',       '[2]'),
+    ('KiHMFg',     2,                2,                        'g/L',        'inhibition constant of HMF on Glu',       '[2]'),
+    ('KiHMFx',     10,               10,                       'g/L',        'inhibition constant of HMF on Xyl',       '[2]'),
+    ## 12. HMF UPTAKE RATE.
+    ('numaxHMF',   0.3154,           8.76E-5*3600,             'h^-1',       'max uptake rate of HMF',                  '[2]'),
+    ('KSHMF',      0.5,              0.5,                      'g/L',        'affinity constant HMF',                   '[2]'),
+    ## 13. pH INFLUENCES THE PAIR HAc/Ac (not used).
+    ('pH',         5.5,              5.5,                      '-',          'pH is controlled',                        ''),
+    ('pKa',        4.75,             4.75,                     '-',          'pKa of acetic acid',                      ''),
+    ## 14. HAc UPTAKE RATE.
+    ('numaxHAc',   0.0443*0.001,     1.23E-5*3600*0.001,       'h^-1',       'max uptake rate of HAc',                  '[2]'),
+    ('KSHAc',      2.5,              2.5,                      'g/L',        'affinity constant HAc',                   '[2]'),
+    ## 15. HMF CONVERSION INTO HAc.
+    ('Y_HAc_HMF',  0.534,            0.534,                    'gHAc/gHMF',  'yield coefficient HAc/HMF',               '[2], [3]'),
+    ## 16.-17. HAc INHIBITS THE UPTAKE RATES.
+    ('KiHAcg',     1.9558,           5.6703,                   'g/L',        'inhibition constant of HAc on Glu',       '[2]'),
+    ('KiHAcx',     0.9604,           3.8291,                   'g/L',        'inhibition constant of HAc on Xyl',       '[2]'),
+    ## 18. PRODUCTION OF ETHANOL FROM GLUCOSE AND XYLOSE.
+    ('YPSg',       0.4108,           0.42,                     'gEtOH/gGlu', 'yield ethanol-glucose',                   '[1]'),
+    ('YPSx',       0.24,             0.24,                     'gEtOH/gXyl', 'yield ethanol-xylose',                    '[1]'),
+    ## 19. ETHANOL INHIBITS THE UPTAKE OF GLUCOSE AND XYLOSE.
+    ('PMPg',       32.04,            103,                      'g/L',        'inhibition constant for glucose',         '[1]'),
+    ('gammaG',     1.42,             1.42,                     '-',          'exponent factor inhibition glucose',      '[1]'),
+    ('PMPx',       23.442,           60.2,                     'g/L',        'inhibition constant for xylose',          '[1]'),
+    ('gammaX',     1.5533,           0.608,                    '-',          'exponent factor inhibition xylose',       '[1]'),
+    ## 20. CELL GROWTH.
+    ('mGlu',       2.69E-5,          2.69E-5,                  'g/L',        'maintenance constant from glucose',       '[1]'),
+    ('mXyl',       1.86E-5,          1.86E-5,                  'g/L',        'maintenance constant from xylose',        '[1]'),
+    ('YXSg',       0.115,            0.115,                    'gX/gGlu',    'yield X-Glu',                             '[1]'),
+    ('YXSx',       0.162,            0.162,                    'gX/gXyl',    'yield X-Xyl',                             '[1]'),
+    ('mumaxG',     0.3308,           0.3308,                   'h^-1',       'max growth of X from Glu',                '[1]'),
+    ('mumaxX',     1.0008,           1.0008,                   'h^-1',       'max growth of X from Xyl',                '[1]'),
+    ## 21. CATABOLITE REPRESSION.
+    ('KiGlu',      5,                13.763,                   'g/L',        'inhibition constant of Glu to Xyl',       'Unknown'),
+    ## 22. ACETIC ACID IS USED FOR MAINTENANCE.
+    ('mHAc',       0,                0,                        'g/L',        'maintenance constant from HAc',           'Unknown'),
+    ('YXSHAc',     0,                0,                        'g/L',        'yield acetate biomass',                   'Unknown'),
+]
+
+names = [row[0] for row in TABLE]
+units = {row[0]: row[3] for row in TABLE}
+descriptions = {row[0]: row[4] for row in TABLE}
+PARAMETER_SETS = {'DAY1': {row[0]: row[1] for row in TABLE},
+                  'DAY3': {row[0]: row[2] for row in TABLE}}
+
+def values(parameter_set='DAY3'):
+    '''Dict {name: value} of a parameter set'''
+    if parameter_set not in PARAMETER_SETS:
+        raise ValueError(f'unknown parameter set {parameter_set!r}, expected one of {list(PARAMETER_SETS)}')
+    return PARAMETER_SETS[parameter_set]
+
+
+class Parameters():
+    '''Define all Parameters to be used in the model in a class'''
+    def __init__(self, parameter_set='DAY3'):
+        for name, value in values(parameter_set).items():
+            setattr(self, name, value)
+
+
+## PARAMETERS AS RECORDS.
+# The compiled model functions take the parameters as a record of a numpy
+# structured array, with one float64 field per parameter: P[n] of an
+# ensemble table has the same attribute names as a Parameters instance
+# (P[n].numaxG in compiled code). A cached function called with a record is
+# compiled once and loaded from disk by every later process. A jitclass
+# type is new in every process: each process calling a cached function with
+# it compiles again and writes a cache entry that is never reused, so the
+# cache grows without bound. The adapters convert with as_record before
+# calling cached functions; jit_parameters() builds the jitclass for code
+# that needs a mutable compiled object.
+dtype = np.dtype([(name, np.float64) for name in names])
+
+def to_record(par):
+    '''Copy Parameters (any object with the parameter attributes) into a structured record'''
+    return np.array(tuple(getattr(par, name) for name in names), dtype=dtype)
+
+def as_record(par):
+    '''par as a record: records pass through, Parameters instances are copied'''
+    if isinstance(par, np.void):
+        return par
+    if isinstance(par, np.ndarray):
+        return par[()]
+    return to_record(par)[()]
+
+def nominal(parameter_set='DAY3'):
+    '''Record of the values of a parameter set'''
+    return np.array(tuple(values(parameter_set)[name] for name in names), dtype=dtype)[()]
+
+def parameter_table(n, overrides=None, parameter_set='DAY3'):
+    '''Structured array of n nominal parameter sets. overrides is an optional
+    dict {name: value or array of n values} applied on top of the nominal values.'''
+    P = np.zeros(n, dtype=dtype)
+    P[:] = nominal(parameter_set)
+    if overrides is not None:
+        for name, value in overrides.items():
+            P[name] = value
+    return P
+
+
+_jitclasses = {}
+
+def jit_parameters(parameter_set='DAY3'):
+    '''numba jitclass Parameters whose constructor sets the values of parameter_set'''
+    if parameter_set not in _jitclasses:
+        from numba import float64
+        from numba.experimental import jitclass
+        lines = [f'    self.{name} = {float(value)!r}' for name, value in values(parameter_set).items()]
+        scope = {'__name__': __name__}                              # Module of __init__, for numba's pickling
+        exec('def __init__(self):\n' + '\n'.join(lines), scope)   # Attribute assignments compile, setattr does not
+        cls = type('Parameters', (), {'__init__': scope['__init__'], '__doc__': Parameters.__doc__})
+        _jitclasses[parameter_set] = jitclass([(name, float64) for name in names])(cls)
+    return _jitclasses[parameter_set]
+
+
+if __name__=='__main__':
+    for name in names:
+        a, b = PARAMETER_SETS['DAY1'][name], PARAMETER_SETS['DAY3'][name]
+        print(f'{name:10s} {a:12.6g} {b:12.6g} {units[name]:11s} {descriptions[name]}{"" if a == b else "  *"}')
@@ -0,0 +1,165 @@
+import numpy as np
+from numba import njit
+from scipy.integrate import solve_ivp
+from . import kinetics
+from .parameters import nominal, as_record
+from .jitcache import check_stamp
+from .kinetics import (initial_values, feed_values, stoichiometry, rate_jacobian, reactions, reactions_jac,
+                       balances, balances_jac)
+
+
+## FEED PROFILES.
+# The feed rate F (L/h) of the fed-batch and continuous modes is a profile
+# array [F0, dF, t_start, t_stop, V_max]:
+#     F = F0 + dF*(t - t_start)   for t_start <= t < t_stop and V < V_max
+#     F = 0                       otherwise
+# DAY3 feeds feed_profile(0.1, 0.005, t_start=2, V_max=2), DAY5 a constant
+# feed_profile(0.2). Being an array, a new profile does not recompile.
+
+def feed_profile(F0=0.2, dF=0.0, t_start=0.0, t_stop=np.inf, V_max=np.inf):
+    '''Feed profile array [F0, dF, t_start, t_stop, V_max] for feed_rate'''
+    return np.array([F0, dF, t_start, t_stop, V_max], dtype=np.float64)
+
+@njit(cache=True)
+def feed_rate(feed, t, V):
+    '''Feed rate of the profile feed at time t and volume V'''
+    if t < feed[2] or t >= feed[3] or V >= feed[4]:
+        return 0.0
+    return feed[0] + feed[1]*(t - feed[2])
+
+
+## OPERATING MODES.
+# Right-hand sides and Jacobians for solve_ivp, all built on the kinetics
+# core (kinetics.py), compiled once and cached on disk for parameter records:
+#   batch       8 states,  args=(par, st)
+#   fedbatch    9 states,  args=(par, Cfeed, st, feed); dV/dt = F
+#   continuous  9 states,  args=(par, Cfeed, st, feed); the outflow equals
+#               the feed, dV/dt = 0 and the dilution rate is F/V
+# with st = stoichiometry(par) and feed a feed_profile.
+
+@njit(cache=True)
+def batch(t, x, par, st):
+    '''Batch right-hand side (8 states)'''
+    dxdt = np.empty(8, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    reactions(x, par, st, rates, dxdt)
+    return dxdt
+
+@njit(cache=True)
+def batch_jac(t, x, par, st):
+    '''Analytic Jacobian of batch (8 x 8)'''
+    drdx = np.empty((5, 8), dtype=np.float64)
+    J = np.empty((8, 8), dtype=np.float64)
+    rate_jacobian(x, par, drdx)
+    reactions_jac(st, drdx, J)
+    return J
+
+@njit(cache=True)
+def fedbatch(t, x, par, Cfeed, st, feed):
+    '''Fed-batch right-hand side (9 states)'''
+    dxdt = np.empty(9, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    balances(x, par, Cfeed, st, feed_rate(feed, t, x[8]), rates, dxdt)
+    return dxdt
+
+@njit(cache=True)
+def fedbatch_jac(t, x, par, Cfeed, st, feed):
+    '''Analytic Jacobian of fedbatch (9 x 9)'''
+    drdx = np.empty((5, 8), dtype=np.float64)
+    J = np.empty((9, 9), dtype=np.float64)
+    rate_jacobian(x, par, drdx)
+    balances_jac(x, Cfeed, st, feed_rate(feed, t, x[8]), drdx, J)
+    return J
+
+@njit(cache=True)
+def continuous(t, x, par, Cfeed, st, feed):
+    '''Continuous (chemostat) right-hand side (9 states, constant volume)'''
+    dxdt = np.empty(9, dtype=np.float64)
+    rates = np.empty(5, dtype=np.float64)
+    balances(x, par, Cfeed, st, feed_rate(feed, t, x[8]), rates, dxdt)
+    dxdt[8] = 0.0                                                   # Outflow = feed
+    return dxdt
+
+@njit(cache=True)
+def continuous_jac(t, x, par, Cfeed, st, feed):
+    '''Analytic Jacobian of continuous (9 x 9)'''
+    return fedbatch_jac(t, x, par, Cfeed, st, feed)                 # The volume row is zero in both
+
+MODES = {'batch': (batch, batch_jac, 8),
+         'fedbatch': (fedbatch, fedbatch_jac, 9),
+         'continuous': (continuous, continuous_jac, 9)}
+
+# The cached modes inline the kinetics core: drop them when kinetics.py changed
+check_stamp(fedbatch.stats.cache_path, 'reactor', [kinetics.__file__, __file__], ['reactor'])
+
+
+class Reactor():
+    '''A fermenter in one operating mode ('batch', 'fedbatch' or
+    'continuous'), chosen at construction. par is a Parameters instance or a
+    record (default: nominal(parameter_set)), Cfeed the feed composition
+    (default: feed_values of the initial state) and feed a feed_profile
+    (default: constant 0.2 L/h). network is a codegen.CompiledNetwork to
+    simulate instead of the kinetics core. rhs, jac and args() are ready
+    for solve_ivp.'''
+    def __init__(self, mode='fedbatch', par=None, Cfeed=None, feed=None, parameter_set='DAY3', network=None):
+        modes = MODES if network is None else network.modes
+        if mode not in modes:
+            raise ValueError(f'unknown mode {mode!r}, expected one of {list(modes)}')
+        self.mode, self.network = mode, network
+        self.rhs, self.jac, self.n_states = modes[mode]
+        if par is None:
+            par = nominal(parameter_set) if network is None else network.nominal(parameter_set)
+        self.par = par
+        self.Cfeed = None if Cfeed is None else np.asarray(Cfeed, dtype=np.float64)
+        self.feed = feed_profile() if feed is None else np.asarray(feed, dtype=np.float64)
+
+    @property
+    def par(self):
+        return self._par
+
+    @par.setter
+    def par(self, par):
+        if self.network is None:
+            self._par = as_record(par)                              # Records: cached compiled code
+            self.st = stoichiometry(self._par)
+        else:
+            self._par = self.network.as_record(par)
+            self.st = self.network.stoichiometry(self._par)
+
+    def initial_values(self):
+        return initial_values(self.mode) if self.network is None else self.network.initial_values(self.mode)
+
+    def feed_values(self, init):
+        return feed_values(init) if self.network is None else self.network.feed_values(init)
+
+    def args(self, init=None):
+        '''args of rhs and jac; the feed composition defaults to feed_values(init)'''
+        if self.mode == 'batch':
+            return (self.par, self.st)
+        Cfeed = self.Cfeed
+        if Cfeed is None:
+            Cfeed = self.feed_values(self.initial_values() if init is None else init)
+        return (self.par, Cfeed, self.st, self.feed)
+
+    def simulate(self, init=None, tspan=(0,50), t_eval=None, method='LSODA', rtol=1e-8, atol=1e-8):
+        '''Solve from init (default: initial_values) with the compiled
+        right-hand side and Jacobian. Returns the solve_ivp solution.'''
+        init = self.initial_values() if init is None else np.asarray(init, dtype=np.float64)
+        if len(init) != self.n_states:
+            raise ValueError(f'{self.mode} has {self.n_states} states, got {len(init)} initial values')
+        options = {} if method in ('RK45', 'RK23', 'DOP853') else {'jac': self.jac}
+        return solve_ivp(self.rhs, t_span=tspan, y0=init, args=self.args(init), t_eval=t_eval,
+                         method=method, rtol=rtol, atol=atol, **options)
+
+
+if __name__=='__main__':
+    from time import perf_counter
+    t_eval = np.linspace(0, 50, 11)
+    for mode, feed in [('batch', None), ('fedbatch', feed_profile(0.1, 0.005, t_start=2.0, V_max=2.0)),
+                       ('continuous', feed_profile(0.05))]:
+        reactor = Reactor(mode, feed=feed)
+        reactor.simulate()                                          # Compile or load from the cache
+        tic = perf_counter()
+        sol = reactor.simulate(t_eval=t_eval)
+        print(f'{mode:10s} {1e3*(perf_counter()-tic):6.1f} ms, {sol.nfev:4d} RHS calls, '
+              f'ethanol at 50 h {sol.y[6, -1]:6.2f} g/L')